@@ -1,82 +1,341 @@
-"""Comparador de resultados entre GPT-3.5 y GPT-4 para Dates Extractor.
+"""Comparador de resultados entre N modelos para Dates Extractor.
 
-Lee los JSON generados en results/{modelo}.json y resume:
-- Fechas únicas de cada modelo
-- Fechas comunes
-- Entradas con diferencias
+Lee los resultados de cada modelo (results/{modelo}.jsonl o results/{modelo}.json) y
+los une por el hash de la entrada, no por posición, así que los ficheros pueden tener
+distinto orden, entradas de más o entradas que faltan. Resume:
+- Fechas comunes y fechas que solo devuelve cada modelo
+- Matriz de acuerdo entre cada par de modelos (casos idénticos y Jaccard de fechas)
+- Precisión, recall y F1 de cada modelo frente a un fichero gold opcional
+- Casos con diferencias, escritos uno a uno en results/comparacion_casos.jsonl
+
+Las salidas se normalizan con `utils.parser.fechas_de_respuesta` (dd/mm/yyyy, valga la
+respuesta en bruto del modelo o la lista JSON de los runners). Las filas `<error: ...>` no se
+puntúan: se cuentan aparte como errores de cada modelo.
+
+Escala a cientos de miles de casos: los ficheros se recorren a la vez, un registro de cada
+uno por turno (los JSONL línea a línea), y cada caso se resume y se descarta en cuanto
+todos los ficheros lo han dado. Las fechas se guardan como enteros y, en lugar de comparar
+modelos caso a caso, se cuentan las combinaciones "qué modelos devolvieron esta fecha"
+(máscara de bits) y "qué modelos coinciden en este caso" (partición); las métricas salen de
+esos contadores, cuyo tamaño no depende del número de casos.
+
+Memoria: solo quedan pendientes los casos que algún fichero aún no ha dado. Si los ficheros
+siguen el mismo orden (los runners escriben en el orden de text_examples) son unos pocos;
+en el peor caso (órdenes muy distintos, o casos que faltan en algún fichero, que esperan al
+final) crece hasta una fila por caso. Los resultados en JSON (no JSONL) se cargan enteros.
+
+Uso:
+    python comparar_resultados.py                                  # todos los modelos de results/
+    python comparar_resultados.py gpt-35-turbo gpt-4 gpt-4o --gold gold.json
 """
 
 from __future__ import annotations
 
+import sys
 import json
+import argparse
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 BASE_DIR = Path(__file__).resolve().parent
 RESULTS_DIR = BASE_DIR / "results"
+RESUMEN_PATH = RESULTS_DIR / "comparacion.json"
+CASOS_PATH = RESULTS_DIR / "comparacion_casos.jsonl"
+
+# Raíz de 01_PromptEngineering para las utilidades compartidas (common/)
+PROMPT_ENGINEERING_ROOT = BASE_DIR.parent
+if str(PROMPT_ENGINEERING_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROMPT_ENGINEERING_ROOT))
+from common.jsonl_results import KEY_FIELD, input_key
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+from utils.parser import fechas_de_respuesta
+
+GOLD = "gold"
+INPUT_PREVIEW = 120
+ERROR_PREFIX = "<error:"
+
+
+def _es_error(record: Dict[str, Any]) -> bool:
+    """Fila de una llamada fallida (`output` = "<error: ...>"): no tiene fechas que puntuar."""
+    return "fechas" not in record and str(record.get("output") or "").lstrip().startswith(ERROR_PREFIX)
+
+
+def _fechas_de_registro(record: Dict[str, Any]) -> List[str]:
+    """Fechas dd/mm/yyyy de un resultado ({input, output}) o de una entrada gold ({input, fechas} u {input, output})."""
+    fechas = record.get("fechas")
+    if isinstance(fechas, list):
+        return fechas_de_respuesta(" ".join(str(x) for x in fechas))
+    return fechas_de_respuesta(str(record.get("output") or ""))
+
+
+def _iter_registros(path: Path) -> Iterator[Dict[str, Any]]:
+    """Registros de un fichero de resultados: JSONL en streaming o lista JSON."""
+    if path.suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # línea truncada de una ejecución interrumpida
+                if isinstance(record, dict):
+                    record.pop(KEY_FIELD, None)
+                    yield record
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    yield from (r for r in data if isinstance(r, dict))
+
+
+def _iter_intercalado(fuentes: Sequence[Path]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(columna, registro) de todos los ficheros a la vez: un registro de cada uno por turno."""
+    activos = [(c, _iter_registros(path)) for c, path in enumerate(fuentes)]
+    while activos:
+        siguientes = []
+        for c, registros in activos:
+            record = next(registros, None)
+            if record is not None:
+                yield c, record
+                siguientes.append((c, registros))
+        activos = siguientes
+
+
+def ruta_modelo(modelo: str) -> Path:
+    """results/{modelo}.jsonl si existe (resultados incrementales); si no, results/{modelo}.json."""
+    jsonl = RESULTS_DIR / f"{modelo}.jsonl"
+    return jsonl if jsonl.exists() else RESULTS_DIR / f"{modelo}.json"
+
+
+def modelos_disponibles() -> List[str]:
+    """Modelos con resultados en results/ (sin contar los ficheros de la comparación)."""
+    nombres = {p.stem for p in RESULTS_DIR.glob("*.json*") if p.suffix in (".json", ".jsonl")}
+    return sorted(n for n in nombres if not n.startswith("comparacion"))
+
+
+class _Fechas:
+    """Internado de fechas: cada fecha distinta se guarda una vez y los casos usan enteros."""
 
-def _load_results(file_path: Path) -> List[Dict[str, str]]:
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.textos: List[str] = []
 
-def _normalize_output(output: str) -> List[str]:
-    """Intenta parsear la salida del modelo como lista de fechas.
-    Si no es JSON válido, hace una limpieza simple por líneas y comas.
-    Devuelve fechas en minúsculas y sin espacios extra.
+    def codificar(self, fechas: Sequence[str]) -> Tuple[int, ...]:
+        ids = []
+        for fecha in fechas:
+            i = self.ids.get(fecha)
+            if i is None:
+                i = self.ids[fecha] = len(self.textos)
+                self.textos.append(fecha)
+            ids.append(i)
+        return tuple(sorted(set(ids)))
+
+    def decodificar(self, ids: Sequence[int]) -> List[str]:
+        return sorted(self.textos[i] for i in ids)
+
+
+def _ratio(a: int, b: int) -> float:
+    return round(a / b, 4) if b else 0.0
+
+
+def comparar_resultados(
+    rutas: Dict[str, Path],
+    gold: Optional[Path] = None,
+    salida_casos: Optional[Path] = CASOS_PATH,
+) -> Dict[str, Any]:
+    """Compara los resultados de varios modelos (y, si se indica, contra un gold).
+
+    Args:
+        rutas: Modelo -> fichero de resultados (JSONL o JSON con {input, output}).
+        gold: Fichero opcional con las fechas esperadas ({input, fechas: [...]} u {input, output}).
+        salida_casos: JSONL donde se escriben los casos con diferencias (None: no se escriben).
+
+    Returns:
+        dict: Resumen con modelos, casos, fechas comunes y exclusivas, matriz de acuerdo,
+        errores por modelo y, con gold, precisión/recall/F1 por modelo.
+
+    Cada caso se resume en cuanto todos los ficheros lo han dado, así que la memoria depende
+    de los casos pendientes (ver el docstring del módulo), no del total.
     """
-    output = output.strip()
-    if not output:
-        return []
+    modelos = list(rutas)
+    fuentes = [*rutas.values()] + ([gold] if gold else [])
+    n = len(fuentes)
+    fechas = _Fechas()
+
+    # Contadores agregados: (columnas presentes, columnas con la fecha) por fecha y caso,
+    # y (columnas presentes, partición de modelos con las mismas fechas) por caso
+    mascaras: Counter = Counter()
+    particiones: Counter = Counter()
+    comunes, solo = set(), [set() for _ in modelos]
+    totales: Counter = Counter()
+    errores: Counter = Counter()
+
+    def resumir_caso(fila: List[Optional[Tuple[int, ...]]], entrada: str) -> None:
+        totales["casos"] += 1
+        presentes = sum(1 << c for c, ids in enumerate(fila) if ids is not None)
+        por_fecha: Dict[int, int] = {}
+        for c, ids in enumerate(fila):
+            for i in ids or ():
+                por_fecha[i] = por_fecha.get(i, 0) | (1 << c)
+        for mascara in por_fecha.values():
+            mascaras[(presentes, mascara)] += 1
+
+        # Partición: a cada modelo, el índice del primero con sus mismas fechas
+        modelos_presentes = [c for c in range(len(modelos)) if fila[c] is not None]
+        representantes: Dict[Tuple[int, ...], int] = {}
+        particion = tuple(representantes.setdefault(fila[c], c) if fila[c] is not None else -1
+                          for c in range(len(modelos)))
+        particiones[(presentes, particion)] += 1
+
+        presentes_modelos = presentes & ((1 << len(modelos)) - 1)
+        if len(modelos_presentes) < 2:
+            return
+        for i, mascara in por_fecha.items():
+            mascara &= presentes_modelos
+            if mascara == presentes_modelos:
+                comunes.add(i)
+            elif mascara and mascara & (mascara - 1) == 0:
+                solo[mascara.bit_length() - 1].add(i)
+        if len(modelos_presentes) == len(modelos):
+            totales["completos"] += 1
+            totales["coinciden"] += len(representantes) == 1
+        if len(representantes) > 1 and f_casos:
+            union = set().union(*(fila[c] for c in modelos_presentes))
+            caso = {
+                "input": entrada,
+                "fechas": {modelos[c]: fechas.decodificar(fila[c]) for c in modelos_presentes},
+                "solo": {modelos[c]: fechas.decodificar(set(fila[c]) - set().union(
+                    *(fila[o] for o in modelos_presentes if o != c))) for c in modelos_presentes},
+                "faltan": {modelos[c]: fechas.decodificar(union - set(fila[c])) for c in modelos_presentes},
+            }
+            if gold and fila[-1] is not None:
+                caso[GOLD] = fechas.decodificar(fila[-1])
+            f_casos.write(json.dumps(caso, ensure_ascii=False) + "\n")
+
+    # Casos que aún no han dado todos los ficheros: hash de la entrada -> [columnas vistas
+    # (máscara), fechas de cada columna (None si falta o es un error), inicio de la entrada]
+    todas = (1 << n) - 1
+    pendientes: Dict[str, list] = {}
+    f_casos = open(salida_casos, "w", encoding="utf-8") if salida_casos else None
     try:
-        data = json.loads(output)
-        if isinstance(data, list):
-            return [str(x).strip().lower() for x in data]
-    except Exception:
-        pass
-    # fallback: separar por saltos de línea o comas
-    parts = [p.strip().lower() for p in output.replace("\n", ",").split(",")]
-    return [p for p in parts if p]
-
-def comparar_resultados(path_35: Path, path_4: Path) -> Dict[str, Any]:
-    r35 = _load_results(path_35)
-    r4 = _load_results(path_4)
-
-    # Se asume misma cantidad de entradas (mismos text_examples)
-    paired = list(zip(r35, r4))
-
-    diffs = []
-    comunes = set()
-    solo_35 = set()
-    solo_4 = set()
-
-    for idx, (a, b) in enumerate(paired, start=1):
-        a_list = _normalize_output(a.get("output", ""))
-        b_list = _normalize_output(b.get("output", ""))
-
-        s_a, s_b = set(a_list), set(b_list)
-        comunes |= (s_a & s_b)
-        solo_35 |= (s_a - s_b)
-        solo_4 |= (s_b - s_a)
-
-        if s_a != s_b:
-            diffs.append({
-                "case": idx,
-                "input": a.get("input", "")[:120],
-                "gpt35": sorted(s_a),
-                "gpt4": sorted(s_b),
-                "solo_gpt35": sorted(s_a - s_b),
-                "solo_gpt4": sorted(s_b - s_a),
-            })
-
-    return {
-        "comunes": sorted(comunes),
-        "solo_gpt35": sorted(solo_35),
-        "solo_gpt4": sorted(solo_4),
-        "diferencias_por_caso": diffs,
+        for c, record in _iter_intercalado(fuentes):
+            texto = str(record.get("input") or "").strip()
+            clave = input_key(texto)
+            caso = pendientes.get(clave)
+            if caso is None:
+                caso = pendientes[clave] = [0, [None] * n, texto[:INPUT_PREVIEW]]
+            caso[0] |= 1 << c
+            if _es_error(record):
+                errores[c] += 1
+            else:
+                caso[1][c] = fechas.codificar(_fechas_de_registro(record))
+            if caso[0] == todas:
+                del pendientes[clave]
+                resumir_caso(caso[1], caso[2])
+        # Casos que faltan en algún fichero (o que se repiten tras completarse)
+        for _, fila, entrada in pendientes.values():
+            resumir_caso(fila, entrada)
+        pendientes.clear()
+    finally:
+        if f_casos:
+            f_casos.close()
+    completos, coinciden = totales["completos"], totales["coinciden"]
+
+    # Matriz de acuerdo entre cada par de modelos (solo casos presentes en ambos)
+    acuerdo: Dict[str, Dict[str, Dict[str, float]]] = {a: {} for a in modelos}
+    for a in range(len(modelos)):
+        for b in range(len(modelos)):
+            ambos = (1 << a) | (1 << b)
+            casos_ambos = sum(k for (p, _), k in particiones.items() if p & ambos == ambos)
+            iguales = sum(k for (p, part), k in particiones.items() if p & ambos == ambos and part[a] == part[b])
+            interseccion = sum(k for (p, m), k in mascaras.items() if p & ambos == ambos and m & ambos == ambos)
+            union = sum(k for (p, m), k in mascaras.items() if p & ambos == ambos and m & ambos)
+            acuerdo[modelos[a]][modelos[b]] = {
+                "casos": casos_ambos,
+                "casos_iguales": _ratio(iguales, casos_ambos),
+                "jaccard_fechas": _ratio(interseccion, union) if union else 1.0,
+            }
+
+    por_modelo = {}
+    for c, modelo in enumerate(modelos):
+        bit = 1 << c
+        por_modelo[modelo] = {
+            "casos": sum(k for (p, _), k in particiones.items() if p & bit),
+            "fechas": sum(k for (_, m), k in mascaras.items() if m & bit),
+            "fechas_distintas_solo_este_modelo": len(solo[c]),
+            "errores": errores[c],
+        }
+
+    resumen: Dict[str, Any] = {
+        "modelos": modelos,
+        "casos": totales["casos"],
+        "casos_en_todos": completos,
+        "casos_coinciden": coinciden,
+        "tasa_coinciden": _ratio(coinciden, completos),
+        "comunes": fechas.decodificar(comunes),
+        "solo": {modelo: fechas.decodificar(solo[c]) for c, modelo in enumerate(modelos)},
+        "acuerdo": acuerdo,
+        "por_modelo": por_modelo,
     }
 
+    if gold:
+        g = 1 << len(modelos)
+        resumen[GOLD] = {"path": str(gold), "casos": sum(k for (p, _), k in particiones.items() if p & g)}
+        for c, modelo in enumerate(modelos):
+            ambos = (1 << c) | g
+            tp = sum(k for (p, m), k in mascaras.items() if p & ambos == ambos and m & ambos == ambos)
+            fp = sum(k for (p, m), k in mascaras.items() if p & ambos == ambos and m & ambos == 1 << c)
+            fn = sum(k for (p, m), k in mascaras.items() if p & ambos == ambos and m & ambos == g)
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            por_modelo[modelo][GOLD] = {
+                "tp": tp, "fp": fp, "fn": fn,
+                "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4),
+            }
+    return resumen
+
+
+def imprimir_resumen(resumen: Dict[str, Any]) -> None:
+    """Tabla de acuerdo y, si hay gold, precisión/recall por modelo."""
+    modelos = resumen["modelos"]
+    print(f"{resumen['casos']} casos; en todos los modelos: {resumen['casos_en_todos']}, "
+          f"coinciden {resumen['casos_coinciden']} ({resumen['tasa_coinciden']:.1%})")
+    ancho = max(len(m) for m in modelos) + 2
+    celda = max(ancho, 12)
+    print("Acuerdo (casos idénticos / Jaccard de fechas):")
+    print(" " * ancho + "".join(f"{m:>{celda}}" for m in modelos))
+    for a in modelos:
+        celdas = "".join(f"{resumen['acuerdo'][a][b]['casos_iguales']:.0%}/{resumen['acuerdo'][a][b]['jaccard_fechas']:.2f}"
+                         .rjust(celda) for b in modelos)
+        print(f"{a:<{ancho}}{celdas}")
+    con_errores = {m: resumen["por_modelo"][m]["errores"] for m in modelos if resumen["por_modelo"][m]["errores"]}
+    if con_errores:
+        print("Filas con error (no se puntúan): " + ", ".join(f"{m}={k}" for m, k in con_errores.items()))
+    if GOLD in resumen:
+        print(f"Frente al gold ({resumen[GOLD]['casos']} casos):")
+        for modelo in modelos:
+            m = resumen["por_modelo"][modelo][GOLD]
+            print(f"  {modelo:<{ancho}} P={m['precision']:.3f}  R={m['recall']:.3f}  F1={m['f1']:.3f}  "
+                  f"(tp={m['tp']}, fp={m['fp']}, fn={m['fn']})")
+
+
 if __name__ == "__main__":
-    path_35 = RESULTS_DIR / "gpt-35-turbo.json"
-    path_4 = RESULTS_DIR / "gpt-4.json"
-    summary = comparar_resultados(path_35, path_4)
-    print(json.dumps(summary, ensure_ascii=False, indent=2))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compara los resultados de varios modelos (Dates Extractor)")
+    parser.add_argument("modelos", nargs="*", help="Modelos a comparar (por defecto, todos los de results/)")
+    parser.add_argument("--gold", type=Path, help="JSON/JSONL con las fechas esperadas ({input, fechas})")
+    parser.add_argument("--out", type=Path, default=RESUMEN_PATH, help="Fichero JSON del resumen")
+    parser.add_argument("--casos", type=Path, default=CASOS_PATH, help="JSONL con los casos con diferencias")
+    args = parser.parse_args()
+
+    modelos = args.modelos or modelos_disponibles()
+    if len(modelos) < 2 and not args.gold:
+        parser.error(f"Hacen falta al menos dos modelos (o un --gold); encontrados en {RESULTS_DIR}: {modelos}")
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.casos.parent.mkdir(parents=True, exist_ok=True)
+    resumen = comparar_resultados({m: ruta_modelo(m) for m in modelos}, gold=args.gold, salida_casos=args.casos)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    imprimir_resumen(resumen)
+    print(f"Resumen: {args.out}. Casos con diferencias: {args.casos}")
@@ -4,7 +4,7 @@ y guardar las respuestas en JSON.
 
 Responsabilidades del módulo:
 - Cargar variables de entorno desde 01_DatesExtractor/.env
-- Importar prompts (system_message y user_messages)
+- Importar prompts (system_message; los textos de text_examples se leen al ejecutar)
 - Invocar el endpoint de Azure OpenAI usando el SDK oficial (openai.AzureOpenAI)
 - Guardar los resultados en results/{OPENAI_MODEL}.json
 """
@@ -13,20 +13,29 @@ import os
 import json
 from pathlib import Path
 from typing import List, Dict
+import sys
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
 # Permitir ejecutar este archivo directamente (evita el error de importación relativa)
 try:
-    from ..prompts.prompts import system_message, user_messages  # type: ignore
+    from ..prompts.prompts import load_user_messages, system_message  # type: ignore
+    from ..utils.chunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, comprobar_fragmentacion, extraer_fechas_por_fragmentos  # type: ignore
 except Exception:
-    import sys
-    from pathlib import Path
     CURRENT_DIR = Path(__file__).resolve().parent 
     PACKAGE_ROOT = CURRENT_DIR.parent  # .../01_DatesExtractor
     if str(PACKAGE_ROOT) not in sys.path:
         sys.path.insert(0, str(PACKAGE_ROOT))
-    from prompts.prompts import system_message, user_messages
+    from prompts.prompts import load_user_messages, system_message
+    from utils.chunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, comprobar_fragmentacion, extraer_fechas_por_fragmentos
+
+# Raíz de 01_PromptEngineering para el motor de lotes compartido (common/)
+PROMPT_ENGINEERING_ROOT = Path(__file__).resolve().parents[2]
+if str(PROMPT_ENGINEERING_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROMPT_ENGINEERING_ROOT))
+from common.batch_runner import ChatJob, run_chat_jobs
+from common.clients import create_async_azure_client
+from common.response_cache import USE_DEFAULT_CACHE, add_cache_arguments, cache_from_args
+from common.jsonl_results import JsonlResults, add_results_arguments, compact, config_fingerprint, input_key
 
 # Cargar las credenciales desde el archivo .env ubicado en la raíz de 01_DatesExtractor
 BASE_DIR = Path(__file__).resolve().parent.parent  # .../01_DatesExtractor
@@ -47,69 +56,138 @@ OPENAI_MODEL = _getenv_any(["OPENAI_MODEL35", "OPENAI_MODEL"]) or "gpt-35-turbo"
 AZURE_OPENAI_ENDPOINT = _getenv_any(["AZURE_OPENAI_ENDPOINT_GPT35", "AZURE_OPENAI_ENDPOINT", "OPENAI_API_BASE", "AZURE_OPENAI_ENDPOINT_URL"])  # https://<recurso>.openai.azure.com/
 AZURE_API_VERSION = (_getenv_any(["AZURE_API_VERSION", "AZURE_OPENAI_API_VERSION", "OPENAI_API_VERSION"]) or "2025-01-01-preview").strip()
 
-if not OPENAI_API_KEY or not AZURE_OPENAI_ENDPOINT:
-    missing = []
-    if not OPENAI_API_KEY:
-        missing.append("AZURE_OPENAI_API_KEY/AZURE_OPENAI_KEY/OPENAI_API_KEY")
-    if not AZURE_OPENAI_ENDPOINT:
-        missing.append("AZURE_OPENAI_ENDPOINT/OPENAI_API_BASE")
-    raise ValueError(
-        "Faltan variables de entorno: "
-        + ", ".join(missing)
-        + (f". Se intentó cargar: {ENV_PATH} (existente={ENV_PATH.exists()}, cargado={_loaded})")
-    )
+def comprobar_credenciales():
+    """Lanza ValueError si faltan la clave o el endpoint (se comprueba al usar el modelo, no al importar)."""
+    if not OPENAI_API_KEY or not AZURE_OPENAI_ENDPOINT:
+        missing = []
+        if not OPENAI_API_KEY:
+            missing.append("AZURE_OPENAI_API_KEY/AZURE_OPENAI_KEY/OPENAI_API_KEY")
+        if not AZURE_OPENAI_ENDPOINT:
+            missing.append("AZURE_OPENAI_ENDPOINT/OPENAI_API_BASE")
+        raise ValueError(
+            "Faltan variables de entorno: "
+            + ", ".join(missing)
+            + (f". Se intentó cargar: {ENV_PATH} (existente={ENV_PATH.exists()}, cargado={_loaded})")
+        )
 
-# Instanciar el cliente de Azure OpenAI (SDK oficial de OpenAI)
-client = AzureOpenAI(
-    api_key=OPENAI_API_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version=AZURE_API_VERSION,
-)
+def crear_cliente_async():
+    """Crea el cliente asíncrono de Azure OpenAI (SDK oficial de OpenAI) para el motor de lotes."""
+    return create_async_azure_client(endpoint=AZURE_OPENAI_ENDPOINT, api_key=OPENAI_API_KEY, api_version=AZURE_API_VERSION)
 
-def llamar_modelo_35():
+def llamar_modelo_35(cache=USE_DEFAULT_CACHE, usar_reglas=True, max_tokens=DEFAULT_CHUNK_TOKENS, solapamiento=DEFAULT_OVERLAP_TOKENS, store=None):
     """
     Ejecuta el chat con el deployment (modelo) configurado y devuelve respuestas.
 
+    Los textos largos se dividen en fragmentos de `max_tokens` con `solapamiento`
+    (`utils.chunker`) y las fechas de todos los fragmentos se unen sin repetir. Antes de
+    llamar al modelo, el extractor de reglas (`utils.parser.extraer_fechas`) resuelve los
+    fragmentos sin ambigüedad; solo los casos difíciles se envían al modelo.
+    Las peticiones se lanzan en paralelo (concurrencia acotada, límite por minuto y
+    reintentos) con el motor común `common.batch_runner`; el orden se conserva.
+
+    Args:
+        cache: Caché de respuestas (por defecto la persistente; None para no usarla).
+        usar_reglas: False envía todos los textos al modelo.
+        max_tokens: Tokens máximos por fragmento.
+        solapamiento: Tokens repetidos entre fragmentos consecutivos.
+        store: JsonlResults opcional; se saltan los textos ya guardados y se añaden los nuevos.
+
     Returns: 
-        list[dict]: Lista con objetos {"input": str, "output": str} 
+        list[dict]: Lista con objetos {"input": str, "output": str, "origen": "reglas"|"modelo"|"reglas+modelo"} 
+        (solo de los textos procesados en esta ejecución)
     """
-    resultados = []
-
-    for user_msg in user_messages:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,  # En Azure, este es el deployment name
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_msg},
-            ],
-        )
-        content = resp.choices[0].message.content.strip() if resp.choices else ""
-        resultados.append({"input": user_msg, "output": content})
-
+    comprobar_credenciales()
+
+    def enviar_al_modelo(textos: List[str]):
+        jobs = [
+            ChatJob(
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": texto},
+                ],
+                params={"model": OPENAI_MODEL},
+            )
+            for texto in textos
+        ]
+        return run_chat_jobs(crear_cliente_async, jobs, cache=cache)
+
+    # Con `store` (JsonlResults) se saltan los textos ya guardados y se añaden los nuevos
+    textos = load_user_messages()
+    huella = huella_config(usar_reglas, max_tokens, solapamiento)
+    claves = [input_key(texto, OPENAI_MODEL, huella) for texto in textos]
+    pendientes = [i for i, clave in enumerate(claves) if store is None or clave not in store]
+    resultados = extraer_fechas_por_fragmentos(
+        [textos[i] for i in pendientes], enviar_al_modelo,
+        usar_reglas=usar_reglas, max_tokens=max_tokens, solapamiento=solapamiento,
+    )
+    for i, resultado in zip(pendientes, resultados if store is not None else ()):
+        # Los errores no se guardan: la próxima ejecución vuelve a intentarlo
+        if not resultado["output"].startswith("<error:"):
+            store.write(claves[i], resultado)
     return resultados
 
-def guardar_resultados_en_json(resultados: List[Dict[str, str]], modelo: str) -> str:
+def huella_config(usar_reglas=True, max_tokens=DEFAULT_CHUNK_TOKENS, solapamiento=DEFAULT_OVERLAP_TOKENS):
+    """Huella del prompt del sistema y de las opciones que cambian la salida (parte de la clave del JSONL)."""
+    return config_fingerprint(system_message, OPENAI_MODEL, usar_reglas, max_tokens, solapamiento)
+
+def ruta_resultados(modelo: str, extension: str = "json") -> Path:
     """
-    Guarda los resultados en un archivo JSON en la carpeta results.
+    Ruta results/{modelo}.{extension} (JSON de siempre o JSONL incremental).
 
     Args:
-        resultados (list[dict]): Lista de resultados con input/output.
         modelo (str): Nombre del deployment (modelo) utilizado.
+        extension (str): "json" o "jsonl".
     """
-    from pathlib import Path
     base_dir = Path(__file__).resolve().parent.parent  # .../01_DatesExtractor
     results_dir = base_dir / "results"
     results_dir.mkdir(parents=True, exist_ok=True)
 
     # Sanitizar nombre de archivo para evitar caracteres raros
     safe_model = "".join(c for c in modelo if c.isalnum() or c in ("-", "_", "."))
-    file_path = results_dir / f"{safe_model}.json"
+    return results_dir / f"{safe_model}.{extension}"
+
+def guardar_resultados_en_json(resultados: List[Dict[str, str]], modelo: str) -> str:
+    """
+    Guarda los resultados en un archivo JSON en la carpeta results.
+
+    Args:
+        resultados (list[dict]): Lista de resultados con input/output.
+        modelo (str): Nombre del deployment (modelo) utilizado.
+    """
+    file_path = ruta_resultados(modelo)
     with open(file_path, "w", encoding="utf-8") as json_file:
         json.dump(resultados, json_file, ensure_ascii=False, indent=2)
 
     return str(file_path)
 
 if __name__ == "__main__":
-    resultados = llamar_modelo_35()
-    out_path = guardar_resultados_en_json(resultados, OPENAI_MODEL)
-    print(f"Resultados guardados en: {out_path}")
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Extracción de fechas con GPT-3.5")
+    add_cache_arguments(parser)
+    parser.add_argument("--no-regex", action="store_true", help="Enviar todos los textos al modelo (sin el extractor de reglas)")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Tokens máximos por fragmento de texto")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_OVERLAP_TOKENS, help="Tokens de solapamiento entre fragmentos")
+    add_results_arguments(parser)
+    args = parser.parse_args()
+    try:
+        comprobar_fragmentacion(args.chunk_tokens, args.chunk_overlap)
+    except ValueError as e:
+        parser.error(str(e))
+    comprobar_credenciales()
+    with JsonlResults(ruta_resultados(OPENAI_MODEL, "jsonl"), resume=not args.fresh) as store:
+        if store.resumed:
+            print(f"{store.resumed} textos ya procesados en {store.path.name}")
+        resultados = llamar_modelo_35(
+            cache=cache_from_args(args), usar_reglas=not args.no_regex,
+            max_tokens=args.chunk_tokens, solapamiento=args.chunk_overlap, store=store,
+        )
+    if args.no_compact:
+        print(f"Resultados en: {store.path}")
+    else:
+        # JSON de siempre, en el orden de text_examples: guardados + errores de esta ejecución
+        huella = huella_config(not args.no_regex, args.chunk_tokens, args.chunk_overlap)
+        errores = {input_key(r["input"], OPENAI_MODEL, huella): r for r in resultados}
+        claves = [input_key(texto, OPENAI_MODEL, huella) for texto in load_user_messages()]
+        out_path = compact(store.path, ruta_resultados(OPENAI_MODEL),
+                           lambda records: [records[c] if c in records else errores[c] for c in claves])
+        print(f"Resultados guardados en: {out_path}")
@@ -7,19 +7,29 @@ import os
 import json
 from pathlib import Path
 from typing import List, Dict
+import sys
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
 # Importar prompts con relativa y fallback absoluto si se ejecuta como script
 try:
-    from ..prompts.prompts import system_message, user_messages  # type: ignore
+    from ..prompts.prompts import load_user_messages, system_message  # type: ignore
+    from ..utils.chunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, comprobar_fragmentacion, extraer_fechas_por_fragmentos  # type: ignore
 except Exception:
-    import sys
     CURRENT_DIR = Path(__file__).resolve().parent
     PACKAGE_ROOT = CURRENT_DIR.parent  # .../01_DatesExtractor
     if str(PACKAGE_ROOT) not in sys.path:
         sys.path.insert(0, str(PACKAGE_ROOT))
-    from prompts.prompts import system_message, user_messages
+    from prompts.prompts import load_user_messages, system_message
+    from utils.chunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, comprobar_fragmentacion, extraer_fechas_por_fragmentos
+
+# Raíz de 01_PromptEngineering para el motor de lotes compartido (common/)
+PROMPT_ENGINEERING_ROOT = Path(__file__).resolve().parents[2]
+if str(PROMPT_ENGINEERING_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROMPT_ENGINEERING_ROOT))
+from common.batch_runner import ChatJob, run_chat_jobs
+from common.clients import create_async_azure_client
+from common.response_cache import USE_DEFAULT_CACHE, add_cache_arguments, cache_from_args
+from common.jsonl_results import JsonlResults, add_results_arguments, compact, config_fingerprint, input_key
 
 # Cargar .env desde la raíz de 01_DatesExtractor
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,54 +49,108 @@ OPENAI_MODEL = _getenv_any(["OPENAI_MODEL4", "OPENAI_MODEL"]) or "gpt-4"  # nomb
 AZURE_OPENAI_ENDPOINT = _getenv_any(["AZURE_OPENAI_ENDPOINT_GPT4", "AZURE_OPENAI_ENDPOINT", "OPENAI_API_BASE"]) 
 AZURE_API_VERSION = _getenv_any(["AZURE_API_VERSION", "AZURE_OPENAI_API_VERSION"]) or "2025-01-01-preview"
 
-missing = []
-if not OPENAI_API_KEY:
-    missing.append("AZURE_OPENAI_API_KEY/AZURE_OPENAI_KEY/OPENAI_API_KEY")
-if not AZURE_OPENAI_ENDPOINT:
-    missing.append("AZURE_OPENAI_ENDPOINT/OPENAI_API_BASE")
-if missing:
-    raise ValueError(
-        "Faltan variables de entorno: " + ", ".join(missing) + f". Se intentó cargar: {ENV_PATH} (existente={ENV_PATH.exists()}, cargado={_loaded})"
-    )
+def comprobar_credenciales():
+    """Lanza ValueError si faltan la clave o el endpoint (al usar el modelo, no al importar)."""
+    missing = []
+    if not OPENAI_API_KEY:
+        missing.append("AZURE_OPENAI_API_KEY/AZURE_OPENAI_KEY/OPENAI_API_KEY")
+    if not AZURE_OPENAI_ENDPOINT:
+        missing.append("AZURE_OPENAI_ENDPOINT/OPENAI_API_BASE")
+    if missing:
+        raise ValueError(
+            "Faltan variables de entorno: " + ", ".join(missing) + f". Se intentó cargar: {ENV_PATH} (existente={ENV_PATH.exists()}, cargado={_loaded})"
+        )
+
+def crear_cliente_async():
+    """Cliente asíncrono Azure OpenAI (SDK openai) para el motor de lotes."""
+    return create_async_azure_client(endpoint=AZURE_OPENAI_ENDPOINT, api_key=OPENAI_API_KEY, api_version=AZURE_API_VERSION)
 
-# Cliente Azure OpenAI (SDK openai)
-client = AzureOpenAI(
-    api_key=OPENAI_API_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version=AZURE_API_VERSION,
-)
+def llamar_modelo_4(cache=USE_DEFAULT_CACHE, usar_reglas=True, max_tokens=DEFAULT_CHUNK_TOKENS, solapamiento=DEFAULT_OVERLAP_TOKENS, store=None) -> List[Dict[str, str]]:
+    """Ejecuta los prompts contra el deployment GPT-4 (en paralelo, con el motor
+    común de lotes) y devuelve una lista de objetos {input, output, origen} en orden.
 
-def llamar_modelo_4() -> List[Dict[str, str]]:
-    """Ejecuta los prompts contra el deployment GPT-4 y devuelve
-    una lista de objetos {input, output}.
+    Los textos largos se dividen en fragmentos de `max_tokens` (con `solapamiento`) y
+    las fechas se unen sin repetir. Los fragmentos que el extractor de reglas resuelve
+    sin ambigüedad no se envían al modelo (origen "reglas"); `usar_reglas=False` los
+    envía todos. Con `store` (JsonlResults) solo se procesan y devuelven los textos
+    que aún no están guardados.
     """
-    resultados: List[Dict[str, str]] = []
-    for user_msg in user_messages:
-        try:
-            resp = client.chat.completions.create(
-                model=OPENAI_MODEL,
+    comprobar_credenciales()
+
+    def enviar_al_modelo(textos: List[str]):
+        jobs = [
+            ChatJob(
                 messages=[
                     {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_msg},
+                    {"role": "user", "content": texto},
                 ],
+                params={"model": OPENAI_MODEL},
             )
-            content = resp.choices[0].message.content.strip() if resp.choices else ""
-        except Exception as e:
-            content = f"<error: {type(e).__name__}: {e}>"
-        resultados.append({"input": user_msg, "output": content})
+            for texto in textos
+        ]
+        return run_chat_jobs(crear_cliente_async, jobs, cache=cache)
+
+    # Con `store` (JsonlResults) se saltan los textos ya guardados y se añaden los nuevos
+    textos = load_user_messages()
+    huella = huella_config(usar_reglas, max_tokens, solapamiento)
+    claves = [input_key(texto, OPENAI_MODEL, huella) for texto in textos]
+    pendientes = [i for i, clave in enumerate(claves) if store is None or clave not in store]
+    resultados = extraer_fechas_por_fragmentos(
+        [textos[i] for i in pendientes], enviar_al_modelo,
+        usar_reglas=usar_reglas, max_tokens=max_tokens, solapamiento=solapamiento,
+    )
+    for i, resultado in zip(pendientes, resultados if store is not None else ()):
+        # Los errores no se guardan: la próxima ejecución vuelve a intentarlo
+        if not resultado["output"].startswith("<error:"):
+            store.write(claves[i], resultado)
     return resultados
 
-def guardar_resultados_en_json(resultados: List[Dict[str, str]], modelo: str) -> str:
-    """Guarda los resultados en results/{modelo}.json y devuelve la ruta."""
+def huella_config(usar_reglas=True, max_tokens=DEFAULT_CHUNK_TOKENS, solapamiento=DEFAULT_OVERLAP_TOKENS):
+    """Huella del prompt del sistema y de las opciones que cambian la salida (parte de la clave del JSONL)."""
+    return config_fingerprint(system_message, OPENAI_MODEL, usar_reglas, max_tokens, solapamiento)
+
+def ruta_resultados(modelo: str, extension: str = "json") -> Path:
+    """results/{modelo}.{extension} (JSON de siempre o JSONL incremental)."""
     results_dir = (Path(__file__).resolve().parent.parent / "results")
     results_dir.mkdir(parents=True, exist_ok=True)
     safe_model = "".join(c for c in modelo if c.isalnum() or c in ("-", "_", "."))
-    file_path = results_dir / f"{safe_model}.json"
+    return results_dir / f"{safe_model}.{extension}"
+
+def guardar_resultados_en_json(resultados: List[Dict[str, str]], modelo: str) -> str:
+    """Guarda los resultados en results/{modelo}.json y devuelve la ruta."""
+    file_path = ruta_resultados(modelo)
     with open(file_path, "w", encoding="utf-8") as f:
         json.dump(resultados, f, ensure_ascii=False, indent=2)
     return str(file_path)
 
 if __name__ == "__main__":
-    resultados = llamar_modelo_4()
-    out_path = guardar_resultados_en_json(resultados, OPENAI_MODEL)
-    print(f"Resultados guardados en: {out_path}")
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Extracción de fechas con GPT-4")
+    add_cache_arguments(parser)
+    parser.add_argument("--no-regex", action="store_true", help="Enviar todos los textos al modelo (sin el extractor de reglas)")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS, help="Tokens máximos por fragmento de texto")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_OVERLAP_TOKENS, help="Tokens de solapamiento entre fragmentos")
+    add_results_arguments(parser)
+    args = parser.parse_args()
+    try:
+        comprobar_fragmentacion(args.chunk_tokens, args.chunk_overlap)
+    except ValueError as e:
+        parser.error(str(e))
+    comprobar_credenciales()
+    with JsonlResults(ruta_resultados(OPENAI_MODEL, "jsonl"), resume=not args.fresh) as store:
+        if store.resumed:
+            print(f"{store.resumed} textos ya procesados en {store.path.name}")
+        resultados = llamar_modelo_4(
+            cache=cache_from_args(args), usar_reglas=not args.no_regex,
+            max_tokens=args.chunk_tokens, solapamiento=args.chunk_overlap, store=store,
+        )
+    if args.no_compact:
+        print(f"Resultados en: {store.path}")
+    else:
+        # JSON de siempre, en el orden de text_examples: guardados + errores de esta ejecución
+        huella = huella_config(not args.no_regex, args.chunk_tokens, args.chunk_overlap)
+        errores = {input_key(r["input"], OPENAI_MODEL, huella): r for r in resultados}
+        claves = [input_key(texto, OPENAI_MODEL, huella) for texto in load_user_messages()]
+        out_path = compact(store.path, ruta_resultados(OPENAI_MODEL),
+                           lambda records: [records[c] if c in records else errores[c] for c in claves])
+        print(f"Resultados guardados en: {out_path}")
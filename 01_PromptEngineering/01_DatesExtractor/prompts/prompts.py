@@ -1,5 +1,6 @@
 # Prompts para el sistema y el usuario en el ejercicio de extracción de fechas
 import os
+from functools import lru_cache
 
 # System Message
 system_message = """
@@ -16,11 +17,23 @@ Devuelve la respuesta en formato de lista Python, así:
 ]
 """
 
-# Cargar mensajes de usuario desde archivos en la carpeta text_examples
+# Mensajes de usuario: un archivo por texto en la carpeta text_examples
 text_examples_dir = os.path.join(os.path.dirname(__file__), "..", "text_examples")
-user_messages = []
 
-for filename in sorted(os.listdir(text_examples_dir)):
-    if filename.endswith(".txt"):
-        with open(os.path.join(text_examples_dir, filename), "r", encoding="utf-8") as file:
-            user_messages.append(file.read().strip())
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def load_user_messages():
+    """Lee los textos de text_examples la primera vez que se piden (no al importar el módulo)."""
+    user_messages = []
+    for filename in sorted(os.listdir(text_examples_dir)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(text_examples_dir, filename), "r", encoding="utf-8") as file:
+                user_messages.append(file.read().strip())
+    return tuple(user_messages)
+
+
+def __getattr__(name):
+    # `from prompts.prompts import user_messages` sigue funcionando, pero la carga es perezosa
+    if name == "user_messages":
+        return list(load_user_messages())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,182 @@
+# División de textos largos en fragmentos por tokens (con solapamiento) para la
+# extracción de fechas.
+#
+# Los contratos y documentos largos no caben en la ventana de contexto o generan una
+# única llamada lenta y cara en la que el modelo "se olvida" de fechas. Aquí el texto
+# se corta por frases en fragmentos de como máximo `max_tokens`, repitiendo al inicio
+# de cada fragmento las últimas frases del anterior (`solapamiento` tokens) para no
+# partir una fecha por la mitad. Los fragmentos se procesan en paralelo y las fechas
+# se unen sin repetir, en orden de aparición.
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .parser import extraer_fechas, fechas_de_respuesta
+
+DEFAULT_CHUNK_TOKENS = int(os.getenv("DATES_CHUNK_TOKENS", "2000"))
+DEFAULT_OVERLAP_TOKENS = int(os.getenv("DATES_CHUNK_OVERLAP_TOKENS", "150"))
+# Codificación de gpt-35-turbo / gpt-4
+TOKEN_ENCODING = "cl100k_base"
+
+_FRASES = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+@lru_cache(maxsize=1)
+def _codificador():
+    try:
+        import tiktoken
+    except ImportError:
+        print("tiktoken no está instalado (pip install tiktoken); se estiman ~4 caracteres por token")
+        return None
+    return tiktoken.get_encoding(TOKEN_ENCODING)
+
+
+def contar_tokens(texto: str) -> int:
+    """Tokens del texto con tiktoken (o una estimación si no está instalado)."""
+    enc = _codificador()
+    if enc is None:
+        return max(1, (len(texto) + 3) // 4) if texto else 0
+    return len(enc.encode(texto))
+
+
+def comprobar_fragmentacion(max_tokens: int, solapamiento: int) -> None:
+    """Lanza ValueError si el tamaño de fragmento o el solapamiento no son válidos."""
+    if max_tokens < 1:
+        raise ValueError(f"El tamaño de fragmento debe ser de al menos 1 token (recibido: {max_tokens})")
+    if not 0 <= solapamiento < max_tokens:
+        raise ValueError(f"El solapamiento debe estar entre 0 y {max_tokens - 1} tokens, menor que el "
+                         f"tamaño de fragmento (recibido: {solapamiento})")
+
+
+def _partir_frase(frase: str, max_tokens: int) -> List[str]:
+    """Corta por palabras una frase que por sí sola supera `max_tokens`."""
+    trozos, actual, tokens = [], [], 0
+    palabras = []
+    for palabra in frase.split():
+        # Una "palabra" gigante (tablas, base64...) se corta por caracteres (≥1 carácter por token)
+        palabras.extend(palabra[k:k + max_tokens] for k in range(0, len(palabra), max_tokens))
+    for palabra in palabras:
+        n = contar_tokens(palabra + " ")
+        if actual and tokens + n > max_tokens:
+            trozos.append(" ".join(actual))
+            actual, tokens = [], 0
+        actual.append(palabra)
+        tokens += n
+    if actual:
+        trozos.append(" ".join(actual))
+    return trozos
+
+
+def dividir_en_fragmentos(
+    texto: str,
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    solapamiento: int = DEFAULT_OVERLAP_TOKENS,
+) -> List[str]:
+    """Divide el texto en fragmentos de como máximo `max_tokens` tokens.
+
+    Los textos que caben enteros se devuelven tal cual (un único fragmento). Lanza ValueError
+    si `max_tokens` < 1 o `solapamiento` no está en [0, max_tokens).
+    """
+    comprobar_fragmentacion(max_tokens, solapamiento)
+    if contar_tokens(texto) <= max_tokens:
+        return [texto]
+
+    frases: List[tuple] = []
+    for frase in _FRASES.split(texto):
+        frase = frase.strip()
+        if not frase:
+            continue
+        n = contar_tokens(frase)
+        if n > max_tokens:
+            frases.extend((t, contar_tokens(t)) for t in _partir_frase(frase, max_tokens))
+        else:
+            frases.append((frase, n))
+
+    fragmentos: List[str] = []
+    actual: List[tuple] = []
+    tokens = 0
+    for frase, n in frases:
+        if actual and tokens + n > max_tokens:
+            fragmentos.append(" ".join(f for f, _ in actual))
+            # Solapamiento: últimas frases del fragmento anterior que quepan en `solapamiento`
+            previo, tokens = [], 0
+            for f, m in reversed(actual):
+                if tokens + m > solapamiento or tokens + m + n > max_tokens:
+                    break
+                previo.insert(0, (f, m))
+                tokens += m
+            actual = previo
+        actual.append((frase, n))
+        tokens += n
+    if actual:
+        fragmentos.append(" ".join(f for f, _ in actual))
+    return fragmentos
+
+
+def extraer_fechas_por_fragmentos(
+    textos: Sequence[str],
+    enviar_al_modelo: Callable[[List[str]], list],
+    *,
+    usar_reglas: bool = True,
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    solapamiento: int = DEFAULT_OVERLAP_TOKENS,
+) -> List[Dict[str, str]]:
+    """Extrae las fechas de cada texto, fragmentando los largos.
+
+    Args:
+        textos: Textos de entrada (uno por resultado).
+        enviar_al_modelo: Recibe los fragmentos que necesitan el modelo y devuelve un
+            resultado por fragmento, en orden (objetos con `ok`, `content` y `error`,
+            como `common.batch_runner.ChatResult`). Se llama una sola vez, así que todos
+            los fragmentos de todos los textos van en paralelo.
+        usar_reglas: Resolver con `extraer_fechas` los fragmentos sin ambigüedad.
+
+    Returns:
+        list[dict]: {"input", "output", "origen"} por texto. `output` es siempre la lista
+        JSON de fechas dd/mm/yyyy unidas (también si el texto cabe en un fragmento), o
+        `<error: ...>` si falló alguna llamada.
+    """
+    fragmentos = [(i, trozo) for i, texto in enumerate(textos)
+                  for trozo in dividir_en_fragmentos(texto, max_tokens, solapamiento)]
+    previas = [extraer_fechas(trozo) if usar_reglas else None for _, trozo in fragmentos]
+    pendientes = [j for j, p in enumerate(previas) if p is None or not p.confiable]
+    respuestas = {}
+    if pendientes:
+        respuestas = dict(zip(pendientes, enviar_al_modelo([fragmentos[j][1] for j in pendientes])))
+
+    por_texto: Dict[int, List[int]] = {}
+    for j, (i, _) in enumerate(fragmentos):
+        por_texto.setdefault(i, []).append(j)
+    print(f"Fechas: {len(textos)} textos -> {len(fragmentos)} fragmentos; "
+          f"{len(fragmentos) - len(pendientes)} resueltos por reglas, {len(pendientes)} enviados al modelo")
+
+    resultados: List[Dict[str, str]] = []
+    for i, texto in enumerate(textos):
+        indices = por_texto.get(i, [])
+        error: Optional[str] = None
+        fechas: List[str] = []
+        for j in indices:
+            r = respuestas.get(j)
+            if r is None:
+                nuevas = previas[j].fechas
+            elif r.ok:
+                nuevas = fechas_de_respuesta(r.content)
+            else:
+                error = error or str(r.error)
+                continue
+            for fecha in nuevas:
+                if fecha not in fechas:
+                    fechas.append(fecha)
+
+        origenes = {"modelo" if j in respuestas else "reglas" for j in indices}
+        origen = origenes.pop() if len(origenes) == 1 else "reglas+modelo"
+        if error is not None:
+            output = f"<error: {error}>"
+        else:
+            output = json.dumps(fechas, ensure_ascii=False)
+        resultados.append({"input": texto, "output": output, "origen": origen})
+    return resultados
+
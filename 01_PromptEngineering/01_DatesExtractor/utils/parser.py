@@ -1,4 +1,177 @@
 # Este archivo contiene funciones para procesar el texto y extraer fechas.
+#
+# Extractor basado en reglas (expresiones regulares compiladas una sola vez) para las
+# formas habituales en español e inglés:
+#   - numéricas: 2023-04-15, 15/04/2023, 15-04-2023, 15.04.2023, 10/15/2023 (mm/dd si el
+#     segundo número > 12)
+#   - con el mes en palabras: "3 de marzo de 2024", "1º de agosto del 2023",
+#     "March 3, 2024", "3rd of March 2024", "Mar 3 2024"
+#   - rangos con mes/año compartidos: "del 1 al 5 de marzo de 2024", "March 3-5, 2024"
+#
+# Todas se normalizan a dd/mm/yyyy. Si el texto tiene algo que las reglas no pueden
+# resolver con seguridad (11-01-2023: ¿1 de noviembre o 11 de enero?, fechas sin año,
+# "mañana", "next Monday"...) el resultado se marca como no confiable y ese texto se
+# envía al LLM. Así el modelo solo recibe los casos difíciles.
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+MESES = {
+    # español
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+    "ene": 1, "feb": 2, "mar": 3, "abr": 4, "may": 5, "jun": 6, "jul": 7, "ago": 8,
+    "sep": 9, "sept": 9, "set": 9, "oct": 10, "nov": 11, "dic": 12,
+    # inglés
+    "january": 1, "february": 2, "march": 3, "april": 4, "june": 6, "july": 7, "august": 8,
+    "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "apr": 4, "aug": 8, "dec": 12,
+}
+
+_MES = r"(?P<{name}>" + "|".join(sorted(MESES, key=len, reverse=True)) + r")\.?"
+_DIA = r"(?P<{name}>[0-3]?\d)(?:º|°|st|nd|rd|th)?"
+_ANIO = r"(?P<{name}>\d{{4}})"
+_SEP_ANIO = r"(?:\s*,\s*|\s+de[l]?\s+|\s+)"
+
+
+def _p(template: str, **names: str) -> str:
+    return template.format(**names)
+
+
+_PATRONES = [
+    # 2023-04-15 / 2023/04/15
+    ("iso", re.compile(r"\b(?P<y>\d{4})[-/.](?P<m>[01]?\d)[-/.](?P<d>[0-3]?\d)\b")),
+    # del 1 al 5 de marzo de 2024 / entre el 3 y el 7 de mayo de 2024
+    ("rango_es", re.compile(
+        _p(_DIA, name="d1") + r"\s*(?:al|a|y el|y|-|–)\s*" + _p(_DIA, name="d2")
+        + r"\s+de\s+" + _p(_MES, name="m") + _SEP_ANIO + _p(_ANIO, name="y"), re.IGNORECASE)),
+    # March 3-5, 2024 / March 3 to 5, 2024
+    ("rango_en", re.compile(
+        _p(_MES, name="m") + r"\s+" + _p(_DIA, name="d1") + r"\s*(?:-|–|to|through)\s*"
+        + _p(_DIA, name="d2") + r"\s*,?\s*" + _p(_ANIO, name="y"), re.IGNORECASE)),
+    # 3 de marzo de 2024 / 3rd of March 2024 / 3 March 2024
+    ("dia_mes", re.compile(
+        r"\b" + _p(_DIA, name="d") + r"\s+(?:de\s+|of\s+)?" + _p(_MES, name="m") + r"\b" + _SEP_ANIO
+        + _p(_ANIO, name="y"), re.IGNORECASE)),
+    # March 3, 2024 / octubre 23, 2023
+    ("mes_dia", re.compile(
+        r"\b" + _p(_MES, name="m") + r"\s+" + _p(_DIA, name="d") + r"\s*,?\s*" + _p(_ANIO, name="y"),
+        re.IGNORECASE)),
+    # 15/04/2023, 15-04-2023, 15.04.2023, 10/15/2023
+    ("numerica", re.compile(r"\b(?P<a>[0-3]?\d)[-/.](?P<b>[0-3]?\d)[-/.](?P<y>\d{4})\b")),
+]
+
+# Restos que indican fechas que las reglas no resuelven (el texto irá al LLM)
+_RESIDUOS = re.compile(
+    r"\b(?:" + "|".join(sorted(MESES, key=len, reverse=True)) + r")\b"
+    r"|\b\d{1,2}[-/.]\d{1,2}(?:[-/.]\d{2})?\b"
+    r"|\b(?:hoy|ayer|mañana|pasado mañana|anteayer|próxim[oa]|lunes|martes|miércoles|jueves|viernes|sábado|domingo"
+    r"|today|tomorrow|yesterday|next|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE,
+)
+# Horas (14:30, 09:00 AM): se ignoran, no son fechas
+_HORAS = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?m\.?)?", re.IGNORECASE)
+# "may" es también verbo en inglés: solo cuenta como residuo junto a un número
+_MAY_VERBO = re.compile(r"\bmay\b(?!\s+\d)", re.IGNORECASE)
+
+
+@dataclass
+class ResultadoExtraccion:
+    """Fechas encontradas por las reglas y si son suficientes para no llamar al modelo."""
+
+    fechas: List[str] = field(default_factory=list)
+    confiable: bool = True
+    motivos: List[str] = field(default_factory=list)
+
+
+def _formatear(dia: int, mes: int, anio: int) -> Optional[str]:
+    try:
+        return date(anio, mes, dia).strftime("%d/%m/%Y")
+    except ValueError:
+        return None
+
+
+def _resolver_numerica(a: int, b: int) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """(dia, mes) de una fecha numérica y si es ambigua (dd/mm vs mm/dd)."""
+    if a > 12 and b <= 12:
+        return (a, b), False          # 15/04/2023
+    if b > 12 and a <= 12:
+        return (b, a), False          # 10/15/2023 (formato EE. UU.)
+    if a <= 12 and b <= 12:
+        return (a, b), a != b         # 11-01-2023 es ambigua; 10-10-2023 no
+    return None, False
+
+
+def extraer_fechas(texto: str) -> ResultadoExtraccion:
+    """Extrae las fechas del texto con reglas y evalúa si el resultado es fiable."""
+    resultado = ResultadoExtraccion()
+    ocupado = [False] * len(texto)
+    encontradas: List[Tuple[int, str]] = []
+
+    for nombre, patron in _PATRONES:
+        for m in patron.finditer(texto):
+            if any(ocupado[m.start():m.end()]):
+                continue
+            g = m.groupdict()
+            fechas: List[Optional[str]] = []
+            if nombre == "iso":
+                fechas = [_formatear(int(g["d"]), int(g["m"]), int(g["y"]))]
+            elif nombre in ("rango_es", "rango_en"):
+                mes = MESES[g["m"].lower()]
+                fechas = [_formatear(int(g["d1"]), mes, int(g["y"])), _formatear(int(g["d2"]), mes, int(g["y"]))]
+            elif nombre in ("dia_mes", "mes_dia"):
+                fechas = [_formatear(int(g["d"]), MESES[g["m"].lower()], int(g["y"]))]
+            else:
+                dia_mes, ambigua = _resolver_numerica(int(g["a"]), int(g["b"]))
+                if ambigua:
+                    resultado.confiable = False
+                    resultado.motivos.append(f"fecha ambigua dd/mm o mm/dd: {m.group(0)}")
+                fechas = [_formatear(dia_mes[0], dia_mes[1], int(g["y"])) if dia_mes else None]
+
+            if any(f is None for f in fechas):
+                resultado.confiable = False
+                resultado.motivos.append(f"fecha no válida: {m.group(0)}")
+                continue
+            for i in range(m.start(), m.end()):
+                ocupado[i] = True
+            encontradas.extend((m.start(), f) for f in fechas)
+
+    # Lo que queda sin cubrir (quitando horas) no debe parecer una fecha
+    resto = "".join(" " if o else c for c, o in zip(texto, ocupado))
+    resto = _MAY_VERBO.sub(" ", _HORAS.sub(" ", resto))
+    for m in _RESIDUOS.finditer(resto):
+        resultado.confiable = False
+        resultado.motivos.append(f"posible fecha sin resolver: {m.group(0)}")
+
+    vistas = set()
+    for _, fecha in sorted(encontradas, key=lambda x: x[0]):
+        if fecha not in vistas:
+            vistas.add(fecha)
+            resultado.fechas.append(fecha)
+    return resultado
+
+
+_FECHA_SALIDA = re.compile(r"\b([0-3]?\d)/([01]?\d)/(\d{4})\b")
+
+
+@lru_cache(maxsize=8192)
+def _fecha_de_salida(dia: str, mes: str, anio: str) -> Optional[str]:
+    # Las mismas fechas se repiten mucho al comparar miles de resultados
+    return _formatear(int(dia), int(mes), int(anio))
+
+
+def fechas_de_respuesta(respuesta: str) -> List[str]:
+    """Fechas dd/mm/yyyy de la salida del modelo (lista JSON/Python o texto libre), sin repetir."""
+    fechas: List[str] = []
+    for d, m, y in _FECHA_SALIDA.findall(respuesta or ""):
+        fecha = _fecha_de_salida(d, m, y)
+        if fecha and fecha not in fechas:
+            fechas.append(fecha)
+    return fechas
+
 
 def procesar_texto_y_extraer_fechas(texto):
     """
@@ -8,7 +181,6 @@ def procesar_texto_y_extraer_fechas(texto):
         texto (str): El texto a procesar.
 
     Returns:
-        list: Una lista de fechas en formato dd/mm/yyyy.
+        list: Una lista de fechas en formato dd/mm/yyyy (en orden de aparición, sin repetir).
     """
-    # Implementación pendiente
-    pass
\ No newline at end of file
+    return extraer_fechas(texto).fechas
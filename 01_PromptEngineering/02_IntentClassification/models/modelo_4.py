@@ -1,15 +1,26 @@
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 import os
 import sys
+import argparse
 
 # Calcular la raíz del proyecto (02_IntentClassification) y añadirla a sys.path
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
+# Raíz de 01_PromptEngineering para el motor de lotes compartido (common/)
+PROMPT_ENGINEERING_ROOT = os.path.dirname(PROJECT_ROOT)
+if PROMPT_ENGINEERING_ROOT not in sys.path:
+    sys.path.insert(0, PROMPT_ENGINEERING_ROOT)
 
-from prompts.system_message import get_system_message
+from prompts.system_message import INTENCIONES, get_system_message
 from prompts.user_message import get_user_message
+from common.batch_runner import ChatJob, run_chat_jobs
+from common.batch_api import BATCH_API_VERSION, run_batch_jobs
+from common.response_cache import USE_DEFAULT_CACHE, add_cache_arguments, cache_from_args
+from common.dedup import DEFAULT_SIMILARITY, add_dedup_arguments, dedup_inputs
+from common.clients import create_async_azure_client, get_azure_client
+from common.packing import add_packing_arguments, run_packed
+from common.jsonl_results import JsonlResults, add_results_arguments, compact, config_fingerprint, input_key
 
 # Cargar variables de entorno desde el .env del proyecto
 dotenv_path = os.path.join(PROJECT_ROOT, '.env')
@@ -21,53 +32,133 @@ ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT_GPT4")
 API_VERSION = os.getenv("AZURE_API_VERSION") or os.getenv("AZURE_OPENAI_API_VERSION") or "2024-06-01"
 DEPLOYMENT = os.getenv("OPENAI_MODEL4", "gpt-4")
 
-# Inicializar cliente Azure OpenAI
-client = AzureOpenAI(
-    api_key=API_KEY,
-    azure_endpoint=ENDPOINT,
-    api_version=API_VERSION,
-)
+def crear_cliente_async():
+    """Cliente Azure OpenAI asíncrono para el motor de lotes común."""
+    return create_async_azure_client(endpoint=ENDPOINT, api_key=API_KEY, api_version=API_VERSION)
 
-def main():
-    # Frases de ejemplo
+def construir_job(text):
+    """Trabajo de chat (system + user) para una entrada."""
+    return ChatJob(
+        messages=[
+            {"role": "system", "content": get_system_message()},
+            {"role": "user", "content": get_user_message(text)},
+        ],
+        params={"model": DEPLOYMENT, "temperature": 0, "max_tokens": 100},  # deployment en Azure
+    )
+
+def enviar(jobs, etiqueta="", batch=False, cache=USE_DEFAULT_CACHE, on_result=None):
+    """Ejecuta los trabajos en paralelo o vía Batch API; los resultados vuelven en el orden de entrada.
+
+    `on_result` se invoca con cada ChatResult en cuanto termina (en modo batch, al acabar el lote).
+    """
+    if batch:
+        client = get_azure_client(endpoint=ENDPOINT, api_key=API_KEY, api_version=BATCH_API_VERSION)
+        name = "-".join(p for p in ("gpt-4-intents", etiqueta) if p)
+        results = run_batch_jobs(client, jobs, name=name, work_dir=os.path.join(PROJECT_ROOT, "data", "batch"), cache=cache)
+        for r in results if on_result else ():
+            on_result(r)
+        return results
+    return run_chat_jobs(crear_cliente_async, jobs, cache=cache, on_result=on_result)
+
+def clasificar(textos, batch=False, cache=USE_DEFAULT_CACHE, pack=0, on_result=None):
+    """Una respuesta (ChatResult o PackedResult: .ok/.content/.error) por texto, en orden.
+
+    Con pack=K > 1 se envían K frases numeradas por petición con respuesta estructurada
+    (tool calling, enum de intenciones); las que falten o no sean válidas se reenvían una a una.
+    `on_result(indice, respuesta)` se invoca en cuanto cada texto tiene respuesta.
+    """
+    if pack <= 1:
+        notificar = (lambda r: on_result(r.index, r)) if on_result else None
+        return enviar([construir_job(text) for text in textos], "", batch=batch, cache=cache, on_result=notificar)
+
+    def send(jobs, etiqueta):
+        return enviar(jobs, etiqueta, batch=batch, cache=cache)
+
+    responses, report = run_packed(
+        send, textos, size=pack,
+        prefix=[{"role": "system", "content": get_system_message()}],
+        params={"model": DEPLOYMENT, "temperature": 0, "max_tokens": 20},  # max_tokens por entrada
+        answer_properties={"intent": {"type": "string", "enum": INTENCIONES}},
+        to_content=lambda answer: answer["intent"] if answer.get("intent") in INTENCIONES else None,
+        single_job=construir_job,
+    )
+    print(report.summary())
+    for i, r in enumerate(responses if on_result else ()):
+        on_result(i, r)
+    return responses
+
+def main(batch=False, cache=USE_DEFAULT_CACHE, dedup=True, similarity=DEFAULT_SIMILARITY, pack=0,
+         resume=True, compact_results=True):
+    """Clasifica los ejemplos. batch=True usa la Batch API (offline, más barata) en lugar de llamadas directas.
+
+    Las líneas se normalizan y los duplicados exactos (y, con similarity, los casi-duplicados)
+    se envían una sola vez; la intención obtenida se replica a todas las filas originales. Con pack=K se
+    envían K frases por petición (ver common/packing.py).
+
+    Cada intención se añade a data/results/gpt-4-results.jsonl en cuanto llega; al reanudar
+    (resume=True) se saltan las frases ya guardadas. Al final se compacta en el JSON de siempre.
+    """
     examples_path = os.path.join(PROJECT_ROOT, "data", "examples.txt")
     with open(examples_path, "r", encoding="utf-8") as f:
         examples = f.readlines()
 
-    results = []
-    for example in examples:
-        text = example.strip()
-
-        # Construir mensajes de chat (system + user)
-        system_msg = get_system_message()
-        user_msg = get_user_message(text)
-        messages = [
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": user_msg},
-        ]
-
-        # Llamar al modelo GPT-4 (Chat Completions)
-        response = client.chat.completions.create(
-            model=DEPLOYMENT,  # nombre del deployment en Azure
-            messages=messages,
-            temperature=0,
-            max_tokens=100,
-        )
-
-        # Procesar la salida directamente
-        intent = (response.choices[0].message.content or "").strip()
-        results.append({"input": example.strip(), "intent": intent})
-
-        # Mostrar el resultado en consola
-        print(f"Entrada: {example.strip()} -> Intención: {intent}")
-
-    # Guardar resultados
+    # Normalizar y agrupar duplicados (se omiten las líneas vacías)
+    plan = dedup_inputs(examples, similarity=similarity, enabled=dedup)
+    print(plan.summary())
+
+    # Resultados en JSONL (una línea por frase única, escrita al llegar); se saltan las ya guardadas
     results_dir = os.path.join(PROJECT_ROOT, "data", "results")
-    os.makedirs(results_dir, exist_ok=True)
-    results_path = os.path.join(results_dir, "gpt-4-results.json")
-    with open(results_path, "w", encoding="utf-8") as f:
-        import json
-        json.dump(results, f, indent=4, ensure_ascii=False)
+    store = JsonlResults(os.path.join(results_dir, "gpt-4-results.jsonl"), resume=resume)
+    # La clave incluye la huella del prompt (system, plantilla, parámetros) y de --pack: al
+    # cambiarlos se vuelve a clasificar todo en lugar de reutilizar respuestas anteriores
+    plantilla = construir_job("")
+    huella = config_fingerprint(plantilla.messages, plantilla.params, pack)
+    keys = [input_key(text, DEPLOYMENT, huella) for text in plan.unique]
+    pending = [i for i, key in enumerate(keys) if key not in store]
+    if store.resumed:
+        print(f"{len(plan.unique) - len(pending)} frases ya clasificadas en {store.path.name}; {len(pending)} pendientes")
+
+    # Los errores no se guardan: la próxima ejecución vuelve a intentarlo
+    errors = {}
+
+    def guardar(j, r):
+        i = pending[j]
+        if r.ok:
+            store.write(keys[i], {"input": plan.unique[i], "intent": r.content})
+        else:
+            errors[keys[i]] = f"<error: {r.error}>"
+
+    # Llamar al modelo GPT-4 (una frase por petición o K por petición)
+    try:
+        clasificar([plan.unique[i] for i in pending], batch=batch, cache=cache, pack=pack, on_result=guardar)
+    finally:
+        store.close()
+    if not compact_results:
+        print(f"Resultados en: {store.path}")
+        return
+
+    # Replicar cada intención a todas las filas de su grupo (JSON de siempre, a partir del JSONL)
+    def filas(records):
+        results = []
+        for row, key in zip(plan.kept_rows, plan.fan_out(keys)):
+            text = examples[row].strip()
+            intent = records[key]["intent"] if key in records else errors.get(key, "<error: sin respuesta>")
+            results.append({"input": text, "intent": intent})
+
+            # Mostrar el resultado en consola
+            print(f"Entrada: {text} -> Intención: {intent}")
+        return results
+
+    results_path = compact(store.path, os.path.join(results_dir, "gpt-4-results.json"), filas, indent=4)
+    print(f"Resultados guardados en: {results_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clasificación de intenciones con GPT-4")
+    parser.add_argument("--batch", action="store_true", help="Enviar los ejemplos con la Batch API de Azure OpenAI")
+    add_cache_arguments(parser)
+    add_dedup_arguments(parser)
+    add_packing_arguments(parser)
+    add_results_arguments(parser)
+    args = parser.parse_args()
+    main(batch=args.batch, cache=cache_from_args(args), dedup=not args.no_dedup, similarity=args.similarity,
+         pack=args.pack, resume=not args.fresh, compact_results=not args.no_compact)
\ No newline at end of file
@@ -1,13 +1,19 @@
 # Define el mensaje del sistema para GPT-4
 
+# Categorías admitidas (también son el enum del esquema de respuesta en modo empaquetado)
+INTENCIONES = [
+    "Consulta de saldo",
+    "Gestión de tarjetas",
+    "Apertura de cuentas o contratación de productos",
+    "Ayuda y soporte técnico",
+    "Otro",
+]
+
 def get_system_message():
-    return """
+    categorias = "\n".join(f"- {intencion}" for intencion in INTENCIONES)
+    return f"""
 Eres un asistente especializado en la clasificación de intenciones bancarias. 
 Tu tarea es analizar frases de usuarios y clasificarlas en una de las siguientes categorías:
-- Consulta de saldo
-- Gestión de tarjetas
-- Apertura de cuentas o contratación de productos
-- Ayuda y soporte técnico
-- Otro
+{categorias}
 Devuelve únicamente el nombre de la categoría.
-"""
\ No newline at end of file
+"""
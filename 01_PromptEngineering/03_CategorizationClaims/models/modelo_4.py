@@ -1,17 +1,28 @@
 import os
 import sys
+import json
+import argparse
 from dotenv import load_dotenv
-from time import sleep
-from openai import AzureOpenAI
-import re
 
 # Calcular la raíz del proyecto (03_CategorizationClaims) y añadirla a sys.path
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
+# Raíz de 01_PromptEngineering para el motor de lotes compartido (common/)
+PROMPT_ENGINEERING_ROOT = os.path.dirname(PROJECT_ROOT)
+if PROMPT_ENGINEERING_ROOT not in sys.path:
+    sys.path.insert(0, PROMPT_ENGINEERING_ROOT)
 
 # Importar el builder de prompts desde el paquete local
 from prompts.prompt_builder import build_prompt
+from prompts.system_message import SUBCATEGORIA_OTRO, TAXONOMIA, get_system_message
+from common.batch_runner import ChatJob, run_chat_jobs
+from common.batch_api import BATCH_API_VERSION, run_batch_jobs
+from common.response_cache import USE_DEFAULT_CACHE, add_cache_arguments, cache_from_args
+from common.dedup import DEFAULT_SIMILARITY, add_dedup_arguments, dedup_inputs
+from common.clients import create_async_azure_client, get_azure_client
+from common.packing import add_packing_arguments, run_packed
+from common.jsonl_results import JsonlResults, add_results_arguments, compact, config_fingerprint, input_key
 
 # Cargar variables de entorno desde el .env del proyecto
 dotenv_path = os.path.join(PROJECT_ROOT, '.env')
@@ -23,14 +34,191 @@ ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT_GPT4")
 API_VERSION = os.getenv("AZURE_API_VERSION") or os.getenv("AZURE_OPENAI_API_VERSION") or "2024-06-01"
 DEPLOYMENT = os.getenv("OPENAI_MODEL4", "gpt-4")
 
-# Inicializar cliente Azure OpenAI
-client = AzureOpenAI(
-    api_key=API_KEY,
-    azure_endpoint=ENDPOINT,
-    api_version=API_VERSION,
-)
+def crear_cliente_async():
+    """Cliente Azure OpenAI asíncrono para el motor de lotes común."""
+    return create_async_azure_client(endpoint=ENDPOINT, api_key=API_KEY, api_version=API_VERSION)
 
-def main():
+# Re-preguntas como máximo por reclamo cuando la respuesta se sale del esquema
+MAX_REASKS = int(os.getenv("CLAIMS_MAX_REASKS", "2"))
+
+# Esquema de la respuesta: la taxonomía como enum (la pareja categoría/subcategoría se valida aparte)
+PROPIEDADES_RESPUESTA = {
+    "categoria": {"type": "string", "enum": list(TAXONOMIA)},
+    "subcategoria": {"type": "string", "enum": [sub for subs in TAXONOMIA.values() for sub in subs] + [SUBCATEGORIA_OTRO]},
+}
+TOOL_NAME = "return_category"
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": TOOL_NAME,
+            "description": "Devuelve la categoría y la subcategoría del reclamo",
+            "parameters": {
+                "type": "object",
+                "properties": PROPIEDADES_RESPUESTA,
+                "required": ["categoria", "subcategoria"],
+            },
+        },
+    }
+]
+TOOL_CHOICE = {"type": "function", "function": {"name": TOOL_NAME}}
+
+def construir_job(text):
+    """Trabajo de chat (system + user) para una reclamación, con la respuesta forzada por tool calling."""
+    return ChatJob(
+        messages=build_prompt(text),
+        params={"model": DEPLOYMENT, "temperature": 0, "max_tokens": 100, "tools": TOOLS, "tool_choice": TOOL_CHOICE},
+    )
+
+def construir_job_corregido(text, raw, motivo):
+    """Re-pregunta: el mismo trabajo con la respuesta anterior y el motivo por el que no es válida."""
+    job = construir_job(text)
+    job.messages.append({
+        "role": "user",
+        "content": (f"Tu respuesta anterior no es válida ({motivo}): {raw}\n"
+                    f"Responde de nuevo con la función {TOOL_NAME} usando exactamente una categoría "
+                    f"y una de sus subcategorías (o \"{SUBCATEGORIA_OTRO}\")."),
+    })
+    return job
+
+def enviar(jobs, etiqueta="", batch=False, cache=USE_DEFAULT_CACHE, on_result=None):
+    """Ejecuta los trabajos en paralelo o vía Batch API; los resultados vuelven en el orden de entrada.
+
+    `on_result` se invoca con cada ChatResult en cuanto termina (en modo batch, al acabar el lote).
+    """
+    if batch:
+        client = get_azure_client(endpoint=ENDPOINT, api_key=API_KEY, api_version=BATCH_API_VERSION)
+        name = "-".join(p for p in ("gpt-4-claims", etiqueta) if p)
+        results = run_batch_jobs(client, jobs, name=name, work_dir=os.path.join(PROJECT_ROOT, "data", "batch"), cache=cache)
+        for r in results if on_result else ():
+            on_result(r)
+        return results
+    return run_chat_jobs(crear_cliente_async, jobs, cache=cache, on_result=on_result)
+
+def validar_respuesta(data):
+    """(dict {categoria, subcategoria} normalizado, '') si cumple la taxonomía; si no, (None, motivo)."""
+    if not isinstance(data, dict):
+        return None, "no es un objeto JSON"
+    categoria = str(data.get("categoria") or "").strip()
+    subcategoria = str(data.get("subcategoria") or "").strip().rstrip(".")
+    if categoria not in TAXONOMIA:
+        return None, f"categoría desconocida {categoria!r}"
+    if subcategoria != SUBCATEGORIA_OTRO and subcategoria not in TAXONOMIA[categoria]:
+        return None, f"la subcategoría {subcategoria!r} no pertenece a {categoria!r}"
+    return {"categoria": categoria, "subcategoria": subcategoria}, ""
+
+def interpretar(r):
+    """(respuesta válida o None, motivo, texto crudo) de un resultado correcto del motor."""
+    raw = r.content
+    for tc in getattr(getattr(r, "message", None), "tool_calls", None) or []:
+        if tc.function and tc.function.name == TOOL_NAME:
+            raw = tc.function.arguments or ""
+            break
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None, "no es JSON válido", raw
+    valida, motivo = validar_respuesta(data)
+    return valida, motivo, raw
+
+def _respuesta_empaquetada(answer):
+    """JSON {categoria, subcategoria} de una respuesta empaquetada, o None si no cumple la taxonomía."""
+    valida, _ = validar_respuesta(answer)
+    return json.dumps(valida, ensure_ascii=False) if valida else None
+
+def clasificar(textos, batch=False, cache=USE_DEFAULT_CACHE, pack=0, on_result=None):
+    """Una respuesta (ChatResult o PackedResult: .ok/.content/.error) por texto, en orden.
+
+    Con pack=K > 1 se envían K reclamaciones numeradas por petición con respuesta
+    estructurada (tool calling); las que falten o no sean válidas se reenvían una a una.
+    `on_result(indice, respuesta)` se invoca en cuanto cada texto tiene respuesta.
+    """
+    if pack <= 1:
+        notificar = (lambda r: on_result(r.index, r)) if on_result else None
+        return enviar([construir_job(text) for text in textos], "", batch=batch, cache=cache, on_result=notificar)
+
+    def send(jobs, etiqueta):
+        return enviar(jobs, etiqueta, batch=batch, cache=cache)
+
+    responses, report = run_packed(
+        send, textos, size=pack,
+        prefix=[{"role": "system", "content": get_system_message()}],
+        params={"model": DEPLOYMENT, "temperature": 0, "max_tokens": 40},  # max_tokens por entrada
+        answer_properties=PROPIEDADES_RESPUESTA,
+        to_content=_respuesta_empaquetada,
+        single_job=construir_job,
+    )
+    print(report.summary())
+    for i, r in enumerate(responses if on_result else ()):
+        on_result(i, r)
+    return responses
+
+def clasificar_validado(textos, batch=False, cache=USE_DEFAULT_CACHE, pack=0, max_reasks=MAX_REASKS,
+                        on_salida=None):
+    """Clasifica y re-pregunta (como mucho `max_reasks` veces) las respuestas fuera de esquema.
+
+    `on_salida(indice, salida)` se invoca con la salida definitiva de cada texto: en cuanto
+    llega si es válida y, si no, al terminar las re-preguntas (no se invoca si la petición falló).
+
+    Returns:
+        tuple: (una tupla (respuesta válida o None, motivo, raw) por texto, con raw=None si la
+        petición falló; métricas de la ejecución).
+    """
+    def primera_respuesta(i, r):
+        if r.ok and on_salida:
+            salida = interpretar(r)
+            if salida[0] is not None:
+                on_salida(i, salida)
+
+    responses = clasificar(textos, batch=batch, cache=cache, pack=pack, on_result=primera_respuesta)
+    salidas = [interpretar(r) if r.ok else (None, f"Error al llamar al modelo: {r.error}", None) for r in responses]
+    malformadas = [i for i, (valida, _, _) in enumerate(salidas) if valida is None and responses[i].ok]
+
+    pendientes, reasks = list(malformadas), 0
+    for ronda in range(1, max_reasks + 1):
+        if not pendientes:
+            break
+        jobs = [construir_job_corregido(textos[i], salidas[i][2], salidas[i][1]) for i in pendientes]
+        reasks += len(jobs)
+        siguientes = []
+        for i, r in zip(pendientes, enviar(jobs, f"reask{ronda}", batch=batch, cache=cache)):
+            if r.ok:
+                salidas[i] = interpretar(r)
+            if salidas[i][0] is None:
+                siguientes.append(i)
+        pendientes = siguientes
+
+    # Recuperadas tras re-preguntar o definitivamente inválidas
+    for i in malformadas if on_salida else ():
+        on_salida(i, salidas[i])
+
+    total = len(textos)
+    metricas = {
+        "total": total,
+        "malformadas": len(malformadas),
+        "tasa_malformadas": round(len(malformadas) / total, 4) if total else 0.0,
+        "re_preguntas": reasks,
+        "recuperadas": len(malformadas) - len(pendientes),
+        "invalidas": len(pendientes),
+        "errores": sum(not r.ok for r in responses),
+    }
+    return salidas, metricas
+
+def main(batch=False, cache=USE_DEFAULT_CACHE, dedup=True, similarity=DEFAULT_SIMILARITY, pack=0, max_reasks=MAX_REASKS,
+         resume=True, compact_results=True):
+    """Categoriza las reclamaciones. batch=True usa la Batch API (offline) en lugar de llamadas directas.
+
+    Las líneas se normalizan (viñetas, comillas, espacios) y los duplicados exactos (y, con
+    similarity, los casi-duplicados) se envían una sola vez; el resultado se replica a todas sus filas.
+    Con pack=K se envían K reclamaciones por petición (ver common/packing.py). La respuesta
+    se fuerza por tool calling con la taxonomía como enum y se valida; las que no la cumplen
+    se re-preguntan hasta max_reasks veces y las métricas se guardan en gpt-4-metrics.json.
+
+    Cada salida válida se añade a data/results/gpt-4-results.jsonl en cuanto se conoce; al
+    reanudar (resume=True) se saltan las reclamaciones ya guardadas y se reintentan las que
+    siguieron fuera de esquema (las métricas cubren solo las enviadas en esta ejecución). Al
+    final se compacta en el JSON de siempre.
+    """
     # Frases de ejemplo (ruta relativa a la raíz del proyecto)
     examples_path = os.path.join(PROJECT_ROOT, "data", "examples.txt")
     with open(examples_path, "r", encoding="utf-8") as f:
@@ -38,67 +226,90 @@ def main():
 
     print(f"Total de ejemplos: {len(examples)}")
 
-    results = []
-    for idx, example in enumerate(examples, start=1):
-        # Normalizar texto: quitar viñetas '- ' y comillas envolventes si existen
-        text = example.strip()
-        # Quitar viñetas comunes: -, –, •
-        text = re.sub(r"^\s*[-–•]\s*", "", text)
-        if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
-            text = text[1:-1].strip()
-
-        # Saltar líneas vacías
-        if not text:
-            continue
-
-        # Construir mensajes de chat (system + user)
-        prompt = build_prompt(text)
-
-        # Llamar al modelo GPT-4 (Chat Completions)
-        try:
-            response = client.chat.completions.create(
-                model=DEPLOYMENT,  # nombre del deployment en Azure
-                messages=prompt,
-                temperature=0,
-                max_tokens=100,
-            )
-        except Exception as e:
-            print(f"[{idx}/{len(examples)}] Error al llamar al modelo: {e}")
-            # Intento simple de backoff si es rate limit
-            sleep(2)
-            continue
-
-        # Procesar la salida: se espera JSON con categoria y subcategoria
-        raw = (response.choices[0].message.content or "").strip()
-        categoria = None
-        subcategoria = None
-        try:
-            import json
-            parsed = json.loads(raw)
-            categoria = parsed.get("categoria")
-            subcategoria = parsed.get("subcategoria")
-        except Exception:
-            # fallback si el modelo no devolvió JSON válido
-            categoria = raw
-            subcategoria = None
-
-        results.append({
-            "input": example.strip(),
-            "categoria": categoria,
-            "subcategoria": subcategoria,
+    # Normalizar y agrupar duplicados; se saltan líneas vacías
+    plan = dedup_inputs(examples, similarity=similarity, enabled=dedup)
+    print(plan.summary())
+
+    # Resultados en JSONL (una línea por reclamación única, escrita al conocerse); se saltan las ya guardadas
+    results_dir = os.path.join(PROJECT_ROOT, "data", "results")
+    store = JsonlResults(os.path.join(results_dir, "gpt-4-results.jsonl"), resume=resume)
+    # La clave incluye la huella del prompt (system, plantilla, parámetros) y de --pack: al
+    # cambiarlos se vuelve a clasificar todo en lugar de reutilizar respuestas anteriores
+    plantilla = construir_job("")
+    huella = config_fingerprint(plantilla.messages, plantilla.params, pack)
+    keys = [input_key(text, DEPLOYMENT, huella) for text in plan.unique]
+    pending = [i for i, key in enumerate(keys) if key not in store]
+    if store.resumed:
+        print(f"{len(plan.unique) - len(pending)} reclamaciones ya categorizadas en {store.path.name}; "
+              f"{len(pending)} pendientes")
+
+    # Salidas fuera de esquema tras las re-preguntas: no se guardan en el JSONL (la próxima
+    # ejecución vuelve a intentarlo) y solo aparecen, sin categoría, en el JSON de esta ejecución
+    invalidas = {}
+
+    def guardar(j, salida):
+        valida, motivo, raw = salida
+        record = {
+            "input": plan.unique[pending[j]],
+            "categoria": valida["categoria"] if valida else None,
+            "subcategoria": valida["subcategoria"] if valida else None,
             "raw": raw,
-        })
+        }
+        if valida is None:
+            record["error"] = motivo
+            invalidas[keys[pending[j]]] = record
+            return
+        store.write(keys[pending[j]], record)
 
-        # Mostrar el resultado en consola
-        print(f"[{idx}/{len(examples)}] Entrada: {text} -> Categoría: {categoria} | Subcategoría: {subcategoria}")
+    # Llamar al modelo GPT-4 en paralelo (una frase por petición o K por petición).
+    # El motor común reintenta 429/5xx con backoff, así que no hace falta sleep manual;
+    # las respuestas fuera de la taxonomía se re-preguntan como mucho max_reasks veces.
+    # Los errores de llamada no se guardan: la próxima ejecución vuelve a intentarlo.
+    try:
+        salidas, metricas = clasificar_validado([plan.unique[i] for i in pending], batch=batch, cache=cache,
+                                                pack=pack, max_reasks=max_reasks, on_salida=guardar)
+    finally:
+        store.close()
+    errors = {keys[i]: motivo for i, (_, motivo, raw) in zip(pending, salidas) if raw is None}
 
-    # Guardar resultados
-    results_dir = os.path.join(PROJECT_ROOT, "data", "results")
-    os.makedirs(results_dir, exist_ok=True)
-    results_path = os.path.join(results_dir, "gpt-4-results.json")
-    with open(results_path, "w", encoding="utf-8") as f:
-        import json
-        json.dump(results, f, indent=4, ensure_ascii=False)
+    print(f"Salidas fuera de esquema: {metricas['malformadas']}/{metricas['total']} ({metricas['tasa_malformadas']:.1%}); "
+          f"{metricas['recuperadas']} recuperadas con {metricas['re_preguntas']} re-preguntas, "
+          f"{metricas['invalidas']} siguen sin categoría válida")
+    with open(os.path.join(results_dir, "gpt-4-metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(metricas, f, indent=4, ensure_ascii=False)
+    if not compact_results:
+        print(f"Resultados en: {store.path}")
+        return
+
+    # Una respuesta por fila original (fan-out de cada grupo de duplicados), a partir del JSONL
+    def filas(records):
+        results = []
+        for row, key in zip(plan.kept_rows, plan.fan_out(keys)):
+            idx, original, text = row + 1, examples[row].strip(), plan.rows[row]
+            record = records.get(key) or invalidas.get(key)
+            if record is None:
+                print(f"[{idx}/{len(examples)}] {errors.get(key, 'Sin respuesta del modelo')}")
+                continue
+            result = dict(record, input=original)
+            results.append(result)
+
+            # Mostrar el resultado en consola
+            print(f"[{idx}/{len(examples)}] Entrada: {text} -> Categoría: {result['categoria']} | "
+                  f"Subcategoría: {result['subcategoria']}")
+        return results
+
+    results_path = compact(store.path, os.path.join(results_dir, "gpt-4-results.json"), filas, indent=4)
+    print(f"Resultados guardados en: {results_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Categorización de reclamaciones con GPT-4")
+    parser.add_argument("--batch", action="store_true", help="Enviar los ejemplos con la Batch API de Azure OpenAI")
+    add_cache_arguments(parser)
+    add_dedup_arguments(parser)
+    add_packing_arguments(parser)
+    parser.add_argument("--max-reask", type=int, default=MAX_REASKS,
+                        help=f"Re-preguntas como máximo por respuesta fuera de esquema (por defecto {MAX_REASKS})")
+    add_results_arguments(parser)
+    args = parser.parse_args()
+    main(batch=args.batch, cache=cache_from_args(args), dedup=not args.no_dedup, similarity=args.similarity,
+         pack=args.pack, max_reasks=args.max_reask, resume=not args.fresh, compact_results=not args.no_compact)
\ No newline at end of file
@@ -1,37 +1,49 @@
 # Define el mensaje del sistema para GPT-4
 
+# Taxonomía: categoría principal -> subcategorías admitidas. Además de estas, "Otro" es
+# válida como subcategoría de cualquier categoría. También define los enum del esquema de respuesta.
+TAXONOMIA = {
+    "Facturación y Cargos": [
+        "Errores de facturación",
+        "Cargos excesivos o no reconocidos",
+        "Problemas con la lectura del medidor",
+        "Discrepancias en las tarifas aplicadas",
+    ],
+    "Calidad del Servicio": [
+        "Interrupciones frecuentes del suministro",
+        "Bajos voltajes o fluctuaciones que dañan los electrodomésticos",
+        "Problemas con la conexión o reconexión del servicio",
+    ],
+    "Instalación y Mantenimiento": [
+        "Retrasos o problemas en la instalación de nuevos servicios",
+        "Falta de mantenimiento adecuado de la infraestructura energética",
+        "Daños ocasionados por trabajos de instalación o mantenimiento",
+    ],
+    "Medición y Medidores": [
+        "Medidores defectuosos o inexactos",
+        "Instalación incorrecta de medidores",
+        "Retrasos en la instalación o reemplazo de medidores",
+    ],
+}
+SUBCATEGORIA_OTRO = "Otro"
+
 def get_system_message():
-    return """
+    taxonomia = "\n\n".join(
+        f"{categoria}:\n" + "\n".join(f"  - {sub}." for sub in subcategorias)
+        for categoria, subcategorias in TAXONOMIA.items()
+    )
+    return f"""
 Eres un asistente especializado en la clasificación de reclamos de energía.
 Tu tarea es analizar frases de usuarios y clasificarlas en una categoría principal y una subcategoría de la siguiente taxonomía.
 Usa exactamente los nombres que aparecen en la lista.
 
-Facturación y Cargos:
-  - Errores de facturación.
-  - Cargos excesivos o no reconocidos.
-  - Problemas con la lectura del medidor.
-  - Discrepancias en las tarifas aplicadas.
-
-Calidad del Servicio:
-  - Interrupciones frecuentes del suministro.
-  - Bajos voltajes o fluctuaciones que dañan los electrodomésticos.
-  - Problemas con la conexión o reconexión del servicio.
-
-Instalación y Mantenimiento:
-  - Retrasos o problemas en la instalación de nuevos servicios.
-  - Falta de mantenimiento adecuado de la infraestructura energética.
-  - Daños ocasionados por trabajos de instalación o mantenimiento.
-
-Medición y Medidores:
-  - Medidores defectuosos o inexactos.
-  - Instalación incorrecta de medidores.
-  - Retrasos en la instalación o reemplazo de medidores.
+{taxonomia}
 
 Instrucciones:
 - Si hay varias opciones posibles, elige la más específica y coherente con el texto.
-- Si no puedes determinar una subcategoría exacta, devuelve "Otro" como subcategoría dentro de la categoría más probable.
+- Si no puedes determinar una subcategoría exacta, devuelve "{SUBCATEGORIA_OTRO}" como subcategoría dentro de la categoría más probable.
 - No inventes categorías o subcategorías que no estén en la lista.
 
 Formato de salida (obligatorio, en una sola línea):
-{"categoria": "<Categoría principal>", "subcategoria": "<Subcategoría>"}
-"""
\ No newline at end of file
+{{"categoria": "<Categoría principal>", "subcategoria": "<Subcategoría>"}}
+"""
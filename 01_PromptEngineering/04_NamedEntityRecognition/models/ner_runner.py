@@ -0,0 +1,583 @@
+"""Runner único de NER para uno o varios deployments de Azure OpenAI.
+
+Ejecuta las mismas frases contra todos los deployments indicados en una sola pasada:
+todas las peticiones (de todos los modelos) van al motor común de lotes a la vez, con un
+cliente y un pool de conexiones por recurso de Azure (gpt35_endpoint para los gpt-35*,
+gpt4_endpoint para el resto), así que evaluar dos modelos tarda lo que el más lento, no
+la suma. Comparte la construcción del prompt, el esquema de tool-calling, la
+pre-anotación con el gazetteer y el post-procesado.
+
+Salidas:
+- data/output_data_{modelo}.jsonl por cada deployment, una fila por frase escrita en cuanto
+  llega la respuesta; al volver a ejecutar se saltan las frases ya guardadas (--fresh: de cero).
+- data/output_data_{modelo}.json por cada deployment (mismo formato de siempre), compactado
+  a partir del JSONL al terminar (--no-compact para omitirlo).
+- data/output_data_comparison.json con las entidades de cada modelo por frase y las
+  diferencias entre ellos (solo si hay más de un deployment).
+
+Uso:
+    python models/ner_runner.py                                  # NER_DEPLOYMENTS o gpt-35-turbo y gpt-4
+    python models/ner_runner.py --deployments gpt-4 gpt-4o --batch
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, List, Dict, Optional, Sequence, Tuple
+from functools import lru_cache
+from datetime import datetime
+
+from dotenv import load_dotenv  # type: ignore
+
+if TYPE_CHECKING:
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+
+# Añadir la raíz del proyecto a sys.path para imports de prompts y utils
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+# Raíz de 01_PromptEngineering para el motor de lotes compartido (common/)
+if os.path.dirname(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, os.path.dirname(PROJECT_ROOT))
+
+from prompts.prompt_builder import build_messages
+from utils.parser import normalize_type_label, parse_output
+from utils.gazetteer import fold, merge_entities, preannotate
+from common.batch_runner import ChatJob, run_chat_jobs
+from common.batch_api import BATCH_API_VERSION, BATCH_DEPLOYMENT, run_batch_jobs
+from common.response_cache import USE_DEFAULT_CACHE, add_cache_arguments, cache_from_args
+from common.clients import create_async_azure_client, get_azure_client
+from common.usage import UsageTotals, usage_totals
+from common.jsonl_results import JsonlResults, add_results_arguments, compact, config_fingerprint, input_key
+
+# Deployments por defecto (NER_DEPLOYMENTS="gpt-35-turbo,gpt-4" en .env para cambiarlos)
+DEFAULT_DEPLOYMENTS = ["gpt-35-turbo", "gpt-4"]
+
+
+def _model_family(model: str) -> str:
+    """Prefijo de las variables de entorno propias del deployment: gpt35 (gpt-35*/gpt-3.5*) o gpt4."""
+    name = model.lower().replace(".", "")
+    return "gpt35" if name.startswith(("gpt-35", "gpt35")) else "gpt4"
+
+
+@lru_cache(maxsize=None)
+def _client_kwargs(model: str) -> Dict[str, str]:
+    """Lee una sola vez por deployment (.env + entorno) la configuración de su cliente de Azure OpenAI.
+
+    Los deployments gpt-35* usan el recurso de gpt35_endpoint y el resto el de gpt4_endpoint
+    (cada uno puede tener su propia key en gpt35_api_key/gpt4_api_key):
+    - gpt35_endpoint / gpt4_endpoint (o AZURE_OPENAI_ENDPOINT como fallback)
+    - gpt35_api_key / gpt4_api_key (o AZURE_OPENAI_API_KEY / OPENAI_API_KEY)
+    - AZURE_OPENAI_API_VERSION (por ejemplo, 2024-02-15-preview)
+    """
+    load_dotenv()  # Carga .env si existe
+    family = _model_family(model)
+
+    api_key = os.getenv(f"{family}_api_key") or os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("Falta la API key. Define AZURE_OPENAI_API_KEY u OPENAI_API_KEY en .env")
+
+    endpoint = os.getenv(f"{family}_endpoint") or os.getenv("AZURE_OPENAI_ENDPOINT")
+    if not endpoint:
+        raise RuntimeError(f"Falta el endpoint de Azure para {model}. Define {family}_endpoint "
+                           f"o AZURE_OPENAI_ENDPOINT en .env")
+
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+
+    return {"api_key": api_key, "endpoint": endpoint, "api_version": api_version}
+
+
+def get_client(model: str) -> "AzureOpenAI":
+    """Cliente síncrono compartido por el proceso (registro common.clients) del recurso de `model`."""
+    return get_azure_client(**_client_kwargs(model))
+
+
+def get_async_client(model: str) -> "AsyncAzureOpenAI":
+    """Cliente asíncrono (pool dimensionado) del recurso de `model` para el motor de lotes común."""
+    return create_async_azure_client(**_client_kwargs(model))
+
+
+def default_deployments() -> List[str]:
+    load_dotenv()
+    configured = [d.strip() for d in os.getenv("NER_DEPLOYMENTS", "").split(",") if d.strip()]
+    return configured or list(DEFAULT_DEPLOYMENTS)
+
+
+def safe_model_name(model: str) -> str:
+    return "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in model)
+
+
+# Definición de herramienta (function calling) para forzar salida estructurada
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "return_entities",
+            "description": "Devuelve las entidades extraídas",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "entities": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "keyword": {"type": "string"},
+                                "type": {
+                                    "type": "string",
+                                    "enum": ["Concepto", "Localización", "Tiempo"],
+                                },
+                            },
+                            "required": ["keyword", "type"],
+                        },
+                    }
+                },
+                "required": ["entities"],
+            },
+        },
+    }
+]
+TOOL_CHOICE = {"type": "function", "function": {"name": "return_entities"}}
+
+
+def _get_env_config(model: str) -> Dict[str, str]:
+    """Devuelve configuración relevante del entorno para guardar en el output de `model`."""
+    load_dotenv()
+    family = _model_family(model)
+    endpoint = os.getenv(f"{family}_endpoint") or os.getenv("AZURE_OPENAI_ENDPOINT") or ""
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "")
+    return {"endpoint": endpoint, "api_version": api_version}
+
+
+def run_model(model: str, system_message, user_message, input_text) -> Dict[str, Any]:
+    """Llama a un deployment con una sola frase y devuelve dict {raw_text, parsed, origin}."""
+    job = _build_request(model, system_message, user_message, input_text)
+    resp = get_client(model).chat.completions.create(messages=job.messages, **job.params)
+    return _process_response(resp)
+
+
+def _build_request(model: str, system_message, user_message, input_text, candidates=None) -> ChatJob:
+    """Construye el trabajo (mensajes + parámetros con tool-calling) para un texto de entrada.
+
+    System, instrucciones y tools son idénticos en todas las peticiones y van delante de la
+    frase, así que el servicio puede servir ese prefijo desde su caché de prompts.
+    """
+    return ChatJob(
+        messages=build_messages(system_message, user_message, input_text, candidates),
+        params={"model": model, "tools": TOOLS, "tool_choice": TOOL_CHOICE, "temperature": 0},
+    )
+
+
+def _process_response(resp: Any) -> Dict[str, Any]:
+    """Extrae las entidades de la respuesta: tool_calls, JSON o heurística -> {raw_text, parsed, origin}."""
+    message = resp.choices[0].message if resp.choices else None
+    content = message.content if message else ""
+
+    # Prioridad 1: tool_calls (function calling)
+    parsed_list: List[Any] = []
+    origin = ""
+    if message and getattr(message, "tool_calls", None):
+        for tc in message.tool_calls:
+            try:
+                if tc.type == "function" and tc.function and tc.function.name == "return_entities":
+                    args = tc.function.arguments or "{}"
+                    data = json.loads(args)
+                    if isinstance(data, dict) and isinstance(data.get("entities"), list):
+                        parsed_list = data["entities"]
+                        origin = "tool_call"
+                        break
+            except Exception:
+                continue
+
+    # Prioridad 2: contenido JSON puro
+    if not parsed_list and content:
+        try:
+            maybe = json.loads(content)
+            if isinstance(maybe, list):
+                parsed_list = maybe
+                origin = "model_json"
+        except Exception:
+            parsed_list = []
+
+    # Validar/normalizar con el parser (si hay lista)
+    cleaned = parse_output(parsed_list) if parsed_list else []
+
+    # Heurística: si el modelo respondió en viñetas estilo
+    # "- Concepto: ...", intentar mapear a la estructura
+    if not cleaned and any(h in content for h in [
+        "- Concepto:", "- Localización:", "- Localizacion:", "- Tiempo:",
+        "Concepto:", "Localización:", "Localizacion:", "Tiempo:"
+    ]):
+        heur = _heuristic_to_entities(content)
+        cleaned = parse_output(heur)
+        if cleaned:
+            origin = "heuristic"
+
+    return {"raw_text": content, "parsed": cleaned, "origin": origin}
+
+
+def _format_console_row(input_text: str, parsed: Any, raw_text: str) -> str:
+    """Devuelve una fila Markdown tipo | entrada | `json` | ajustando Localización -> Localizacion."""
+    # Preferimos la lista parseada si existe; si no, intentamos usar raw_text si es JSON válido
+    display_obj: Any = parsed if parsed else None
+    if display_obj is None:
+        try:
+            tmp = json.loads(raw_text)
+            if isinstance(tmp, (list, dict)):
+                display_obj = tmp
+        except Exception:
+            display_obj = raw_text
+
+    if isinstance(display_obj, (list, dict)):
+        s = json.dumps(display_obj, ensure_ascii=False)
+    else:
+        s = str(display_obj)
+
+    # Ajuste estético: sin tilde, como en README de ejemplo
+    s = s.replace("Localización", "Localizacion")
+    return f"| {input_text} | `{s}` |"
+
+
+def _heuristic_to_entities(text: str) -> List[Dict[str, str]]:
+    """Convierte una salida con viñetas '- Tipo: valores' a lista de entidades.
+
+    Ejemplos que maneja:
+    - "- Concepto: saldo vivo"
+    - "- Concepto: Dirección Territorial, dudoso."
+    - "- Localización: No hay entidades de localización en este texto."
+    - "- Tiempo: septiembre de 2023"
+    """
+    raw_lines = [ln.rstrip() for ln in text.splitlines()]
+    results: List[Dict[str, str]] = []
+
+    # Dos modos: inline (- Tipo: valores) y secciones (Tipo:\n- item) mezclados
+    current_type: str = ""
+    for ln in raw_lines:
+        s = ln.strip()
+        if not s:
+            continue
+
+        # Detectar encabezado de sección: 'Concepto:' 'Localización:' 'Tiempo:'
+        if s.endswith(":") and not s.startswith("-"):
+            t = normalize_type_label(s[:-1])
+            current_type = t
+            continue
+
+        # Modo inline: '- Tipo: valores'
+        if s.startswith("-") and ":" in s:
+            dash_removed = s[1:].strip()
+            # Puede ser '- palabra' (bullet bajo sección) o '- Tipo: valores'
+            before, after = dash_removed.split(":", 1)
+            maybe_type = normalize_type_label(before)
+            if maybe_type:
+                # Inline con tipo explícito
+                t_norm = maybe_type
+                content = after.strip()
+                low = content.lower()
+                if low.startswith("no hay") or low in {"no aplica", "n/a", "na", "no aplica."}:
+                    continue
+                content = content.rstrip(".")
+                parts = [p.strip() for p in content.split(",") if p.strip()]
+                for p in parts:
+                    results.append({"keyword": p, "type": t_norm})
+                current_type = ""  # Reseteamos para evitar arrastre accidental
+                continue
+            else:
+                # Bullet simple bajo la sección actual
+                if not current_type:
+                    continue
+                item = dash_removed.strip()
+                lowi = item.lower()
+                if lowi.startswith("no hay") or lowi in {"no aplica", "n/a", "na", "no aplica."}:
+                    continue
+                item = item.rstrip(".")
+                if item:
+                    results.append({"keyword": item, "type": current_type})
+                continue
+
+        # Si es una línea simple (no bullet) sin encabezado, ignorar
+        # También ignoramos textos introductorios tipo 'Entidades clasificadas:'
+        continue
+
+    return results
+
+def load_examples() -> List[str]:
+    """Frases de entrada desde data/input_data.json (clave "examples")."""
+    data_path = os.path.join(PROJECT_ROOT, "data", "input_data.json")
+    with open(data_path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    return payload.get("examples", [])
+
+
+def _send_jobs(jobs_by_model: Dict[str, List[ChatJob]], batch: bool, cache,
+               on_result: Optional[Callable[[str, int, Any], None]] = None) -> Dict[str, List[Any]]:
+    """Envía los trabajos de todos los modelos a la vez y devuelve las respuestas por modelo, en orden.
+
+    Cada modelo va al recurso de su endpoint (ver `_client_kwargs`). Sin --batch, los trabajos
+    de los modelos que comparten endpoint van en una única llamada al motor común (mismo
+    cliente, mismo pool y misma concurrencia) y, si hay varios endpoints, cada uno se ejecuta
+    en paralelo con el suyo. Con --batch, se envía un lote por modelo al recurso de su endpoint
+    y los lotes se esperan en paralelo. `on_result(modelo, posición, respuesta)` se invoca en
+    cuanto termina cada trabajo (con --batch, al terminar el lote de ese modelo).
+    """
+    models = list(jobs_by_model)
+    if batch:
+        # Con varios modelos, cada lote usa el deployment de sus trabajos (no el Global Batch común)
+        deployment = BATCH_DEPLOYMENT if len(models) == 1 else None
+
+        def submit(model: str) -> List[Any]:
+            client = get_azure_client(**dict(_client_kwargs(model), api_version=BATCH_API_VERSION))
+            responses = run_batch_jobs(client, jobs_by_model[model], name=f"ner-{safe_model_name(model)}",
+                                       work_dir=os.path.join(PROJECT_ROOT, "data", "batch"),
+                                       deployment=deployment, cache=cache)
+            for j, r in enumerate(responses if on_result else ()):
+                on_result(model, j, r)
+            return responses
+
+        with ThreadPoolExecutor(max_workers=max(1, len(models))) as pool:
+            return dict(zip(models, pool.map(submit, models)))
+
+    # Modelos agrupados por recurso (endpoint + key): un cliente y una pasada del motor por grupo
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for model in models:
+        kwargs = _client_kwargs(model)
+        groups.setdefault((kwargs["endpoint"], kwargs["api_key"]), []).append(model)
+
+    def run_group(group: List[str]) -> List[Any]:
+        flat = [(model, j, job) for model in group for j, job in enumerate(jobs_by_model[model])]
+        notify = (lambda r: on_result(flat[r.index][0], flat[r.index][1], r)) if on_result else None
+        responses = run_chat_jobs(lambda: get_async_client(group[0]), [job for _, _, job in flat],
+                                  cache=cache, on_result=notify) if flat else []
+        return list(zip(flat, responses))
+
+    with ThreadPoolExecutor(max_workers=max(1, len(groups))) as pool:
+        done = list(pool.map(run_group, groups.values()))
+    by_model: Dict[str, List[Any]] = {model: [] for model in models}
+    for (model, _, _), r in (pair for pairs in done for pair in pairs):
+        by_model[model].append(r)
+    return by_model
+
+
+def _compare(examples: Sequence[str], parsed_by_model: Dict[str, List[List[Dict[str, str]]]]) -> Dict[str, Any]:
+    """Entidades de cada modelo por frase y diferencias (keyword plegada + tipo)."""
+    models = list(parsed_by_model)
+    rows = []
+    agree = 0
+    for i, text in enumerate(examples):
+        keys = {m: {(fold(e["keyword"]), e["type"]) for e in parsed_by_model[m][i]} for m in models}
+        common = set.intersection(*keys.values()) if keys else set()
+        same = all(k == common for k in keys.values())
+        agree += same
+        rows.append({
+            "input": text,
+            "agreement": same,
+            "entities": {m: parsed_by_model[m][i] for m in models},
+            "only_in": {m: sorted(f"{kw} ({tp})" for kw, tp in keys[m] - common) for m in models},
+        })
+    return {
+        "models": models,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "summary": {
+            "total": len(examples),
+            "agreement": agree,
+            "agreement_rate": agree / len(examples) if examples else 0.0,
+        },
+        "results": rows,
+    }
+
+
+def _build_row(text: str, known: List[Dict[str, str]], r: Any) -> Dict[str, Any]:
+    """Fila de salida {"input", "output": {raw_text, parsed, origin}} de una frase (r=None: solo gazetteer)."""
+    try:
+        if r is None:
+            output = {"raw_text": "", "parsed": known, "origin": "gazetteer"}
+        elif not r.ok:
+            raise RuntimeError(r.error)
+        else:
+            output = _process_response(r.response)
+            if known:
+                output["parsed"] = merge_entities(known, output["parsed"])
+                output["origin"] = "+".join(o for o in ("gazetteer", output["origin"]) if o)
+    except Exception as e:
+        # Si hay fallo, representamos raw y parsed vacíos
+        output = {"raw_text": f"<error: {e}>", "parsed": [], "origin": ""}
+    return {
+        "input": text,
+        "output": {
+            "raw_text": output.get("raw_text"),
+            "parsed": output.get("parsed", []),
+            "origin": output.get("origin", ""),
+        }
+    }
+
+
+def result_keys(model: str, examples: Sequence[str], use_gazetteer: bool = True) -> List[str]:
+    """Clave de cada frase en el JSONL de `model`: incluye la huella del prompt, las tools y
+    --no-gazetteer, así que al cambiarlos las frases se vuelven a procesar."""
+    from prompts.system_message import get_system_message
+    from prompts.user_message import get_user_message
+
+    template = _build_request(model, get_system_message(), get_user_message(), "")
+    fingerprint = config_fingerprint(template.messages, template.params, use_gazetteer)
+    return [input_key(text, model, fingerprint) for text in examples]
+
+
+def results_path(model: str, ext: str = "json") -> str:
+    """data/output_data_{modelo}.{ext} (JSON de siempre o JSONL incremental)."""
+    return os.path.join(PROJECT_ROOT, "data", f"output_data_{safe_model_name(model)}.{ext}")
+
+
+def run_deployments(
+    deployments: Sequence[str],
+    examples: Sequence[str],
+    *,
+    batch: bool = False,
+    cache=USE_DEFAULT_CACHE,
+    use_gazetteer: bool = True,
+    stores: Optional[Dict[str, JsonlResults]] = None,
+) -> Tuple[Dict[str, List[Optional[Dict[str, Any]]]], Dict[str, UsageTotals]]:
+    """Ejecuta las frases contra todos los deployments en una sola pasada.
+
+    Con `stores` (modelo -> JsonlResults), cada fila correcta se añade al JSONL de su modelo en
+    cuanto llega la respuesta y se saltan las frases cuya clave ya está guardada.
+
+    Returns:
+        tuple: (modelo -> lista de {"input", "output": {raw_text, parsed, origin}} en el orden de
+        `examples`, con None en las frases ya guardadas; modelo -> tokens consumidos en esta ejecución).
+    """
+    from prompts.system_message import get_system_message
+    from prompts.user_message import get_user_message
+
+    system_message = get_system_message()
+    user_message = get_user_message()
+    stores = stores or {}
+    keys = {model: result_keys(model, examples, use_gazetteer) for model in deployments}
+    todo = {
+        model: [i for i, key in enumerate(keys[model]) if model not in stores or key not in stores[model]]
+        for model in deployments
+    }
+    for model in deployments:
+        if model in stores and stores[model].resumed:
+            print(f"{model}: {len(examples) - len(todo[model])} frases ya guardadas, {len(todo[model])} pendientes")
+
+    # El gazetteer anota las entidades conocidas (una vez para todos los modelos): las frases
+    # completas no van al modelo y en el resto se pasan como candidatas
+    needed = sorted(set().union(*todo.values()))
+    pre = {i: preannotate(examples[i]) if use_gazetteer else None for i in needed}
+    if use_gazetteer:
+        annotated = sum(p.complete for p in pre.values())
+        print(f"Gazetteer: {annotated}/{len(needed)} frases anotadas sin modelo")
+
+    results: Dict[str, List[Optional[Dict[str, Any]]]] = {model: [None] * len(examples) for model in deployments}
+
+    def store_row(model: str, i: int, r: Any) -> None:
+        row = _build_row(examples[i], pre[i].entities if pre[i] else [], r)
+        results[model][i] = row
+        # Los errores no se guardan: la próxima ejecución vuelve a intentarlo
+        if model in stores and (r is None or r.ok):
+            stores[model].write(keys[model][i], row)
+
+    pending = {model: [i for i in todo[model] if pre[i] is None or not pre[i].complete] for model in deployments}
+    for model in deployments:
+        for i in todo[model]:
+            if pre[i] is not None and pre[i].complete:
+                store_row(model, i, None)
+
+    jobs_by_model = {
+        model: [_build_request(model, system_message, user_message, examples[i], pre[i].entities if pre[i] else None)
+                for i in pending[model]]
+        for model in deployments
+    }
+    started = time.perf_counter()
+    responses_by_model = _send_jobs(jobs_by_model, batch, cache,
+                                    on_result=lambda model, j, r: store_row(model, pending[model][j], r))
+    print(f"{sum(len(j) for j in jobs_by_model.values())} peticiones a {len(deployments)} modelo(s) "
+          f"en {time.perf_counter() - started:.1f}s")
+
+    usage = {model: usage_totals(responses_by_model[model]) for model in deployments}
+    return results, usage
+
+
+def main(
+    deployments: Optional[Sequence[str]] = None,
+    batch: bool = False,
+    cache=USE_DEFAULT_CACHE,
+    use_gazetteer: bool = True,
+    resume: bool = True,
+    compact_results: bool = True,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Procesa data/input_data.json con cada deployment y guarda las salidas (y la comparación).
+
+    Cada fila se añade a data/output_data_{modelo}.jsonl en cuanto llega; al reanudar
+    (resume=True) se saltan las frases ya guardadas. Al final se compacta en el JSON de siempre.
+    """
+    deployments = list(dict.fromkeys(deployments or default_deployments()))
+    examples = load_examples()
+    stores = {model: JsonlResults(results_path(model, "jsonl"), resume=resume) for model in deployments}
+    try:
+        results, usage = run_deployments(deployments, examples, batch=batch, cache=cache,
+                                         use_gazetteer=use_gazetteer, stores=stores)
+    finally:
+        for store in stores.values():
+            store.close()
+    if not compact_results:
+        for model, store in stores.items():
+            print(f"{model}: resultados en {store.path}")
+        return results
+
+    for model in deployments:
+        env_cfg = _get_env_config(model)
+        if len(deployments) > 1:
+            print(f"\n### {model}")
+        if usage[model].requests:
+            print(f"{model}: {usage[model].summary()}")
+
+        def build(records: Dict[str, Dict[str, Any]], model: str = model) -> Dict[str, Any]:
+            # Filas de esta ejecución (incluidos los errores) y, para el resto, las ya guardadas
+            rows = [row if row is not None else records[key] for row, key in
+                    zip(results[model], result_keys(model, examples, use_gazetteer))]
+            results[model] = rows
+            # Fila en consola, exactamente: | entrada | `[...]` |
+            for row in rows:
+                print(_format_console_row(row["input"], row["output"]["parsed"], row["output"]["raw_text"] or ""))
+            return {
+                "model": model,
+                "endpoint": env_cfg.get("endpoint", ""),
+                "api_version": env_cfg.get("api_version", ""),
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "input_summary": {"total": len(examples)},
+                "usage": usage[model].as_dict(),
+                "results": rows,
+            }
+
+        out_path = compact(stores[model].path, results_path(model), build)
+        print(f"\nResultados guardados en: {out_path}")
+
+    if len(results) > 1:
+        comparison = _compare(examples, {m: [row["output"]["parsed"] for row in rows] for m, rows in results.items()})
+        out_path = os.path.join(PROJECT_ROOT, "data", "output_data_comparison.json")
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(comparison, f, ensure_ascii=False, indent=2)
+        s = comparison["summary"]
+        print(f"Coinciden en {s['agreement']}/{s['total']} frases ({s['agreement_rate']:.0%}). Comparación: {out_path}")
+    return results
+
+
+def build_arg_parser(description: str = "NER con uno o varios deployments de Azure OpenAI") -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--batch", action="store_true", help="Enviar los ejemplos con la Batch API de Azure OpenAI")
+    parser.add_argument("--no-gazetteer", action="store_true", help="Enviar todas las frases al modelo sin pre-anotar")
+    add_cache_arguments(parser)
+    add_results_arguments(parser)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_arg_parser()
+    parser.add_argument("--deployments", nargs="+", help="Deployments a evaluar (por defecto NER_DEPLOYMENTS o gpt-35-turbo gpt-4)")
+    args = parser.parse_args()
+    main(args.deployments, batch=args.batch, cache=cache_from_args(args), use_gazetteer=not args.no_gazetteer,
+         resume=not args.fresh, compact_results=not args.no_compact)
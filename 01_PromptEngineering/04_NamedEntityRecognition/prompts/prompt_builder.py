@@ -1,4 +1,33 @@
 # Script para construir prompts dinámicos
 
-def build_prompt(system_message, user_message, input_text):
-    return f"{system_message}\n\n{user_message}\n\nTexto: {input_text}"
\ No newline at end of file
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@lru_cache(maxsize=8)
+def build_prefix(system_message: str, user_message: str) -> Tuple[Dict[str, str], ...]:
+    """Parte fija de la conversación: system + instrucciones, idéntica byte a byte en cada petición.
+
+    Va siempre delante de la frase para que el servicio pueda reutilizar el prefijo
+    (caché de prompts de Azure OpenAI); la frase y las candidatas van en el último turno.
+    """
+    return ({"role": "system", "content": f"{system_message}\n\n{user_message}"},)
+
+
+def build_input(input_text: str, candidates: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Parte variable: la frase (+ las entidades ya anotadas por el gazetteer)."""
+    prompt = f"Texto: {input_text}"
+    if candidates:
+        # Entidades ya anotadas por el gazetteer (utils/gazetteer.py): el modelo solo devuelve las que falten
+        prompt += (
+            "\n\nYa identificadas (no las repitas): "
+            + json.dumps(candidates, ensure_ascii=False)
+            + "\nDevuelve solo las entidades que falten; si no falta ninguna, devuelve []."
+        )
+    return prompt
+
+
+def build_messages(system_message, user_message, input_text, candidates=None) -> List[Dict[str, str]]:
+    """Mensajes de chat: prefijo estable + un turno de usuario con la frase."""
+    return [*build_prefix(system_message, user_message), {"role": "user", "content": build_input(input_text, candidates)}]
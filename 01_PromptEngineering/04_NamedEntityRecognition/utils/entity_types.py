@@ -1,5 +1,12 @@
 # Definición de los tipos y subtipos de entidades
 
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Optional, Tuple
+
+
 def get_entity_types():
     """
     Devuelve un diccionario con los tipos y subtipos de entidades.
@@ -43,4 +50,57 @@ def get_entity_types():
             "Dirección Comercial", "Dirección Área de Negocio, Dirección de Zona", "Centro de empresa, Store",
             "Prov.", "CA, Com.Aut. CCAA", "Ciudad, pueblo, localidad", "Entidad de origen"
         ]
-    }
\ No newline at end of file
+    }
+
+
+# --- Catálogo precompilado (se construye una sola vez por proceso) ---
+
+# Subtipos que son categorías, no formas de superficie
+NOT_SURFACE_FORMS = frozenset({"Fecha"})
+
+
+def fold(text: str) -> str:
+    """Forma plegada: minúsculas, sin tildes, puntuación como espacio y espacios simples."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").casefold())
+    chars = [c if c.isalnum() or c == "+" else " " for c in decomposed if not unicodedata.combining(c)]
+    return " ".join("".join(chars).split())
+
+
+@dataclass(frozen=True)
+class EntityCatalog:
+    """Vista inmutable y con hash de `get_entity_types()`.
+
+    Attributes:
+        types: Tipos admitidos ("Concepto", "Localización", "Tiempo").
+        forms: (sinónimo, tipo) en el orden del catálogo; cada entrada "a, b, c" aporta tres.
+        canonical: forma plegada de cada sinónimo -> (tipo, subtipo canónico = primer sinónimo).
+    """
+
+    types: FrozenSet[str]
+    forms: Tuple[Tuple[str, str], ...]
+    canonical: Mapping[str, Tuple[str, str]]
+
+    def lookup(self, keyword: str) -> Optional[Tuple[str, str]]:
+        """(tipo, subtipo canónico) de una keyword conocida, o None."""
+        return self.canonical.get(fold(keyword))
+
+
+@lru_cache(maxsize=1)
+def get_entity_catalog() -> EntityCatalog:
+    """Catálogo congelado construido una sola vez a partir de `get_entity_types()`."""
+    forms = []
+    canonical = {}
+    entity_types = get_entity_types()
+    for etype, entries in entity_types.items():
+        for entry in entries:
+            if entry in NOT_SURFACE_FORMS:
+                continue
+            synonyms = [s.strip() for s in entry.split(",") if s.strip()]
+            for synonym in synonyms:
+                forms.append((synonym, etype))
+                canonical.setdefault(fold(synonym), (etype, synonyms[0]))
+    return EntityCatalog(
+        types=frozenset(entity_types),
+        forms=tuple(forms),
+        canonical=MappingProxyType(canonical),
+    )
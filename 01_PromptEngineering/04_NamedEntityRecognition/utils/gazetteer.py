@@ -0,0 +1,212 @@
+"""Pre-anotación de entidades con el gazetteer de `entity_types` (Aho-Corasick).
+
+Las formas conocidas de Concepto/Localización (varios sinónimos por entrada, separados
+por comas) se compilan UNA vez en un autómata Aho-Corasick sobre texto plegado
+(minúsculas, sin tildes, puntuación -> espacio). Cada entrada se recorre en tiempo
+lineal y se devuelven las coincidencias más largas que no se solapan, respetando
+límites de palabra. Las expresiones de Tiempo habituales (meses, años, "último mes")
+se detectan con una expresión regular compilada.
+
+Si, quitando las entidades encontradas, solo quedan palabras vacías ("¿cuál es el ...
+por ...?"), la frase está completamente anotada y no hace falta llamar al modelo. Si
+no, las entidades encontradas se pasan al prompt como candidatas y el modelo solo
+tiene que devolver las que falten.
+"""
+
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .entity_types import NOT_SURFACE_FORMS, fold, get_entity_catalog
+
+_MONTHS = ("enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre")
+_TIME = re.compile(
+    r"\b(?:(?:" + _MONTHS + r")(?:\s+(?:de|del)\s+(?:\d{4}))?"
+    r"|(?:el\s+|la\s+|este\s+|esta\s+)?(?:ultim[oa]s?|pasad[oa]|actual)\s+(?:mes|ano|trimestre|semestre|semana)"
+    r"|(?:el|este)\s+ano"
+    r"|(?:19|20)\d{2})\b"
+)
+
+# Palabras que pueden quedar fuera de las entidades sin que falte nada por anotar
+STOPWORDS = frozenset("""
+a al ante con de del desde el en entre es esta este esto hay la las lo los me mi por para que quien
+cual cuales cuanto cuanta cuantos cuantas como donde cuando se su sus un una uno unos unas y o u
+dime dame muestra muestrame ensename quiero saber ver son fue ha han sido
+""".split())
+
+
+def _fold_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """Texto plegado y, para cada carácter plegado, su posición en el original.
+
+    Mismo plegado que `entity_types.fold`, pero sin recortar los bordes. Los separadores
+    consecutivos se reducen a un solo espacio ("Com.Aut. CCAA" -> "com aut ccaa").
+    """
+    chars: List[str] = []
+    offsets: List[int] = []
+    for i, ch in enumerate(text):
+        for c in unicodedata.normalize("NFKD", ch.casefold()):
+            if unicodedata.combining(c):
+                continue
+            c = c if c.isalnum() or c == "+" else " "
+            if c == " " and chars and chars[-1] == " ":
+                continue
+            chars.append(c)
+            offsets.append(i)
+    return "".join(chars), offsets
+
+
+@dataclass
+class GazetteerMatch:
+    keyword: str      # Texto tal como aparece en la entrada
+    type: str         # Concepto | Localización | Tiempo
+    canonical: str    # Forma del gazetteer que ha coincidido
+    start: int
+    end: int
+
+    def as_entity(self) -> Dict[str, str]:
+        return {"keyword": self.keyword, "type": self.type}
+
+
+class Gazetteer:
+    """Autómata Aho-Corasick sobre las formas plegadas del gazetteer."""
+
+    def __init__(self, forms: Iterable[Tuple[str, str]]):
+        # Trie: goto[nodo] = {carácter: nodo}; out[nodo] = índices de patrones que terminan ahí
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.patterns: List[Tuple[str, str, int]] = []  # (forma, tipo, longitud plegada)
+        seen = set()
+        for form, etype in forms:
+            # Los patrones llevan los espacios de borde para imponer límites de palabra
+            key = f" {fold(form)} "
+            if len(key) <= 2 or key in seen:
+                continue
+            seen.add(key)
+            self._add(key, len(self.patterns))
+            self.patterns.append((form, etype, len(key)))
+        self._build()
+
+    def _add(self, key: str, index: int) -> None:
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(index)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                if node:
+                    fail = self._fail[node]
+                    while fail and ch not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # Salidas por enlace de fallo: patrones que son sufijo del actual
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[GazetteerMatch]:
+        """Coincidencias más largas sin solapamiento, en orden de aparición."""
+        folded, offsets = _fold_with_offsets(text)
+        # Espacios de borde: los patrones empiezan y acaban en espacio
+        folded = f" {folded} "
+        offsets = [0] + offsets + [len(text)]
+
+        raw: List[Tuple[int, int, int]] = []  # (inicio, fin, patrón) en el texto plegado
+        node = 0
+        for pos, ch in enumerate(folded):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for index in self._out[node]:
+                length = self.patterns[index][2]
+                raw.append((pos - length + 1, pos + 1, index))
+
+        matches: List[GazetteerMatch] = []
+        last_end = -1
+        # Más a la izquierda primero y, a igualdad, la más larga
+        for start, end, index in sorted(raw, key=lambda m: (m[0], -(m[1] - m[0]))):
+            # Los espacios de borde pueden compartirse entre dos coincidencias contiguas
+            if start + 1 < last_end:
+                continue
+            form, etype, _ = self.patterns[index]
+            o_start = offsets[start + 1]
+            o_end = offsets[end - 2] + 1
+            matches.append(GazetteerMatch(text[o_start:o_end], etype, form, o_start, o_end))
+            last_end = end
+        return matches
+
+
+def gazetteer_forms(entity_types: Optional[Dict[str, List[str]]] = None) -> List[Tuple[str, str]]:
+    """(forma, tipo) para cada sinónimo del gazetteer ("a, b, c" -> tres formas)."""
+    if entity_types is None:
+        return list(get_entity_catalog().forms)
+    forms = []
+    for etype, entries in entity_types.items():
+        for entry in entries:
+            if entry in NOT_SURFACE_FORMS:
+                continue
+            forms.extend((synonym.strip(), etype) for synonym in entry.split(",") if synonym.strip())
+    return forms
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    """Gazetteer compilado una sola vez por proceso."""
+    return Gazetteer(gazetteer_forms())
+
+
+@dataclass
+class PreAnnotation:
+    entities: List[Dict[str, str]] = field(default_factory=list)
+    residual: List[str] = field(default_factory=list)  # Palabras sin cubrir que no son vacías
+
+    @property
+    def complete(self) -> bool:
+        """True si no queda nada por anotar (no hace falta el modelo)."""
+        return bool(self.entities) and not self.residual
+
+
+def preannotate(text: str) -> PreAnnotation:
+    """Anota las entidades conocidas (gazetteer + Tiempo) y lo que queda sin cubrir."""
+    matches = get_gazetteer().find(text)
+    covered = [(m.start, m.end) for m in matches]
+
+    folded, offsets = _fold_with_offsets(text)
+    for m in _TIME.finditer(folded):
+        start, end = offsets[m.start()], offsets[m.end() - 1] + 1
+        if any(s < end and start < e for s, e in covered):
+            continue
+        matches.append(GazetteerMatch(text[start:end], "Tiempo", "", start, end))
+        covered.append((start, end))
+    matches.sort(key=lambda m: m.start)
+
+    remaining = list(text)
+    for s, e in covered:
+        remaining[s:e] = " " * (e - s)
+    residual = [w for w in fold("".join(remaining)).split() if w not in STOPWORDS]
+    return PreAnnotation(entities=[m.as_entity() for m in matches], residual=residual)
+
+
+def merge_entities(first: List[Dict[str, str]], second: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Une dos listas de entidades sin repetir keyword (comparando en forma plegada)."""
+    merged: List[Dict[str, str]] = []
+    seen = set()
+    for entity in list(first) + list(second):
+        key = fold(entity.get("keyword", ""))
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(entity)
+    return merged
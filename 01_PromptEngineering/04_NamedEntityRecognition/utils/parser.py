@@ -1,11 +1,17 @@
 """Parsers para validar/normalizar la salida del modelo."""
 
-from typing import Any, List, Dict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
 
-from .entity_types import get_entity_types
 
+ALLOWED_TYPES = frozenset({"Concepto", "Localización", "Tiempo", "Localizacion"})
 
-ALLOWED_TYPES = {"Concepto", "Localización", "Tiempo", "Localizacion"}
+# Tipo recibido (tal cual) -> tipo normalizado, o None si no es admitido. Se rellena al
+# ver cada variante por primera vez; las salidas del modelo repiten muy pocas variantes.
+_TYPE_CACHE: Dict[Any, Optional[str]] = {}
+_TYPE_CACHE_MAX = 4096
+# Prefijos de las etiquetas de la heurística ("- Localizacion:", "Concepto:", ...)
+_LABEL_PREFIXES = (("localiz", "Localización"), ("concepto", "Concepto"), ("tiempo", "Tiempo"))
 
 
 def _normalize_type(t: str) -> str:
@@ -15,6 +21,53 @@ def _normalize_type(t: str) -> str:
     return t
 
 
+def _resolve_type(raw_type: Any) -> Optional[str]:
+    """Tipo normalizado y admitido (o None), memorizado por valor recibido."""
+    try:
+        return _TYPE_CACHE[raw_type]
+    except (KeyError, TypeError):
+        pass
+    tp = _normalize_type(str(raw_type if raw_type is not None else "").strip())
+    resolved = tp if tp in ALLOWED_TYPES else None
+    if len(_TYPE_CACHE) < _TYPE_CACHE_MAX:
+        try:
+            _TYPE_CACHE[raw_type] = resolved
+        except TypeError:  # tipo no hashable (lista, dict...)
+            pass
+    return resolved
+
+
+@lru_cache(maxsize=256)
+def normalize_type_label(label: str) -> str:
+    """Tipo de una etiqueta de texto libre ("Localización", "tiempo ", ...) o '' si no es un tipo."""
+    t = label.strip().lower()
+    for prefix, etype in _LABEL_PREFIXES:
+        if t.startswith(prefix):
+            return etype
+    return ""
+
+
+def _clean_items(items: List[Any]) -> List[Dict[str, str]]:
+    """Entidades válidas de `items` (bucle con búsquedas locales y tipos memorizados)."""
+    out: List[Dict[str, str]] = []
+    append = out.append
+    cache_get = _TYPE_CACHE.get
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        raw_type = item.get("type", "")
+        tp = cache_get(raw_type, False) if type(raw_type) is str else False
+        if tp is False:
+            tp = _resolve_type(raw_type)
+        if tp is None:
+            continue
+        kw = item.get("keyword", "")
+        kw = (kw if type(kw) is str else str(kw)).strip()
+        if kw:
+            append({"keyword": kw, "type": tp})
+    return out
+
+
 def parse_output(model_output: Any) -> List[Dict[str, str]]:
     """
     Procesa y valida las entidades extraídas por el modelo.
@@ -27,20 +80,14 @@ def parse_output(model_output: Any) -> List[Dict[str, str]]:
     """
     if not isinstance(model_output, list):
         return []
+    return _clean_items(model_output)
 
-    allowed = get_entity_types()
-    allowed_flat = set(ALLOWED_TYPES)
 
-    cleaned: List[Dict[str, str]] = []
-    for item in model_output:
-        if not isinstance(item, dict):
-            continue
-        kw = str(item.get("keyword", "")).strip()
-        tp = _normalize_type(str(item.get("type", "")).strip())
-        if not kw or not tp:
-            continue
-        if tp not in allowed_flat:
-            continue
-        cleaned.append({"keyword": kw, "type": tp})
+def parse_outputs(model_outputs: Iterable[Any]) -> List[List[Dict[str, str]]]:
+    """Comodidad por lotes: `parse_output` de cada salida, en el mismo orden.
 
-    return cleaned
\ No newline at end of file
+    No es una ruta vectorizada: recorre las salidas una a una con el mismo código, así que
+    cuesta lo mismo que llamar a `parse_output` en un bucle (benchmarks/bench_ner_parse_output.py).
+    """
+    clean = _clean_items
+    return [clean(o) if isinstance(o, list) else [] for o in model_outputs]
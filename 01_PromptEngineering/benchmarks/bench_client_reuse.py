@@ -0,0 +1,114 @@
+"""Benchmark: cliente AzureOpenAI nuevo por petición vs. cliente compartido (common.clients).
+
+Mide dos cosas:
+1. Coste de construir el cliente (sin red): `AzureOpenAI(...)` por llamada frente a
+   `get_azure_client(...)`, que devuelve el mismo objeto del registro.
+2. Latencia por petición contra el endpoint real (si hay credenciales): N llamadas
+   secuenciales mínimas (max_tokens=1) con cliente nuevo en cada una (handshake TLS
+   en cada petición) y con el cliente compartido (conexión keep-alive reutilizada).
+
+Uso (desde 01_PromptEngineering):
+    python benchmarks/bench_client_reuse.py                  # construcción + red si hay .env
+    python benchmarks/bench_client_reuse.py --requests 20 --deployment gpt-4
+    python benchmarks/bench_client_reuse.py --offline        # solo construcción
+
+Lee las mismas variables que los runners de NER (04_NamedEntityRecognition/.env):
+AZURE_OPENAI_API_KEY / OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_VERSION.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Callable, List
+
+ROOT = Path(__file__).resolve().parents[1]  # .../01_PromptEngineering
+sys.path.insert(0, str(ROOT))
+
+from dotenv import load_dotenv  # type: ignore
+from openai import AzureOpenAI
+
+from common.clients import close_clients, get_azure_client
+
+
+def _timings(fn: Callable[[], object], repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def _report(label: str, samples: List[float], unit: str = "ms") -> float:
+    scale = 1000.0 if unit == "ms" else 1_000_000.0
+    ordered = sorted(samples)
+    p50 = statistics.median(ordered) * scale
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * scale
+    mean = statistics.fmean(ordered) * scale
+    print(f"  {label:<28} media={mean:9.2f}{unit}  p50={p50:9.2f}{unit}  p95={p95:9.2f}{unit}  (n={len(ordered)})")
+    return mean
+
+
+def bench_construction(cfg: dict, repeat: int) -> None:
+    print("Construcción del cliente (sin red):")
+    fresh = _report("AzureOpenAI(...) por llamada", _timings(
+        lambda: AzureOpenAI(api_key=cfg["api_key"], azure_endpoint=cfg["endpoint"], api_version=cfg["api_version"]),
+        repeat), unit="us")
+    shared = _report("get_azure_client(...)", _timings(lambda: get_azure_client(**cfg), repeat), unit="us")
+    print(f"  -> ahorro por petición: {fresh - shared:.1f}us")
+
+
+def bench_requests(cfg: dict, deployment: str, n: int) -> None:
+    messages = [{"role": "user", "content": "ping"}]
+
+    def call(client: AzureOpenAI) -> None:
+        client.chat.completions.create(model=deployment, messages=messages, max_tokens=1, temperature=0)
+
+    def fresh_call() -> None:
+        client = AzureOpenAI(api_key=cfg["api_key"], azure_endpoint=cfg["endpoint"], api_version=cfg["api_version"])
+        try:
+            call(client)
+        finally:
+            client.close()
+
+    print(f"\nLatencia por petición contra '{deployment}' ({n} llamadas secuenciales):")
+    call(get_azure_client(**cfg))  # calentamiento: abre la conexión del cliente compartido
+    fresh = _report("cliente nuevo por petición", _timings(fresh_call, n))
+    shared = _report("cliente compartido", _timings(lambda: call(get_azure_client(**cfg)), n))
+    print(f"  -> ahorro medio por petición: {fresh - shared:.1f}ms ({(fresh - shared) / fresh * 100:.0f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10, help="Llamadas reales por variante")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones del benchmark de construcción")
+    parser.add_argument("--deployment", default=os.getenv("NER_BENCH_DEPLOYMENT", "gpt-35-turbo"))
+    parser.add_argument("--offline", action="store_true", help="No hacer llamadas de red")
+    args = parser.parse_args()
+
+    load_dotenv(ROOT / "04_NamedEntityRecognition" / ".env")
+    load_dotenv()
+    cfg = {
+        "api_key": os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") or "",
+        "endpoint": os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("gpt35_endpoint") or os.getenv("gpt4_endpoint") or "",
+        "api_version": os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+    }
+    online = not args.offline and cfg["api_key"] and cfg["endpoint"]
+    if not cfg["endpoint"]:
+        cfg.update(api_key=cfg["api_key"] or "dummy", endpoint="https://example.openai.azure.com")
+
+    try:
+        bench_construction(cfg, args.repeat)
+        if online:
+            bench_requests(cfg, args.deployment, args.requests)
+        else:
+            print("\n(Sin credenciales o --offline: se omite el benchmark de red)")
+    finally:
+        close_clients()
+
+
+if __name__ == "__main__":
+    main()
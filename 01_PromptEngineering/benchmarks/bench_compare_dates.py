@@ -0,0 +1,118 @@
+"""Benchmark: comparación de resultados de Dates Extractor a gran escala.
+
+Genera N casos sintéticos (fechas de un gold con omisiones y fechas de más) para varios
+modelos, los escribe como JSONL de resultados en un directorio temporal, con el orden
+barajado en cada fichero (o, con `--ordered`, en el mismo orden, como los escriben los
+runners), y mide `comparar_resultados` (01_DatesExtractor): tiempo y,
+con `--memory`, pico de memoria de Python (tracemalloc, en una segunda pasada porque la
+ralentiza mucho). Con dos modelos comprueba además que las
+fechas comunes y exclusivas coinciden con las de la versión anterior (emparejamiento por
+posición con zip), que solo funcionaba si ambos ficheros tenían el mismo orden.
+
+Uso (desde 01_PromptEngineering):
+    python benchmarks/bench_compare_dates.py
+    python benchmarks/bench_compare_dates.py --cases 300000 --models 4 --memory
+    python benchmarks/bench_compare_dates.py --ordered --memory
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+DATES_ROOT = Path(__file__).resolve().parents[1] / "01_DatesExtractor"
+sys.path.insert(0, str(DATES_ROOT))
+
+from comparar_resultados import comparar_resultados
+from utils.parser import fechas_de_respuesta
+
+
+def legacy_sets(rows_a: List[dict], rows_b: List[dict]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Fechas comunes / solo A / solo B como las calculaba la versión anterior (zip por posición)."""
+    comunes, solo_a, solo_b = set(), set(), set()
+    for a, b in zip(rows_a, rows_b):
+        s_a, s_b = set(fechas_de_respuesta(a["output"])), set(fechas_de_respuesta(b["output"]))
+        comunes |= s_a & s_b
+        solo_a |= s_a - s_b
+        solo_b |= s_b - s_a
+    return comunes, solo_a, solo_b
+
+
+def synthetic_results(cases: int, models: int, seed: int = 11) -> Tuple[List[str], Dict[str, List[str]], List[List[dict]]]:
+    rng = random.Random(seed)
+    pool = [f"{d:02d}/{m:02d}/{y}" for y in (2023, 2024) for m in range(1, 13) for d in range(1, 29)]
+    texts = [f"Documento {i}: reunión y entrega del contrato {rng.random():.6f}" for i in range(cases)]
+    gold = {t: rng.sample(pool, rng.randint(0, 5)) for t in texts}
+    per_model = []
+    for _ in range(models):
+        rows = []
+        for t in texts:
+            dates = [d for d in gold[t] if rng.random() > 0.08]
+            if rng.random() < 0.08:
+                dates.append(rng.choice(pool))
+            rows.append({"input": t, "output": json.dumps(dates), "origen": "modelo"})
+        per_model.append(rows)
+    return texts, gold, per_model
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de comparar_resultados (Dates Extractor)")
+    parser.add_argument("--cases", type=int, default=200000, help="Número de casos sintéticos")
+    parser.add_argument("--models", type=int, default=3, help="Número de modelos")
+    parser.add_argument("--memory", action="store_true", help="Medir también el pico de memoria (más lento)")
+    parser.add_argument("--ordered", action="store_true", help="Mismo orden en todos los ficheros (sin barajar)")
+    args = parser.parse_args()
+
+    texts, gold, per_model = synthetic_results(args.cases, args.models)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        paths = {}
+        for m, rows in enumerate(per_model):
+            shuffled = rows[:]
+            if not args.ordered:
+                random.Random(m).shuffle(shuffled)
+            paths[f"modelo-{m}"] = tmp_dir / f"modelo-{m}.jsonl"
+            with open(paths[f"modelo-{m}"], "w", encoding="utf-8") as f:
+                for row in shuffled:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        gold_path = tmp_dir / "gold.jsonl"
+        with open(gold_path, "w", encoding="utf-8") as f:
+            for t in texts:
+                f.write(json.dumps({"input": t, "fechas": gold[t]}, ensure_ascii=False) + "\n")
+
+        t0 = time.perf_counter()
+        resumen = comparar_resultados(paths, gold=gold_path, salida_casos=tmp_dir / "casos.jsonl")
+        elapsed = time.perf_counter() - t0
+        peak = 0
+        if args.memory:
+            tracemalloc.start()
+            comparar_resultados(paths, gold=gold_path, salida_casos=None)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        casos_diff = sum(1 for _ in open(tmp_dir / "casos.jsonl", encoding="utf-8"))
+
+        # Con dos modelos (ficheros barajados), mismas fechas que la versión anterior con el orden original
+        modelos = list(paths)
+        pareja = comparar_resultados({m: paths[m] for m in modelos[:2]}, salida_casos=None)
+    comunes, solo_a, solo_b = legacy_sets(per_model[0], per_model[1])
+    assert pareja["comunes"] == sorted(comunes), "fechas comunes distintas de la versión anterior"
+    assert pareja["solo"][modelos[0]] == sorted(solo_a) and pareja["solo"][modelos[1]] == sorted(solo_b), \
+        "fechas exclusivas distintas de la versión anterior"
+
+    orden = "mismo orden" if args.ordered else "barajados"
+    print(f"{args.cases} casos x {args.models} modelos (+ gold, {orden}): {elapsed:.1f}s, "
+          f"{args.cases * (args.models + 1) / elapsed:,.0f} registros/s"
+          + (f", pico de memoria {peak / 2**20:.0f} MiB" if args.memory else ""))
+    print(f"  coinciden {resumen['casos_coinciden']}/{resumen['casos_en_todos']}, {casos_diff} casos con diferencias")
+    for m in modelos:
+        g = resumen["por_modelo"][m]["gold"]
+        print(f"  {m}: P={g['precision']:.3f} R={g['recall']:.3f} F1={g['f1']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
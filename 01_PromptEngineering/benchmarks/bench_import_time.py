@@ -0,0 +1,133 @@
+"""Benchmark: tiempo de importación de los runners y de la configuración.
+
+Importa cada módulo en un intérprete nuevo (varias veces, se toma la mediana) y comprueba
+que importar no hace trabajo que corresponde a la ejecución:
+- no carga dependencias pesadas (openai, httpx, tiktoken, numpy): se importan al crear el
+  primer cliente o al usarlas;
+- no lee datos ni crea carpetas (text_examples, data/, results/...): los runners los leen
+  al ejecutar y `Config.ensure_directories()` se llama desde el main() de cada paso;
+- tarda menos que el presupuesto (`--budget-ms`).
+
+Sale con código 1 si algún módulo incumple alguna de las tres, así que sirve como
+comprobación en CI para que el arranque no vuelva a empeorar.
+
+Uso (desde 01_PromptEngineering):
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 5 --budget-ms 200
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]  # .../01_PromptEngineering
+REPO_ROOT = ROOT.parent
+
+MODULES = [
+    ROOT / "01_DatesExtractor" / "prompts" / "prompts.py",
+    ROOT / "01_DatesExtractor" / "models" / "modelo_35.py",
+    ROOT / "01_DatesExtractor" / "models" / "modelo_4.py",
+    ROOT / "02_IntentClassification" / "models" / "modelo_4.py",
+    ROOT / "03_CategorizationClaims" / "models" / "modelo_4.py",
+    ROOT / "04_NamedEntityRecognition" / "models" / "ner_runner.py",
+    REPO_ROOT / "03_FineTunning" / "config" / "config.py",
+]
+
+HEAVY_MODULES = ("openai", "httpx", "tiktoken", "numpy")
+
+# Se ejecuta en un intérprete nuevo: registra lecturas de datos, listados y carpetas creadas
+# mientras se importa el módulo y devuelve el tiempo y los módulos pesados cargados.
+_CHILD = r"""
+import os, sys, json, time, builtins, importlib.util
+from pathlib import Path
+
+path = Path(sys.argv[1])
+heavy = sys.argv[2].split(",")
+effects = []
+_open, _listdir, _makedirs, _mkdir = builtins.open, os.listdir, os.makedirs, Path.mkdir
+
+def _open_spy(file, mode="r", *args, **kwargs):
+    name = str(file)
+    if not name.endswith((".py", ".pyc", ".env", ".pth")) and not name.startswith(sys.prefix):
+        effects.append(f"open {name}")
+    return _open(file, mode, *args, **kwargs)
+
+def _listdir_spy(p="."):
+    effects.append(f"listdir {p}")
+    return _listdir(p)
+
+def _makedirs_spy(name, *args, **kwargs):
+    effects.append(f"makedirs {name}")
+    return _makedirs(name, *args, **kwargs)
+
+def _mkdir_spy(self, *args, **kwargs):
+    effects.append(f"mkdir {self}")
+    return _mkdir(self, *args, **kwargs)
+
+builtins.open, os.listdir, os.makedirs, Path.mkdir = _open_spy, _listdir_spy, _makedirs_spy, _mkdir_spy
+spec = importlib.util.spec_from_file_location(f"bench_{path.parent.parent.name}_{path.stem}", path)
+module = importlib.util.module_from_spec(spec)
+t0 = time.perf_counter()
+spec.loader.exec_module(module)
+elapsed_ms = (time.perf_counter() - t0) * 1000
+builtins.open, os.listdir, os.makedirs, Path.mkdir = _open, _listdir, _makedirs, _mkdir
+
+loaded = sorted(m for m in heavy if m in sys.modules)
+print(json.dumps({"ms": elapsed_ms, "heavy": loaded, "effects": effects}))
+"""
+
+
+def _measure(path: Path, runs: int) -> Dict[str, Any]:
+    """Mediana del tiempo de importación en `runs` intérpretes nuevos, con módulos pesados y efectos."""
+    samples: List[float] = []
+    last: Dict[str, Any] = {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", _CHILD, str(path), ",".join(HEAVY_MODULES)],
+            capture_output=True, text=True, cwd=path.parent,
+        )
+        if proc.returncode != 0:
+            return {"error": (proc.stderr.strip().splitlines() or ["error desconocido"])[-1]}
+        last = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(last["ms"])
+    return {"ms": statistics.median(samples), "heavy": last["heavy"], "effects": last["effects"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del tiempo de importación de los runners")
+    parser.add_argument("--runs", type=int, default=3, help="Intérpretes nuevos por módulo (se usa la mediana)")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Tiempo máximo de importación por módulo")
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"Importación en un intérprete nuevo (mediana de {args.runs}, presupuesto {args.budget_ms:.0f}ms):")
+    for path in MODULES:
+        label = str(path.relative_to(REPO_ROOT))
+        result = _measure(path, args.runs)
+        if "error" in result:
+            failures += 1
+            print(f"  ✗ {label:<58} no se puede importar: {result['error']}")
+            continue
+        problems = []
+        if result["ms"] > args.budget_ms:
+            problems.append("supera el presupuesto")
+        if result["heavy"]:
+            problems.append(f"carga {', '.join(result['heavy'])}")
+        if result["effects"]:
+            problems.append(f"{len(result['effects'])} accesos a datos/carpetas ({result['effects'][0]}...)")
+        failures += bool(problems)
+        mark = "✗" if problems else "✓"
+        print(f"  {mark} {label:<58} {result['ms']:7.1f}ms  {'; '.join(problems)}")
+
+    if failures:
+        print(f"{failures} módulo(s) hacen trabajo al importarse")
+        sys.exit(1)
+    print("Todos los módulos se importan sin trabajo de ejecución")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: validación de salidas de NER (utils/parser.py).
+
+Compara, sobre N salidas sintéticas del modelo (listas de {keyword, type} con tipos
+válidos, variantes y erróneos):
+1. La versión anterior de `parse_output`, que reconstruía `get_entity_types()` en cada llamada.
+2. `parse_output` actual (tablas precalculadas una vez, sin reconstruir el catálogo).
+3. `parse_outputs`, la comodidad por lotes (`parse_output` de cada salida en un solo bucle).
+
+Comprueba además que las tres devuelven exactamente lo mismo.
+
+Uso (desde 01_PromptEngineering):
+    python benchmarks/bench_ner_parse_output.py
+    python benchmarks/bench_ner_parse_output.py --outputs 50000 --repeat 5
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+NER_ROOT = Path(__file__).resolve().parents[1] / "04_NamedEntityRecognition"
+sys.path.insert(0, str(NER_ROOT))
+
+from utils.entity_types import get_entity_catalog, get_entity_types
+from utils.parser import ALLOWED_TYPES, _normalize_type, parse_output, parse_outputs
+
+
+def legacy_parse_output(model_output: Any) -> List[Dict[str, str]]:
+    """Copia de la implementación anterior (referencia del benchmark)."""
+    if not isinstance(model_output, list):
+        return []
+
+    get_entity_types()  # se reconstruía el catálogo en cada llamada
+    allowed_flat = set(ALLOWED_TYPES)
+
+    cleaned: List[Dict[str, str]] = []
+    for item in model_output:
+        if not isinstance(item, dict):
+            continue
+        kw = str(item.get("keyword", "")).strip()
+        tp = _normalize_type(str(item.get("type", "")).strip())
+        if not kw or not tp:
+            continue
+        if tp not in allowed_flat:
+            continue
+        cleaned.append({"keyword": kw, "type": tp})
+    return cleaned
+
+
+def synthetic_outputs(n: int, seed: int = 7) -> List[Any]:
+    rng = random.Random(seed)
+    keywords = [form for form, _ in get_entity_catalog().forms] + ["septiembre de 2023", "Madrid", "", "  "]
+    types = ["Concepto", "Localización", "Localizacion", "localizacion", "Tiempo", "Analysis", "", "concepto"]
+    outputs: List[Any] = []
+    for _ in range(n):
+        if rng.random() < 0.02:
+            outputs.append("texto no JSON")
+            continue
+        items: List[Any] = [{"keyword": rng.choice(keywords), "type": rng.choice(types)}
+                            for _ in range(rng.randint(1, 6))]
+        if rng.random() < 0.05:
+            items.append("no es un dict")
+        outputs.append(items)
+    return outputs
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return min(samples), statistics.fmean(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de parse_output (NER)")
+    parser.add_argument("--outputs", type=int, default=20000, help="Número de salidas sintéticas")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por variante")
+    args = parser.parse_args()
+
+    outputs = synthetic_outputs(args.outputs)
+    entities = sum(len(o) for o in outputs if isinstance(o, list))
+
+    expected = [legacy_parse_output(o) for o in outputs]
+    assert [parse_output(o) for o in outputs] == expected, "parse_output difiere de la versión anterior"
+    assert parse_outputs(outputs) == expected, "parse_outputs difiere de la versión anterior"
+
+    print(f"{args.outputs} salidas, {entities} entidades (mejor/media de {args.repeat}):")
+    variants = [
+        ("parse_output anterior", lambda: [legacy_parse_output(o) for o in outputs]),
+        ("parse_output", lambda: [parse_output(o) for o in outputs]),
+        ("parse_outputs (lotes)", lambda: parse_outputs(outputs)),
+    ]
+    baseline = None
+    for label, fn in variants:
+        best, mean = _best_of(fn, args.repeat)
+        baseline = baseline or best
+        print(f"  {label:<24} mejor={best * 1000:8.1f}ms  media={mean * 1000:8.1f}ms  "
+              f"({best / args.outputs * 1e6:6.2f}us/salida, x{baseline / best:4.1f})")
+
+
+if __name__ == "__main__":
+    main()
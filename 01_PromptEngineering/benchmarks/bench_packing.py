@@ -0,0 +1,97 @@
+"""Benchmark: una frase por petición vs. K frases por petición (common/packing.py).
+
+Clasifica las frases de un ejercicio (intenciones o reclamaciones) contra el deployment
+real dos veces, sin caché de respuestas: primero una petición por frase y después en
+modo empaquetado (`--pack K`). Para cada modo informa de peticiones, tokens de prompt y
+de respuesta, tiempo total y, al final, el ahorro y cuántas respuestas coinciden.
+
+Uso (desde 01_PromptEngineering):
+    python benchmarks/bench_packing.py                                  # intenciones, K=20
+    python benchmarks/bench_packing.py --exercise claims --pack 10
+
+Lee el .env del ejercicio (AZURE_OPENAI_API_KEY_GPT4, AZURE_OPENAI_ENDPOINT_GPT4, OPENAI_MODEL4).
+"""
+
+import sys
+import time
+import argparse
+import importlib.util
+from pathlib import Path
+from typing import Any, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]  # .../01_PromptEngineering
+sys.path.insert(0, str(ROOT))
+
+from common.dedup import dedup_inputs
+from common.usage import UsageTotals, usage_totals
+
+EXERCISES = {
+    "intents": ROOT / "02_IntentClassification" / "models" / "modelo_4.py",
+    "claims": ROOT / "03_CategorizationClaims" / "models" / "modelo_4.py",
+}
+
+
+def _load_runner(path: Path) -> Any:
+    """Importa el runner del ejercicio (cada uno tiene sus propios paquetes prompts/ y models/)."""
+    spec = importlib.util.spec_from_file_location(f"bench_{path.parent.parent.name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run(runner: Any, texts: List[str], pack: int) -> Tuple[List[str], UsageTotals, float]:
+    """Clasifica con el runner y devuelve (contenidos, tokens de todas las peticiones, segundos)."""
+    sent: List[Any] = []
+    enviar = runner.enviar
+
+    def enviar_y_contar(jobs, etiqueta="", **kwargs):
+        results = enviar(jobs, etiqueta, **kwargs)
+        sent.extend(results)
+        return results
+
+    runner.enviar = enviar_y_contar
+    try:
+        t0 = time.perf_counter()
+        responses = runner.clasificar(texts, cache=None, pack=pack)
+        elapsed = time.perf_counter() - t0
+    finally:
+        runner.enviar = enviar
+    return [r.content if r.ok else "" for r in responses], usage_totals(sent), elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del modo empaquetado")
+    parser.add_argument("--exercise", choices=sorted(EXERCISES), default="intents")
+    parser.add_argument("--pack", type=int, default=20, help="Entradas por petición en modo empaquetado")
+    parser.add_argument("--limit", type=int, default=0, help="Usar solo las N primeras frases (0 = todas)")
+    args = parser.parse_args()
+
+    path = EXERCISES[args.exercise]
+    runner = _load_runner(path)
+    if not (runner.API_KEY and runner.ENDPOINT):
+        print(f"Faltan credenciales en {path.parent.parent / '.env'} (AZURE_OPENAI_API_KEY_GPT4, AZURE_OPENAI_ENDPOINT_GPT4)")
+        return
+
+    with open(path.parent.parent / "data" / "examples.txt", "r", encoding="utf-8") as f:
+        texts = dedup_inputs(f.readlines(), enabled=False).unique
+    if args.limit:
+        texts = texts[:args.limit]
+
+    print(f"{len(texts)} frases de {args.exercise} contra '{runner.DEPLOYMENT}':")
+    rows = []
+    for label, pack in (("una por petición", 0), (f"empaquetado K={args.pack}", args.pack)):
+        contents, usage, elapsed = _run(runner, texts, pack)
+        rows.append((contents, usage, elapsed))
+        print(f"  {label:<20} peticiones={usage.requests:4d}  prompt={usage.prompt_tokens:7d}  "
+              f"respuesta={usage.completion_tokens:6d}  tiempo={elapsed:6.1f}s")
+
+    (single, single_usage, single_s), (packed, packed_usage, packed_s) = rows
+    same = sum(a == b for a, b in zip(single, packed))
+    saved_tokens = single_usage.prompt_tokens - packed_usage.prompt_tokens
+    pct = saved_tokens / single_usage.prompt_tokens * 100 if single_usage.prompt_tokens else 0.0
+    print(f"  -> {saved_tokens} tokens de prompt menos ({pct:.0f}%), {single_s - packed_s:+.1f}s de diferencia; "
+          f"coinciden {same}/{len(texts)} respuestas")
+
+
+if __name__ == "__main__":
+    main()
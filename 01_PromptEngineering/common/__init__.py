@@ -0,0 +1 @@
+# Utilidades compartidas por los ejercicios de 01_PromptEngineering.
@@ -0,0 +1,264 @@
+"""Modo Batch API de Azure OpenAI para ejecuciones offline de los ejercicios.
+
+Convierte la misma lista de `ChatJob` que usa `batch_runner` en un fichero JSONL con el
+formato de la Batch API, lo sube, crea el batch, espera a que termine y devuelve los
+resultados como `ChatResult` en el orden de entrada, de modo que cada runner reutiliza
+su procesado de respuestas y escribe los mismos `data/results/*.json` que hoy.
+
+Flujo:
+    jobs -> <work_dir>/<name>.input.jsonl -> files.create(purpose="batch")
+         -> batches.create(endpoint="/chat/completions", completion_window="24h")
+         -> batches.retrieve (polling) -> files.content(output/error) -> ChatResult[]
+
+El id del batch se guarda en <work_dir>/<name>.state.json: si el proceso se interrumpe,
+volver a ejecutar con los mismos trabajos retoma el batch en curso en vez de crear otro.
+
+Requisitos en Azure: un deployment de tipo "Global Batch" (el `model` de cada línea es
+su nombre) y una versión de API con Batch (por defecto 2024-10-21).
+
+Variables de entorno opcionales:
+- AZURE_OPENAI_BATCH_API_VERSION: versión de API para el modo batch (por defecto 2024-10-21)
+- AZURE_OPENAI_BATCH_DEPLOYMENT: deployment Global Batch (por defecto, el del runner)
+- LLM_BATCH_POLL_INTERVAL_S: segundos entre consultas de estado (por defecto 30)
+"""
+
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .batch_runner import ChatJob, ChatResult
+from .response_cache import USE_DEFAULT_CACHE, cache_key, client_endpoint, from_cached, resolve_cache, to_cacheable
+from .usage import usage_totals
+
+BATCH_API_VERSION = os.getenv("AZURE_OPENAI_BATCH_API_VERSION", "2024-10-21")
+BATCH_DEPLOYMENT = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT") or None
+DEFAULT_POLL_INTERVAL_S = float(os.getenv("LLM_BATCH_POLL_INTERVAL_S", "30"))
+
+BATCH_ENDPOINT = "/chat/completions"
+TERMINAL_STATUS = {"completed", "failed", "expired", "cancelled"}
+
+
+def _custom_id(index: int) -> str:
+    return f"task-{index}"
+
+
+def build_batch_lines(jobs: Sequence[ChatJob], deployment: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Serializa los trabajos al formato de línea de la Batch API (una petición por línea)."""
+    lines = []
+    for i, job in enumerate(jobs):
+        body = {**job.params, "messages": job.messages}
+        if deployment:
+            body["model"] = deployment
+        lines.append({"custom_id": _custom_id(i), "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+    return lines
+
+
+def write_batch_file(jobs: Sequence[ChatJob], path: Path, deployment: Optional[str] = None) -> str:
+    """Escribe el JSONL de entrada y devuelve su huella SHA-256 (para reconocer el mismo lote)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    with open(path, "w", encoding="utf-8") as f:
+        for line in build_batch_lines(jobs, deployment):
+            row = json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n"
+            digest.update(row.encode("utf-8"))
+            f.write(row)
+    return digest.hexdigest()
+
+
+def _wait_file_processed(client: Any, file_id: str, poll_interval_s: float, timeout_s: float) -> None:
+    """Azure valida el fichero subido antes de poder usarlo en un batch."""
+    deadline = time.monotonic() + timeout_s
+    while True:
+        status = getattr(client.files.retrieve(file_id), "status", "processed")
+        if status == "processed":
+            return
+        if status == "error":
+            raise RuntimeError(f"El fichero {file_id} no superó la validación de la Batch API")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"El fichero {file_id} sigue en estado '{status}'")
+        time.sleep(min(poll_interval_s, 5.0))
+
+
+def submit_batch(client: Any, input_path: Path, *, poll_interval_s: float = DEFAULT_POLL_INTERVAL_S) -> Any:
+    """Sube el JSONL y crea el batch. Devuelve el objeto Batch."""
+    with open(input_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    _wait_file_processed(client, uploaded.id, poll_interval_s, timeout_s=600)
+    return client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+    )
+
+
+def wait_for_batch(
+    client: Any,
+    batch_id: str,
+    *,
+    poll_interval_s: float = DEFAULT_POLL_INTERVAL_S,
+    timeout_s: float = 24 * 3600,
+    on_status: Optional[Callable[[Any], None]] = None,
+) -> Any:
+    """Consulta el batch hasta que llega a un estado final y lo devuelve."""
+    deadline = time.monotonic() + timeout_s
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if on_status:
+            on_status(batch)
+        if batch.status in TERMINAL_STATUS:
+            return batch
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"El batch {batch_id} no terminó en {timeout_s:.0f}s (estado: {batch.status})")
+        time.sleep(poll_interval_s)
+
+
+def print_batch_status(batch: Any) -> None:
+    counts = getattr(batch, "request_counts", None)
+    done = f" {counts.completed + counts.failed}/{counts.total}" if counts and counts.total else ""
+    print(f"[batch {batch.id}] {batch.status}{done}")
+
+
+def _read_jsonl(client: Any, file_id: Optional[str]) -> List[Dict[str, Any]]:
+    if not file_id:
+        return []
+    text = client.files.content(file_id).text
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def collect_results(client: Any, batch: Any, total: int, output_path: Optional[Path] = None) -> List[ChatResult]:
+    """Descarga salida y errores del batch y los convierte en ChatResult ordenados por custom_id."""
+    rows = _read_jsonl(client, getattr(batch, "output_file_id", None))
+    rows += _read_jsonl(client, getattr(batch, "error_file_id", None))
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    from openai.types.chat import ChatCompletion
+
+    results = [ChatResult(index=i, error=f"sin respuesta en el batch ({batch.status})") for i in range(total)]
+    for row in rows:
+        try:
+            index = int(str(row.get("custom_id", "")).rsplit("-", 1)[-1])
+        except ValueError:
+            continue
+        if not 0 <= index < total:
+            continue
+        result = ChatResult(index=index, attempts=1)
+        response = row.get("response") or {}
+        status = response.get("status_code")
+        body = response.get("body")
+        if row.get("error") or status != 200 or not body:
+            error = row.get("error") or (body or {}).get("error") or {"status_code": status}
+            result.error = json.dumps(error, ensure_ascii=False) if isinstance(error, dict) else str(error)
+        else:
+            try:
+                result.response = ChatCompletion.model_validate(body)
+            except Exception as e:  # noqa: BLE001 - se registra en el resultado
+                result.error = f"{type(e).__name__}: {e}"
+        results[index] = result
+    return results
+
+
+def run_batch_jobs(
+    client: Any,
+    jobs: Sequence[ChatJob],
+    *,
+    name: str,
+    work_dir: Path,
+    deployment: Optional[str] = BATCH_DEPLOYMENT,
+    poll_interval_s: float = DEFAULT_POLL_INTERVAL_S,
+    timeout_s: float = 24 * 3600,
+    cache: Any = USE_DEFAULT_CACHE,
+) -> List[ChatResult]:
+    """Ejecuta los trabajos con la Batch API y devuelve un ChatResult por trabajo, en orden.
+
+    Los trabajos con respuesta en la caché (ver response_cache.py) no se envían al batch.
+
+    Args:
+        client: AzureOpenAI síncrono creado con una versión de API con Batch (BATCH_API_VERSION).
+        jobs: Los mismos trabajos que se pasarían a `run_chat_jobs`.
+        name: Nombre del lote (prefijo de los ficheros en work_dir).
+        work_dir: Carpeta donde se guardan entrada, salida y estado del batch.
+        deployment: Deployment Global Batch; si es None se usa el `model` de cada trabajo.
+        cache: Caché de respuestas (None = sin caché).
+    """
+    if not jobs:
+        return []
+    response_cache = resolve_cache(cache)
+    try:
+        results = _run_batch_with_cache(client, jobs, response_cache, name=name, work_dir=Path(work_dir),
+                                        deployment=deployment, poll_interval_s=poll_interval_s, timeout_s=timeout_s)
+    finally:
+        if response_cache:
+            response_cache.evict()
+            response_cache.print_stats()
+            response_cache.close()
+    totals = usage_totals(results)
+    if totals.requests:
+        print(totals.summary())
+    return results
+
+
+def _run_batch_with_cache(client, jobs, response_cache, **kwargs) -> List[ChatResult]:
+    """Resuelve aciertos de caché, envía solo los fallos al batch y guarda sus respuestas."""
+    endpoint = client_endpoint(client)
+    keys = [cache_key(job.messages, job.params, endpoint) if response_cache else "" for job in jobs]
+    results: List[Optional[ChatResult]] = [None] * len(jobs)
+    pending: List[int] = []
+    for i, key in enumerate(keys):
+        hit = response_cache.get(key) if response_cache else None
+        if hit is not None:
+            results[i] = ChatResult(index=i, response=from_cached(hit), cached=True)
+        else:
+            pending.append(i)
+
+    if pending:
+        print(f"{len(jobs) - len(pending)} respuestas desde caché; {len(pending)} al batch")
+        fresh = _submit_and_collect(client, [jobs[i] for i in pending], **kwargs)
+        for i, result in zip(pending, fresh):
+            result.index = i
+            results[i] = result
+            if response_cache and result.ok:
+                data = to_cacheable(result.response)
+                if data is not None:
+                    response_cache.put(keys[i], data, model=str(jobs[i].params.get("model", "")))
+    return [r for r in results if r is not None]
+
+
+def _submit_and_collect(
+    client: Any,
+    jobs: Sequence[ChatJob],
+    *,
+    name: str,
+    work_dir: Path,
+    deployment: Optional[str],
+    poll_interval_s: float,
+    timeout_s: float,
+) -> List[ChatResult]:
+    input_path = work_dir / f"{name}.input.jsonl"
+    state_path = work_dir / f"{name}.state.json"
+    fingerprint = write_batch_file(jobs, input_path, deployment)
+
+    state: Dict[str, Any] = {}
+    if state_path.exists():
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    if state.get("input_sha256") == fingerprint and state.get("batch_id"):
+        print(f"Retomando batch existente {state['batch_id']} ({len(jobs)} peticiones)")
+        batch_id = state["batch_id"]
+    else:
+        batch = submit_batch(client, input_path, poll_interval_s=poll_interval_s)
+        batch_id = batch.id
+        state = {"batch_id": batch_id, "input_sha256": fingerprint, "total": len(jobs)}
+        state_path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        print(f"Batch {batch_id} enviado con {len(jobs)} peticiones (fichero: {input_path})")
+
+    batch = wait_for_batch(client, batch_id, poll_interval_s=poll_interval_s, timeout_s=timeout_s,
+                           on_status=print_batch_status)
+    results = collect_results(client, batch, len(jobs), output_path=work_dir / f"{name}.output.jsonl")
+    # Un batch terminado no se puede retomar: se limpia el estado para que la próxima ejecución envíe uno nuevo
+    state_path.unlink(missing_ok=True)
+    return results
@@ -0,0 +1,252 @@
+"""Motor común de ejecución por lotes de Chat Completions (Azure OpenAI).
+
+Cada ejercicio construye una lista de trabajos (mensajes + parámetros) y este módulo
+los ejecuta con concurrencia acotada sobre asyncio, un limitador de peticiones por
+minuto y reintentos con backoff exponencial. Los resultados se devuelven en el mismo
+orden que los trabajos de entrada.
+
+Uso típico desde un runner:
+
+    jobs = [ChatJob(messages=[...], params={"model": DEPLOYMENT, "temperature": 0})]
+    results = run_chat_jobs(make_async_client, jobs)
+    for r in results:
+        print(r.content if r.ok else r.error)
+
+Variables de entorno opcionales:
+- LLM_CONCURRENCY: peticiones simultáneas (por defecto 8)
+- LLM_REQUESTS_PER_MINUTE: límite de peticiones por minuto (por defecto sin límite)
+- LLM_MAX_RETRIES: reintentos por petición ante 429/5xx/timeouts (por defecto 4)
+- LLM_CACHE / LLM_CACHE_PATH / ...: caché persistente de respuestas (ver response_cache.py)
+
+Al terminar, `run_chat_jobs` imprime los tokens consumidos; `usage.usage_totals(results)` los
+devuelve para guardarlos con los resultados de cada ejecución.
+"""
+
+import os
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .response_cache import (
+    USE_DEFAULT_CACHE,
+    ResponseCache,
+    cache_key,
+    client_endpoint,
+    from_cached,
+    resolve_cache,
+    to_cacheable,
+)
+from .usage import usage_totals
+
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) or None
+DEFAULT_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+# Códigos HTTP que merece la pena reintentar (throttling y errores transitorios)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Errores del SDK sin status_code que también son transitorios
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "TimeoutError", "ConnectionError"}
+
+
+@dataclass
+class ChatJob:
+    """Una petición de chat: mensajes y parámetros de `chat.completions.create` (model, temperature, tools...)."""
+
+    messages: List[Dict[str, Any]]
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ChatResult:
+    """Resultado de un ChatJob, en la misma posición que el trabajo de entrada."""
+
+    index: int
+    response: Any = None
+    error: Optional[str] = None
+    attempts: int = 0
+    latency_s: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.response is not None
+
+    @property
+    def message(self) -> Any:
+        """Primer mensaje de la respuesta (o None)."""
+        if not self.ok or not getattr(self.response, "choices", None):
+            return None
+        return self.response.choices[0].message
+
+    @property
+    def content(self) -> str:
+        """Texto de la primera respuesta, sin espacios extremos ('' si no hay)."""
+        message = self.message
+        return ((message.content if message else "") or "").strip()
+
+
+class RateLimiter:
+    """Token bucket asíncrono: como máximo `requests_per_minute` peticiones por minuto."""
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(exc).__name__ in RETRYABLE_ERRORS
+
+
+def _retry_after_s(exc: BaseException) -> Optional[float]:
+    """Lee retry-after-ms / retry-after de la respuesta HTTP asociada al error (si la hay)."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def _backoff_s(attempt: int, base_s: float, cap_s: float, retry_after_s: Optional[float]) -> float:
+    delay = random.uniform(0, min(cap_s, base_s * (2 ** attempt)))
+    if retry_after_s is not None:
+        delay = max(delay, min(retry_after_s, cap_s))
+    return delay
+
+
+async def run_chat_jobs_async(
+    client: Any,
+    jobs: Sequence[ChatJob],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    base_delay_s: float = 1.0,
+    max_delay_s: float = 30.0,
+    on_result: Optional[Callable[[ChatResult], None]] = None,
+    cache: Optional[ResponseCache] = None,
+) -> List[ChatResult]:
+    """Ejecuta los trabajos con un cliente asíncrono (AsyncAzureOpenAI).
+
+    Args:
+        client: Cliente con `chat.completions.create` awaitable.
+        jobs: Trabajos a ejecutar.
+        concurrency: Máximo de peticiones en vuelo.
+        requests_per_minute: Límite de peticiones por minuto (None = sin límite).
+        max_retries: Reintentos por trabajo ante errores transitorios.
+        on_result: Callback opcional invocado en cuanto termina cada trabajo (orden de llegada).
+        cache: Caché de respuestas; los aciertos no llaman al modelo (`ChatResult.cached=True`).
+
+    Returns:
+        list[ChatResult]: Un resultado por trabajo, en el orden de entrada.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+    results: List[Optional[ChatResult]] = [None] * len(jobs)
+
+    endpoint = client_endpoint(client)
+
+    async def _run(index: int, job: ChatJob) -> None:
+        result = ChatResult(index=index)
+        key = cache_key(job.messages, job.params, endpoint) if cache else ""
+        hit = cache.get(key) if cache else None
+        if hit is not None:
+            result.response, result.cached = from_cached(hit), True
+            results[index] = result
+            if on_result:
+                on_result(result)
+            return
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                if limiter:
+                    await limiter.acquire()
+                result.attempts = attempt + 1
+                started = time.perf_counter()
+                try:
+                    result.response = await client.chat.completions.create(messages=job.messages, **job.params)
+                    result.latency_s = time.perf_counter() - started
+                    result.error = None
+                    if cache:
+                        data = to_cacheable(result.response)
+                        if data is not None:
+                            cache.put(key, data, model=str(job.params.get("model", "")))
+                    break
+                except Exception as e:  # noqa: BLE001 - se registra en el resultado
+                    result.latency_s = time.perf_counter() - started
+                    result.error = f"{type(e).__name__}: {e}"
+                    if attempt >= max_retries or not _is_retryable(e):
+                        break
+                    await asyncio.sleep(_backoff_s(attempt, base_delay_s, max_delay_s, _retry_after_s(e)))
+        results[index] = result
+        if on_result:
+            on_result(result)
+
+    await asyncio.gather(*(_run(i, job) for i, job in enumerate(jobs)))
+    return [r for r in results if r is not None]
+
+
+def run_chat_jobs(
+    client_factory: Callable[[], Any],
+    jobs: Sequence[ChatJob],
+    *,
+    cache: Any = USE_DEFAULT_CACHE,
+    **kwargs: Any,
+) -> List[ChatResult]:
+    """Versión síncrona: crea el cliente asíncrono dentro del event loop, ejecuta y lo cierra.
+
+    `client_factory` es un callable sin argumentos que devuelve un AsyncAzureOpenAI;
+    se invoca dentro del loop para que su pool de conexiones pertenezca a ese loop.
+    Por defecto usa la caché persistente configurada por entorno (LLM_CACHE); pasa
+    `cache=None` para no usarla. Al terminar imprime sus estadísticas y aplica TTL/tamaño,
+    y también los tokens consumidos (con los servidos desde la caché de prompts, ver usage.py).
+    Acepta los mismos argumentos con nombre que `run_chat_jobs_async`.
+    """
+    response_cache = resolve_cache(cache)
+
+    async def _main() -> List[ChatResult]:
+        client = client_factory()
+        try:
+            return await run_chat_jobs_async(client, jobs, cache=response_cache, **kwargs)
+        finally:
+            close: Optional[Callable[[], Awaitable[None]]] = getattr(client, "close", None)
+            if close is not None:
+                await close()
+
+    if not jobs:
+        return []
+    try:
+        results = asyncio.run(_main())
+    finally:
+        if response_cache:
+            response_cache.evict()
+            response_cache.print_stats()
+            response_cache.close()
+    totals = usage_totals(results)
+    if totals.requests:
+        print(totals.summary())
+    return results
@@ -0,0 +1,111 @@
+"""Registro de clientes Azure OpenAI compartidos por proceso.
+
+Crear un `AzureOpenAI` por petición descarta su pool HTTP y obliga a repetir el
+handshake TLS en cada llamada. Este módulo construye los clientes de forma perezosa
+(la primera vez que se piden) y los reutiliza, indexados por
+(endpoint, api_version, huella de la API key), con un pool de conexiones dimensionado
+explícitamente.
+
+- `get_azure_client(...)`: cliente síncrono compartido por todo el proceso.
+- `create_async_azure_client(...)`: cliente asíncrono con el mismo dimensionado del pool.
+  Un cliente asíncrono queda ligado a su event loop, así que se crea uno por lote
+  (es lo que hace `batch_runner.run_chat_jobs`) y se reutiliza para todas sus peticiones.
+
+Variables de entorno opcionales:
+- LLM_MAX_CONNECTIONS: conexiones máximas del pool (por defecto, el doble de LLM_CONCURRENCY)
+- LLM_HTTP_TIMEOUT_S: timeout por petición en segundos (por defecto 60)
+
+`openai` y `httpx` se importan al crear el primer cliente, no al importar el módulo, para
+que los runners arranquen rápido cuando solo se consulta la ayuda o se reanuda sin peticiones.
+"""
+
+import os
+import hashlib
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .batch_runner import DEFAULT_CONCURRENCY
+
+if TYPE_CHECKING:
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", str(max(10, 2 * DEFAULT_CONCURRENCY))))
+DEFAULT_TIMEOUT_S = float(os.getenv("LLM_HTTP_TIMEOUT_S", "60"))
+
+ClientKey = Tuple[str, str, str]
+
+_clients: Dict[ClientKey, "AzureOpenAI"] = {}
+_lock = threading.Lock()
+
+
+def client_key(endpoint: str, api_version: str, api_key: str) -> ClientKey:
+    """Clave del registro; la API key se guarda solo como huella SHA-256."""
+    fingerprint = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return ((endpoint or "").rstrip("/"), api_version or "", fingerprint)
+
+
+def _limits(max_connections: Optional[int]) -> Any:
+    import httpx
+
+    size = max_connections or DEFAULT_MAX_CONNECTIONS
+    return httpx.Limits(max_connections=size, max_keepalive_connections=size)
+
+
+def get_azure_client(
+    endpoint: str,
+    api_key: str,
+    api_version: str,
+    *,
+    max_connections: Optional[int] = None,
+) -> "AzureOpenAI":
+    """Devuelve el cliente síncrono compartido para (endpoint, api_version, key); lo crea si no existe.
+
+    `max_connections` solo se aplica al crear el cliente (la primera llamada manda).
+    """
+    key = client_key(endpoint, api_version, api_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            from openai import AzureOpenAI
+
+            client = AzureOpenAI(
+                api_key=api_key,
+                azure_endpoint=endpoint,
+                api_version=api_version,
+                timeout=DEFAULT_TIMEOUT_S,
+                http_client=httpx.Client(limits=_limits(max_connections), timeout=DEFAULT_TIMEOUT_S),
+            )
+            _clients[key] = client
+    return client
+
+
+def create_async_azure_client(
+    endpoint: str,
+    api_key: str,
+    api_version: str,
+    *,
+    max_connections: Optional[int] = None,
+) -> "AsyncAzureOpenAI":
+    """Crea un cliente asíncrono con el pool dimensionado (uno por event loop / lote)."""
+    import httpx
+    from openai import AsyncAzureOpenAI
+
+    return AsyncAzureOpenAI(
+        api_key=api_key,
+        azure_endpoint=endpoint,
+        api_version=api_version,
+        timeout=DEFAULT_TIMEOUT_S,
+        http_client=httpx.AsyncClient(limits=_limits(max_connections), timeout=DEFAULT_TIMEOUT_S),
+    )
+
+
+def close_clients() -> None:
+    """Cierra y olvida todos los clientes síncronos registrados (útil en benchmarks)."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,202 @@
+"""Normalización y de-duplicación de entradas antes de llamar al modelo.
+
+En los feeds reales buena parte de los mensajes son idénticos o casi idénticos
+("¿Cuál es mi saldo?" / "cual es mi saldo" / "- “¿Cuál es mi saldo?”"). Este módulo:
+
+1. Normaliza cada línea: quita viñetas (-, –, •, *), comillas envolventes (rectas o
+   tipográficas) y espacios repetidos.
+2. Agrupa duplicados exactos y, si se pide, casi-duplicados:
+   - exactos tras una clave canónica (minúsculas, sin tildes, sin puntuación);
+   - casi-duplicados (solo con `similarity`, p. ej. 0.9) por similitud de Jaccard de
+     4-gramas de caracteres, con MinHash + LSH para no comparar todas las parejas. Dos
+     entradas nunca se agrupan si difieren en una negación o en un número ("quiero
+     cancelar..." / "no quiero cancelar...", "500 euros" / "600 euros"): el resultado se
+     replica a todo el grupo y acabaría en la fila equivocada.
+3. Devuelve un `DedupPlan`: una entrada representativa por grupo (la que se envía al
+   modelo) y, para cada fila original, el índice de su grupo, de modo que el resultado
+   se replica ("fan-out") a todas las filas.
+
+Uso:
+    plan = dedup_inputs(lines)
+    respuestas = run_chat_jobs(factory, [job(t) for t in plan.unique])
+    por_fila = plan.fan_out(respuestas)   # una por fila no vacía, en orden
+"""
+
+import re
+import zlib
+import operator
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, TypeVar
+
+T = TypeVar("T")
+
+# Por defecto solo duplicados exactos; el agrupamiento por similitud es opcional (--similarity)
+DEFAULT_SIMILARITY: Optional[float] = None
+
+# Palabras que cambian el sentido de una frase casi idéntica (en la forma de canonical_key)
+_NEGATIONS = frozenset({"no", "ni", "nunca", "jamas", "tampoco", "sin", "nada", "nadie",
+                        "ningun", "ninguno", "ninguna", "ningunos", "ningunas"})
+_NUMBER = re.compile(r"\d+")
+
+_BULLET = re.compile(r"^\s*[-–—•*·]\s*")
+_QUOTES = {'"': '"', "'": "'", "“": "”", "«": "»", "‘": "’"}
+_SPACES = re.compile(r"\s+")
+_NON_WORD = re.compile(r"[^\w\s]")
+
+_SHINGLE = 4
+_BANDS = 4
+_ROWS = 8
+_PRIME = (1 << 61) - 1
+# Coeficientes fijos (a, b) de las permutaciones MinHash: resultados reproducibles entre ejecuciones
+_PERMUTATIONS = [((i * 0x9E3779B1 + 0x7F4A7C15) % _PRIME | 1, (i * 0x85EBCA6B + 0xC2B2AE35) % _PRIME)
+                 for i in range(1, _BANDS * _ROWS + 1)]
+
+
+def normalize_text(text: str) -> str:
+    """Limpia una línea: viñetas, comillas envolventes y espacios. No cambia mayúsculas ni tildes."""
+    text = unicodedata.normalize("NFC", text or "").strip()
+    text = _BULLET.sub("", text)
+    while len(text) >= 2 and _QUOTES.get(text[0]) == text[-1]:
+        text = text[1:-1].strip()
+    return _SPACES.sub(" ", text)
+
+
+def canonical_key(text: str) -> str:
+    """Clave para duplicados exactos: minúsculas, sin tildes, sin puntuación ni espacios extra."""
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", folded)).strip()
+
+
+def _meaning_markers(key: str) -> tuple:
+    """Negaciones y números de una clave canónica: los casi-duplicados deben compartirlos."""
+    return (tuple(w for w in key.split() if w in _NEGATIONS), tuple(_NUMBER.findall(key)))
+
+
+def _shingles(key: str) -> Set[int]:
+    padded = f" {key} "
+    if len(padded) <= _SHINGLE:
+        return {zlib.crc32(padded.encode("utf-8"))}
+    return {zlib.crc32(padded[i:i + _SHINGLE].encode("utf-8")) for i in range(len(padded) - _SHINGLE + 1)}
+
+
+def _minhash(shingles: Set[int]) -> List[int]:
+    return [min((a * s + b) % _PRIME for s in shingles) for a, b in _PERMUTATIONS]
+
+
+def _bands(signature: List[int]) -> List[tuple]:
+    return [(band, tuple(signature[band * _ROWS:(band + 1) * _ROWS])) for band in range(_BANDS)]
+
+
+def _estimated_jaccard(a: List[int], b: List[int]) -> float:
+    """Fracción de componentes MinHash iguales: estimador barato de la similitud de Jaccard."""
+    return sum(map(operator.eq, a, b)) / len(a)
+
+
+def _jaccard(a: Set[int], b: Set[int]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+@dataclass
+class DedupPlan:
+    """Resultado de la de-duplicación.
+
+    Attributes:
+        rows: Texto normalizado de cada fila original ('' si estaba vacía).
+        unique: Entradas representativas (una por grupo), en orden de primera aparición.
+        assignment: Para cada fila, índice en `unique` (None si la fila estaba vacía).
+    """
+
+    rows: List[str]
+    unique: List[str] = field(default_factory=list)
+    assignment: List[Optional[int]] = field(default_factory=list)
+    near_duplicates: int = 0
+
+    @property
+    def kept_rows(self) -> List[int]:
+        """Índices de las filas no vacías (las que reciben resultado)."""
+        return [i for i, g in enumerate(self.assignment) if g is not None]
+
+    def fan_out(self, unique_values: Sequence[T]) -> List[T]:
+        """Replica un valor por entrada única a todas sus filas (se omiten las filas vacías)."""
+        return [unique_values[g] for g in self.assignment if g is not None]
+
+    def summary(self) -> str:
+        total = len(self.kept_rows)
+        saved = total - len(self.unique)
+        pct = saved / total * 100 if total else 0.0
+        return (f"{total} entradas -> {len(self.unique)} únicas "
+                f"({saved} duplicadas, {self.near_duplicates} casi-duplicadas; {pct:.0f}% menos llamadas)")
+
+
+def dedup_inputs(
+    lines: Iterable[str],
+    *,
+    similarity: Optional[float] = DEFAULT_SIMILARITY,
+    enabled: bool = True,
+) -> DedupPlan:
+    """Normaliza y agrupa las líneas.
+
+    Args:
+        lines: Líneas originales (p. ej. `f.readlines()`).
+        similarity: Umbral de Jaccard (4-gramas de caracteres) para casi-duplicados;
+            None (por defecto) o >= 1 agrupa solo duplicados exactos tras la clave canónica.
+            Con umbral, nunca se agrupan entradas con distintas negaciones o números.
+        enabled: False solo normaliza y descarta vacías (cada fila es su propio grupo).
+    """
+    plan = DedupPlan(rows=[normalize_text(line) for line in lines])
+    if not enabled:
+        for text in plan.rows:
+            plan.assignment.append(len(plan.unique) if text else None)
+            if text:
+                plan.unique.append(text)
+        return plan
+    by_key: Dict[str, int] = {}
+    buckets: Dict[tuple, List[int]] = {}
+    signatures: List[List[int]] = []
+    unique_shingles: List[Set[int]] = []
+    unique_markers: List[tuple] = []
+    fuzzy = similarity is not None and similarity < 1
+
+    for text in plan.rows:
+        if not text:
+            plan.assignment.append(None)
+            continue
+        key = canonical_key(text)
+        group = by_key.get(key)
+        if group is None and fuzzy:
+            shingles = _shingles(key)
+            signature = _minhash(shingles)
+            bands = _bands(signature)
+            markers = _meaning_markers(key)
+            # Candidatos: comparten al menos una banda LSH y las mismas negaciones y números; se
+            # filtran con el estimador MinHash (con margen) y solo el mejor se verifica con el Jaccard exacto.
+            candidates = {g for band in bands for g in buckets.get(band, ()) if unique_markers[g] == markers}
+            scored = [(_estimated_jaccard(signature, signatures[g]), g) for g in candidates]
+            best = max((sg for sg in scored if sg[0] >= similarity - 0.15), default=None)
+            if best is not None and _jaccard(shingles, unique_shingles[best[1]]) >= similarity:
+                group = best[1]
+                plan.near_duplicates += 1
+            else:
+                group = len(plan.unique)
+                plan.unique.append(text)
+                signatures.append(signature)
+                unique_shingles.append(shingles)
+                unique_markers.append(markers)
+                for band in bands:
+                    buckets.setdefault(band, []).append(group)
+        elif group is None:
+            group = len(plan.unique)
+            plan.unique.append(text)
+        by_key.setdefault(key, group)
+        plan.assignment.append(group)
+    return plan
+
+
+def add_dedup_arguments(parser: Any) -> None:
+    """Añade --no-dedup y --similarity a un argparse.ArgumentParser de un runner."""
+    parser.add_argument("--no-dedup", action="store_true", help="Enviar cada fila aunque esté repetida")
+    parser.add_argument("--similarity", type=float, default=DEFAULT_SIMILARITY,
+                        help="Agrupar también casi-duplicados con este umbral de Jaccard (p. ej. 0.9); "
+                             "por defecto solo duplicados exactos")
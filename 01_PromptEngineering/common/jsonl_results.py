@@ -0,0 +1,160 @@
+"""Resultados en JSONL de solo-añadir, con reanudación y compactación al formato de siempre.
+
+Cada resultado se escribe como una línea `{"_key": <hash de la entrada>, ...registro}` y se
+vuelca a disco en cuanto está listo, así que si el proceso se interrumpe no se pierde lo ya
+hecho y la memoria no crece con el número de entradas. Al volver a ejecutar, las entradas
+cuya clave ya está en el fichero se saltan (salvo con `--fresh`). La clave incluye una
+huella de la configuración que cambia la respuesta (`config_fingerprint`: prompt del sistema,
+parámetros, opciones del runner), así que al cambiarla se vuelven a procesar todas las entradas
+en lugar de devolver respuestas de la configuración anterior.
+
+Al terminar, `compact` reconstruye el JSON indentado que generaban los runners (lista o
+dict con metadatos) a partir del JSONL; con `--no-compact` se omite (ejecuciones enormes).
+
+Uso típico desde un runner:
+
+    store = JsonlResults("data/results/gpt-4-results.jsonl", resume=True)
+    huella = config_fingerprint(get_system_message(), params, pack)
+    keys = [input_key(t, DEPLOYMENT, huella) for t in textos]
+    pending = [i for i, k in enumerate(keys) if k not in store]
+    ...                                   # al completar cada entrada:
+    store.write(keys[i], {"input": textos[i], "intent": intent})
+    store.close()
+    compact(store.path, "data/results/gpt-4-results.json", lambda records: [...])
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
+
+KEY_FIELD = "_key"
+
+PathLike = Union[str, Path]
+
+
+def input_key(text: str, *parts: str) -> str:
+    """Clave estable de una entrada (y, opcionalmente, de lo que la distingue: modelo, prompt...)."""
+    payload = "\x1f".join((text, *parts))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def config_fingerprint(*config: Any) -> str:
+    """Huella corta de la configuración que cambia la respuesta (prompt, parámetros, opciones).
+
+    Se añade a `input_key` para que las entradas guardadas con otra configuración no cuenten
+    como hechas al reanudar.
+    """
+    payload = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _repair_tail(path: Path) -> None:
+    """Recorta una última línea a medio escribir (proceso interrumpido) para poder seguir añadiendo."""
+    size = path.stat().st_size
+    if not size:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        # Buscar el último salto de línea desde el final, por bloques
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b"\n")
+            if cut != -1:
+                f.truncate(start + cut + 1)
+                return
+            end = start
+        f.truncate(0)
+
+
+def iter_records(path: PathLike) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(clave, registro sin `_key`) por cada línea válida del fichero, en orden de escritura."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # línea truncada o corrupta: esa entrada se volverá a procesar
+            if isinstance(record, dict) and KEY_FIELD in record:
+                key = record.pop(KEY_FIELD)
+                yield key, record
+
+
+def load_records(path: PathLike) -> Dict[str, Dict[str, Any]]:
+    """Clave -> registro (si una clave aparece varias veces, gana la última escritura)."""
+    return dict(iter_records(path))
+
+
+class JsonlResults:
+    """Fichero JSONL de resultados abierto para añadir; solo guarda en memoria las claves."""
+
+    def __init__(self, path: PathLike, *, resume: bool = True):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._keys = set()
+        if resume and self.path.exists():
+            _repair_tail(self.path)
+            self._keys = {key for key, _ in iter_records(self.path)}
+        self._f = open(self.path, "a" if resume else "w", encoding="utf-8")
+        self.resumed = len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def write(self, key: str, record: Dict[str, Any]) -> None:
+        """Añade un resultado y lo vuelca a disco inmediatamente."""
+        self._f.write(json.dumps({KEY_FIELD: key, **record}, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self._keys.add(key)
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+
+    def __enter__(self) -> "JsonlResults":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def compact(
+    jsonl_path: PathLike,
+    json_path: PathLike,
+    build: Optional[Callable[[Dict[str, Dict[str, Any]]], Any]] = None,
+    *,
+    indent: int = 2,
+) -> str:
+    """Escribe el JSON de siempre a partir del JSONL y devuelve su ruta.
+
+    Args:
+        build: Recibe clave -> registro y devuelve el objeto a guardar (p. ej. la lista en el
+            orden de las entradas); por defecto, la lista de registros en orden de escritura.
+    """
+    records = load_records(jsonl_path)
+    payload = build(records) if build else list(records.values())
+    json_path = Path(json_path)
+    tmp_path = json_path.with_name(json_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, json_path)
+    return str(json_path)
+
+
+def add_results_arguments(parser: Any) -> None:
+    """Añade --fresh y --no-compact a un argparse.ArgumentParser de un runner."""
+    parser.add_argument("--fresh", action="store_true",
+                        help="Empezar de cero: no saltar las entradas ya guardadas en el JSONL de resultados")
+    parser.add_argument("--no-compact", action="store_true",
+                        help="No generar el JSON final (solo el JSONL), para ejecuciones muy grandes")
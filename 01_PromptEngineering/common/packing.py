@@ -0,0 +1,244 @@
+"""Modo empaquetado: varias entradas numeradas por petición de chat.
+
+Cuando las entradas son frases cortas, el mensaje de sistema pesa mucho más que la propia
+frase y se paga una vez por petición. En modo empaquetado se envían hasta K entradas
+numeradas en cada petición y el modelo responde con una función (tool calling) cuyo
+esquema es una lista `answers` de objetos `{id, ...campos de la respuesta}`.
+
+La respuesta se valida contra las entradas enviadas: cada `id` debe estar en 1..K, sin
+repetirse, y la respuesta debe pasar la validación del runner. Las entradas sin respuesta
+válida (ausentes, duplicadas, malformadas o de una petición fallida) se vuelven a enviar
+una a una con el trabajo individual de siempre, así que el resultado es el mismo que sin
+empaquetar, en el orden de entrada.
+
+Uso típico desde un runner:
+
+    results, report = run_packed(send, textos, size=20, prefix=prefijo, params=params,
+                                 answer_properties={"intent": {"type": "string", "enum": INTENCIONES}},
+                                 to_content=lambda a: a.get("intent"), single_job=construir_job)
+    print(report.summary())
+    for r in results:            # ChatResult (individuales) o PackedResult: .ok, .content, .error
+        ...
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .batch_runner import ChatJob, ChatResult
+from .usage import UsageTotals, usage_totals
+
+DEFAULT_PACK_SIZE = 20
+PACK_TOOL_NAME = "return_answers"
+PACK_INSTRUCTIONS = (
+    "Recibirás varias entradas numeradas (1, 2, 3...). Trata cada una por separado, como si "
+    "fuera la única, y devuelve una respuesta por entrada con su número en `id` mediante la "
+    f"función {PACK_TOOL_NAME}, sin omitir ni repetir ninguna."
+)
+
+# Envía trabajos y devuelve un ChatResult por trabajo, en orden. La etiqueta ("packed" /
+# "fallback") permite, por ejemplo, usar un nombre de lote distinto en la Batch API.
+SendFn = Callable[[Sequence[ChatJob], str], List[ChatResult]]
+
+
+@dataclass
+class PackedResult:
+    """Respuesta de una entrada extraída de una petición empaquetada (misma interfaz que ChatResult)."""
+
+    index: int
+    content: str
+    error: Optional[str] = None
+    packed: bool = True
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class PackingReport:
+    """Peticiones, tokens y tiempo de una ejecución empaquetada."""
+
+    items: int
+    size: int
+    packed_requests: int = 0
+    fallback_items: int = 0
+    elapsed_s: float = 0.0
+    usage: UsageTotals = field(default_factory=UsageTotals)
+
+    @property
+    def requests(self) -> int:
+        return self.packed_requests + self.fallback_items
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "size": self.size,
+            "packed_requests": self.packed_requests,
+            "fallback_items": self.fallback_items,
+            "requests": self.requests,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "usage": self.usage.as_dict(),
+        }
+
+    def summary(self) -> str:
+        saved = self.items - self.requests
+        pct = saved / self.items * 100 if self.items else 0.0
+        per_item = self.usage.prompt_tokens / self.items if self.items else 0.0
+        return (f"Empaquetado: {self.items} entradas en {self.packed_requests} peticiones de hasta {self.size} "
+                f"(+{self.fallback_items} individuales); {self.requests} peticiones en lugar de {self.items} "
+                f"({pct:.0f}% menos), {per_item:.0f} tokens de prompt por entrada, {self.elapsed_s:.1f}s")
+
+
+def pack_tool(answer_properties: Dict[str, Any], description: str = "Devuelve una respuesta por entrada") -> Dict[str, Any]:
+    """Esquema de la función de respuesta: `answers` = [{id, **answer_properties}]."""
+    return {
+        "type": "function",
+        "function": {
+            "name": PACK_TOOL_NAME,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "answers": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"id": {"type": "integer"}, **answer_properties},
+                            "required": ["id", *answer_properties],
+                        },
+                    }
+                },
+                "required": ["answers"],
+            },
+        },
+    }
+
+
+def build_packed_job(
+    prefix: Sequence[Dict[str, Any]],
+    texts: Sequence[str],
+    params: Dict[str, Any],
+    tool: Dict[str, Any],
+) -> ChatJob:
+    """Un trabajo con las entradas numeradas desde 1 en el último turno de usuario.
+
+    El prefijo (system del runner + PACK_INSTRUCTIONS) es el mismo en todas las peticiones.
+    Si `params` trae `max_tokens`, se interpreta por entrada y se multiplica por su número.
+    """
+    lines = "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts, 1))
+    packed_params = dict(params, tools=[tool], tool_choice={"type": "function", "function": {"name": PACK_TOOL_NAME}})
+    if packed_params.get("max_tokens"):
+        packed_params["max_tokens"] = int(packed_params["max_tokens"]) * len(texts) + 50
+    return ChatJob(messages=[*prefix, {"role": "user", "content": f"Entradas ({len(texts)}):\n{lines}"}],
+                   params=packed_params)
+
+
+def unpack_answers(
+    result: ChatResult,
+    count: int,
+    to_content: Callable[[Dict[str, Any]], Optional[str]],
+) -> Dict[int, str]:
+    """Respuestas válidas de una petición empaquetada: id (1..count) -> contenido.
+
+    Se descartan los ids fuera de rango o repetidos (ambas copias: no se sabe cuál es la
+    buena) y las respuestas que `to_content` no acepta (devuelve None).
+    """
+    message = result.message
+    args = None
+    for tc in getattr(message, "tool_calls", None) or []:
+        function = getattr(tc, "function", None)
+        if function is not None and function.name == PACK_TOOL_NAME:
+            args = function.arguments
+            break
+    try:
+        answers = json.loads(args or "{}").get("answers")
+    except (ValueError, AttributeError):
+        return {}
+    if not isinstance(answers, list):
+        return {}
+
+    valid: Dict[int, str] = {}
+    seen = set()
+    for answer in answers:
+        if not isinstance(answer, dict):
+            continue
+        answer_id = answer.get("id")
+        if type(answer_id) is not int or not 1 <= answer_id <= count:
+            continue
+        if answer_id in seen:
+            valid.pop(answer_id, None)
+            continue
+        seen.add(answer_id)
+        content = to_content(answer)
+        if content is not None:
+            valid[answer_id] = content
+    return valid
+
+
+def run_packed(
+    send: SendFn,
+    texts: Sequence[str],
+    *,
+    size: int,
+    prefix: Sequence[Dict[str, Any]],
+    params: Dict[str, Any],
+    answer_properties: Dict[str, Any],
+    to_content: Callable[[Dict[str, Any]], Optional[str]],
+    single_job: Callable[[str], ChatJob],
+) -> Tuple[List[Any], PackingReport]:
+    """Clasifica `texts` en peticiones de hasta `size` entradas y reenvía una a una las que fallen.
+
+    Args:
+        send: Función que ejecuta una lista de ChatJob (run_chat_jobs o run_batch_jobs).
+        texts: Entradas a clasificar.
+        size: Entradas por petición (K).
+        prefix: Mensajes fijos del runner (system...); se les añade PACK_INSTRUCTIONS.
+        params: Parámetros del modelo (model, temperature, max_tokens por entrada...).
+        answer_properties: Propiedades JSON Schema de la respuesta de una entrada (sin `id`).
+        to_content: Convierte una respuesta validada al `content` que espera el runner (None = inválida).
+        single_job: Trabajo individual de siempre para una entrada (reenvío de las que fallen).
+
+    Returns:
+        tuple: (un resultado por entrada, en orden, con `.ok`, `.content` y `.error`; informe).
+    """
+    started = time.perf_counter()
+    size = max(1, size)
+    report = PackingReport(items=len(texts), size=size)
+    tool = pack_tool(answer_properties)
+    packed_prefix = [*prefix]
+    if packed_prefix and packed_prefix[0].get("role") == "system":
+        packed_prefix[0] = dict(packed_prefix[0], content=f"{packed_prefix[0]['content']}\n\n{PACK_INSTRUCTIONS}")
+    else:
+        packed_prefix.insert(0, {"role": "system", "content": PACK_INSTRUCTIONS})
+
+    chunks = [list(range(start, min(start + size, len(texts)))) for start in range(0, len(texts), size)]
+    jobs = [build_packed_job(packed_prefix, [texts[i] for i in chunk], params, tool) for chunk in chunks]
+    packed_results = send(jobs, "packed") if jobs else []
+    report.packed_requests = len(jobs)
+
+    results: List[Any] = [None] * len(texts)
+    for chunk, result in zip(chunks, packed_results):
+        answers = unpack_answers(result, len(chunk), to_content) if result.ok else {}
+        for position, index in enumerate(chunk, 1):
+            if position in answers:
+                results[index] = PackedResult(index=index, content=answers[position])
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    fallback_results = send([single_job(texts[i]) for i in missing], "fallback") if missing else []
+    for index, result in zip(missing, fallback_results):
+        result.index = index
+        results[index] = result
+    report.fallback_items = len(missing)
+
+    report.usage.merge(usage_totals(packed_results))
+    report.usage.merge(usage_totals(fallback_results))
+    report.elapsed_s = time.perf_counter() - started
+    return results, report
+
+
+def add_packing_arguments(parser: Any) -> None:
+    """Añade --pack K a un argparse.ArgumentParser de un runner (0 = una entrada por petición)."""
+    parser.add_argument("--pack", type=int, default=0, metavar="K",
+                        help=f"Enviar K entradas por petición (p. ej. {DEFAULT_PACK_SIZE}; 0 = una por petición)")
@@ -0,0 +1,222 @@
+"""Caché persistente (SQLite) de respuestas de Chat Completions.
+
+Volver a ejecutar un ejercicio sobre el mismo `examples.txt` no debería volver a pagar
+cada completion: iterar sobre parsers e informes tiene que salir gratis. La clave es un
+SHA-256 del JSON canónico (claves ordenadas) de:
+
+    endpoint + deployment (`model`) + mensajes + tools + parámetros de muestreo
+
+de modo que cualquier cambio en el prompt, la temperatura o las herramientas produce una
+entrada nueva. Solo se guardan respuestas correctas.
+
+Modos (variable LLM_CACHE o argumento `mode`):
+- "on" (por defecto): lee y escribe.
+- "refresh": no lee, pero escribe (fuerza a regenerar y actualiza la caché).
+- "off": ni lee ni escribe (bypass completo).
+
+Variables de entorno opcionales:
+- LLM_CACHE_PATH: fichero SQLite (por defecto 01_PromptEngineering/.cache/llm_responses.sqlite)
+- LLM_CACHE_TTL_DAYS: caducidad de las entradas en días (por defecto 30; 0 = sin caducidad)
+- LLM_CACHE_MAX_MB: tamaño máximo; al superarlo se eliminan las entradas menos usadas (por defecto 256)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH") or Path(__file__).resolve().parents[1] / ".cache" / "llm_responses.sqlite")
+DEFAULT_MODE = os.getenv("LLM_CACHE", "on").strip().lower()
+DEFAULT_TTL_S = float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 86400
+DEFAULT_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+CACHE_MODES = ("on", "refresh", "off")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at);
+"""
+
+
+def cache_key(messages: List[Dict[str, Any]], params: Dict[str, Any], endpoint: str = "") -> str:
+    """Hash canónico de endpoint + deployment + mensajes + tools + parámetros de muestreo."""
+    payload = {"endpoint": (endpoint or "").rstrip("/"), "messages": messages, "params": params}
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def client_endpoint(client: Any) -> str:
+    """URL base del cliente (distingue recursos de Azure con el mismo nombre de deployment)."""
+    return str(getattr(client, "base_url", "") or "")
+
+
+class ResponseCache:
+    """Caché SQLite de respuestas (dicts JSON de ChatCompletion) con TTL, límite de tamaño y estadísticas."""
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        *,
+        mode: str = DEFAULT_MODE,
+        ttl_s: float = DEFAULT_TTL_S,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Modo de caché no válido: {mode!r} (usa {', '.join(CACHE_MODES)})")
+        self.path = Path(path)
+        self.mode = mode
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la respuesta guardada (dict) o None. En modo refresh/off siempre es un fallo."""
+        if self.mode != "on":
+            self.misses += 1
+            return None
+        db = self._db()
+        row = db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.ttl_s and now - row[1] > self.ttl_s):
+            self.misses += 1
+            return None
+        db.execute("UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        db.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict[str, Any], model: str = "") -> None:
+        if not self.enabled:
+            return
+        data = json.dumps(response, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, model, data, len(data), now, now),
+        )
+        db.commit()
+        self.writes += 1
+
+    def evict(self) -> int:
+        """Elimina entradas caducadas y, si se supera max_bytes, las menos usadas recientemente."""
+        if not self.enabled or not self.path.exists():
+            return 0
+        db = self._db()
+        removed = 0
+        if self.ttl_s:
+            removed += db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_s,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self.max_bytes and total > self.max_bytes:
+            excess = total - self.max_bytes
+            freed = 0
+            victims = []
+            for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+                victims.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            db.executemany("DELETE FROM responses WHERE key = ?", victims)
+            removed += len(victims)
+        db.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de esta sesión más el tamaño actual de la caché."""
+        lookups = self.hits + self.misses
+        entries, size = (0, 0)
+        if self.enabled and self.path.exists():
+            entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "size_mb": round(size / (1024 * 1024), 2),
+        }
+
+    def print_stats(self) -> None:
+        s = self.stats()
+        print(
+            f"[cache {s['mode']}] aciertos={s['hits']} fallos={s['misses']} "
+            f"tasa={s['hit_rate']:.0%} entradas={s['entries']} tamaño={s['size_mb']}MB ({self.path})"
+        )
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# Marcador para "usar la caché por defecto" en los argumentos `cache=` de los runners
+USE_DEFAULT_CACHE = object()
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """Caché según las variables de entorno (None si LLM_CACHE=off)."""
+    cache = ResponseCache()
+    return cache if cache.enabled else None
+
+
+def resolve_cache(cache: Any) -> Optional[ResponseCache]:
+    """Traduce el argumento `cache=` (USE_DEFAULT_CACHE, None o una ResponseCache) a una caché o None."""
+    if cache is USE_DEFAULT_CACHE:
+        return default_cache()
+    return cache if cache is not None and cache.enabled else None
+
+
+def to_cacheable(response: Any) -> Optional[Dict[str, Any]]:
+    """Respuesta del SDK -> dict JSON serializable (None si no se puede guardar)."""
+    dump = getattr(response, "model_dump", None)
+    return dump(mode="json") if dump else None
+
+
+def from_cached(data: Dict[str, Any]) -> Any:
+    """dict guardado -> ChatCompletion (mismo objeto que devolvería el SDK)."""
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(data)
+
+
+def add_cache_arguments(parser: Any) -> None:
+    """Añade --no-cache y --refresh-cache a un argparse.ArgumentParser de un runner."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--no-cache", action="store_true", help="No leer ni escribir la caché de respuestas")
+    group.add_argument("--refresh-cache", action="store_true", help="Ignorar la caché al leer pero actualizarla")
+
+
+def cache_from_args(args: Any) -> Any:
+    """Caché a usar según --no-cache / --refresh-cache (USE_DEFAULT_CACHE si no se indica nada)."""
+    if getattr(args, "no_cache", False):
+        return None
+    if getattr(args, "refresh_cache", False):
+        return ResponseCache(mode="refresh")
+    return USE_DEFAULT_CACHE
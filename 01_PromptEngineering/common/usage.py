@@ -0,0 +1,80 @@
+"""Contabilidad de tokens por ejecución (prompt, cached y completion) a partir de `usage`.
+
+Azure OpenAI reutiliza automáticamente el prefijo de un prompt ya visto (caché de
+prompts del servicio) cuando los primeros tokens de la petición son idénticos byte a
+byte (mínimo 1024 tokens) y lo indica en `usage.prompt_tokens_details.cached_tokens`.
+Para aprovecharlo, los runners construyen los mensajes con la parte fija delante
+(system + instrucciones + few-shot) y la entrada variable al final.
+
+Uso típico:
+
+    results = run_chat_jobs(make_async_client, jobs)
+    totals = usage_totals(results)
+    print(totals.summary())          # Uso de tokens: 12 peticiones, 19200 de prompt (12288 en caché...)
+    payload["usage"] = totals.as_dict()
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable
+
+
+def _get(obj: Any, name: str) -> Any:
+    """Atributo o clave (las respuestas pueden ser objetos del SDK o dicts de la Batch API)."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+@dataclass
+class UsageTotals:
+    """Tokens consumidos por las peticiones enviadas al modelo en una ejecución."""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        """Fracción de los tokens de prompt servidos desde la caché de prompts del servicio."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def add(self, usage: Any) -> None:
+        """Suma el `usage` de una respuesta (ignora los campos que falten)."""
+        self.requests += 1
+        self.prompt_tokens += _get(usage, "prompt_tokens") or 0
+        self.completion_tokens += _get(usage, "completion_tokens") or 0
+        self.cached_tokens += _get(_get(usage, "prompt_tokens_details"), "cached_tokens") or 0
+
+    def merge(self, other: "UsageTotals") -> None:
+        """Acumula otros totales (p. ej. de una segunda tanda de peticiones)."""
+        self.requests += other.requests
+        self.prompt_tokens += other.prompt_tokens
+        self.cached_tokens += other.cached_tokens
+        self.completion_tokens += other.completion_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), cached_ratio=round(self.cached_ratio, 4))
+
+    def summary(self) -> str:
+        return (f"Uso de tokens: {self.requests} peticiones, {self.prompt_tokens} de prompt "
+                f"({self.cached_tokens} en caché de prompts, {self.cached_ratio:.0%}), "
+                f"{self.completion_tokens} de respuesta")
+
+
+def usage_totals(results: Iterable[Any]) -> UsageTotals:
+    """Suma el `usage` de una lista de ChatResult.
+
+    Solo cuenta las respuestas obtenidas del modelo en esta ejecución: las que vienen de
+    la caché local de respuestas (`ChatResult.cached`) no consumen tokens.
+    """
+    totals = UsageTotals()
+    for r in results:
+        if not r.ok or getattr(r, "cached", False):
+            continue
+        usage = _get(r.response, "usage")
+        if usage is not None:
+            totals.add(usage)
+    return totals
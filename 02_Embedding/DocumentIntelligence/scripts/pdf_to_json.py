@@ -1,16 +1,29 @@
 import os
-import json
+import re
+import sys
 import time
+import bisect
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, List, Callable, Tuple
 
 import requests
+import requests.adapters
 from dotenv import load_dotenv
 
 # Resolve base directory (DocumentIntelligence root) and load .env from there
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env")
 
+# 02_Embedding root, for the shared (optionally compressed) JSON helpers
+sys.path.insert(0, str(BASE_DIR.parent))
+from json_store import dump_json, has_json_suffix  # noqa: E402
+
+# Upload chunk size for streaming the PDF body (1 MiB)
+DEFAULT_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def _resolve_path(path_str: str, base_dir: Path) -> Path:
     """Return absolute path; if relative, resolve from base_dir."""
@@ -18,35 +31,151 @@ def _resolve_path(path_str: str, base_dir: Path) -> Path:
     return p if p.is_absolute() else (base_dir / p).resolve()
 
 
-def analyze_pdf_with_azure(pdf_path: Path, endpoint: str, api_key: str, *, model_id: str, api_version: str,
-                           polling_interval_s: float = 2.0, timeout_s: Optional[float] = 120.0) -> dict:
+# HTTP statuses worth retrying while polling (throttling / transient server errors)
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _create_session(api_key: str, pool_size: int = 10) -> requests.Session:
+    """Return a keep-alive session with the subscription key preset and a sized connection pool."""
+    session = requests.Session()
+    session.headers.update({"Ocp-Apim-Subscription-Key": api_key})
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _retry_after_seconds(headers: Any) -> Optional[float]:
+    """Parse Retry-After (seconds or HTTP date) / retry-after-ms headers. None if absent or invalid."""
+    retry_ms = headers.get("retry-after-ms") or headers.get("x-ms-retry-after-ms")
+    if retry_ms:
+        try:
+            return max(0.0, float(retry_ms) / 1000.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, when.timestamp() - time.time())
+
+
+def _backoff_delay(attempt: int, base_s: float, cap_s: float, retry_after_s: Optional[float] = None) -> float:
+    """Jittered exponential backoff ("full jitter"), capped; a server Retry-After is a lower bound."""
+    delay = random.uniform(0, min(cap_s, base_s * (2 ** attempt)))
+    if retry_after_s is not None:
+        delay = max(delay, min(retry_after_s, cap_s))
+    return delay
+
+
+def _check_poll_payload(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the payload when the operation finished, raise on failure, None while still running."""
+    status = result.get("status")
+    if status == "succeeded":
+        return result
+    if status == "failed":
+        raise Exception(f"Document processing failed: {result.get('error')}")
+    return None
+
+
+def poll_operation(session: requests.Session, operation_location: str, *,
+                   initial_delay_s: float = 1.0, max_delay_s: float = 30.0,
+                   timeout_s: Optional[float] = 120.0) -> dict:
     """
-    Analyze a PDF file using Azure Document Intelligence API.
+    Poll an Azure Document Intelligence operation until it finishes.
 
-    Args:
-        pdf_path: Absolute path to the input PDF file.
-        endpoint: Azure endpoint for the Document Intelligence API.
-        api_key: Azure API key for authentication.
-        model_id: Document Intelligence model to use (e.g., 'prebuilt-layout').
-        api_version: API version string (e.g., '2023-07-31').
-        polling_interval_s: Seconds between status checks.
-        timeout_s: Max seconds to wait before giving up (None for no timeout).
+    Reuses the given session (keep-alive), honours the service's Retry-After header
+    and otherwise waits with jittered exponential backoff capped at max_delay_s.
+    """
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        response = session.get(operation_location)
+        retry_after = _retry_after_seconds(response.headers)
+
+        if response.status_code in _RETRYABLE_STATUS:
+            result = None
+        elif response.status_code != 200:
+            raise Exception(f"Error: {response.status_code}, {response.text}")
+        else:
+            result = _check_poll_payload(response.json())
+            if result is not None:
+                return result
+
+        delay = _backoff_delay(attempt, initial_delay_s, max_delay_s, retry_after)
+        if timeout_s is not None and (time.monotonic() - start) + delay > timeout_s:
+            raise TimeoutError("Timed out waiting for document analysis result.")
+        time.sleep(delay)
+        attempt += 1
 
-    Returns:
-        dict: JSON response from the Azure API.
+
+class _UploadProgressReader:
+    """Iterable over the PDF in `chunk_size` pieces that reports progress after each one.
+
+    requests sends an iterable body by iterating it, so each socket write is one
+    configured chunk and progress is reported per chunk. There is deliberately no
+    read(): http.client would call it with its own 8 KiB blocksize instead.
+    __len__ makes requests send a Content-Length header instead of a chunked body.
     """
-    # Normalize endpoint (strip trailing slash)
-    endpoint = endpoint.rstrip("/")
 
-    headers = {
-        "Ocp-Apim-Subscription-Key": api_key,
-        "Content-Type": "application/pdf",
-    }
+    def __init__(self, fh: Any, total: int, chunk_size: int,
+                 callback: Optional[Callable[[int, int], None]] = None) -> None:
+        self._fh = fh
+        self._total = total
+        self._chunk_size = chunk_size
+        self._callback = callback
+        self._sent = 0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __iter__(self):
+        while True:
+            data = self._fh.read(self._chunk_size)
+            if not data:
+                return
+            self._sent += len(data)
+            if self._callback:
+                self._callback(self._sent, self._total)
+            yield data
+
+
+async def _aiter_upload_chunks(fh: Any, chunk_size: int, on_chunk: Callable[[int], None]) -> AsyncIterator[bytes]:
+    """Async twin of _UploadProgressReader: each read runs in a worker thread, off the event loop."""
+    while True:
+        data = await asyncio.to_thread(fh.read, chunk_size)
+        if not data:
+            return
+        on_chunk(len(data))
+        yield data
+
+
+def print_upload_progress(sent: int, total: int) -> None:
+    """Default progress callback: rewrites a single console line until the upload completes."""
+    if total <= 0:
+        return
+    end = "\n" if sent >= total else "\r"
+    print(f"Uploading PDF… {sent * 100 // total}% ({sent:,}/{total:,} bytes)", end=end, flush=True)
 
+
+def _submit_pdf(session: requests.Session, pdf_path: Path, endpoint: str, *, model_id: str, api_version: str,
+                chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+                progress_callback: Optional[Callable[[int, int], None]] = print_upload_progress) -> str:
+    """Stream the PDF to the analyze endpoint and return the Operation-Location URL to poll."""
+    # Normalize endpoint (strip trailing slash)
+    endpoint = endpoint.rstrip("/")
     analyze_url = f"{endpoint}/formrecognizer/documentModels/{model_id}:analyze?api-version={api_version}"
 
+    total = pdf_path.stat().st_size
     with open(pdf_path, "rb") as pdf_file:
-        response = requests.post(analyze_url, headers=headers, data=pdf_file)
+        body = _UploadProgressReader(pdf_file, total, chunk_size, progress_callback)
+        response = session.post(analyze_url, headers={"Content-Type": "application/pdf"}, data=body)
 
     if response.status_code != 202:
         raise Exception(f"Error: {response.status_code}, {response.text}")
@@ -57,78 +186,349 @@ def analyze_pdf_with_azure(pdf_path: Path, endpoint: str, api_key: str, *, model
     )
     if not operation_location:
         raise Exception(f"Missing Operation-Location header in response: {response.text}")
+    return operation_location
 
-    print("Processing document with Azure Document Intelligence…")
-
-    # Poll for the result
-    start = time.time()
-    while True:
-        result_response = requests.get(operation_location, headers={"Ocp-Apim-Subscription-Key": api_key})
-        result = result_response.json()
 
-        if result_response.status_code != 200:
-            raise Exception(f"Error: {result_response.status_code}, {result_response.text}")
+def analyze_pdf_with_azure(pdf_path: Path, endpoint: str, api_key: str, *, model_id: str, api_version: str,
+                           polling_interval_s: float = 1.0, max_polling_interval_s: float = 30.0,
+                           timeout_s: Optional[float] = 120.0,
+                           session: Optional[requests.Session] = None,
+                           upload_chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+                           progress_callback: Optional[Callable[[int, int], None]] = print_upload_progress) -> dict:
+    """
+    Analyze a PDF file using Azure Document Intelligence API.
 
-        status = result.get("status")
-        if status == "succeeded":
-            return result
-        elif status == "failed":
-            raise Exception("Document processing failed.")
+    Args:
+        pdf_path: Absolute path to the input PDF file.
+        endpoint: Azure endpoint for the Document Intelligence API.
+        api_key: Azure API key for authentication.
+        model_id: Document Intelligence model to use (e.g., 'prebuilt-layout').
+        api_version: API version string (e.g., '2023-07-31').
+        polling_interval_s: Initial backoff between status checks (grows exponentially with jitter).
+        max_polling_interval_s: Upper bound for the backoff between status checks.
+        timeout_s: Max seconds to wait before giving up (None for no timeout).
+        session: Optional shared requests.Session; one with keep-alive is created if omitted.
+        upload_chunk_size: Bytes read per chunk while streaming the PDF upload.
+        progress_callback: Called as (bytes_sent, total_bytes) during the upload; None to disable.
 
-        if timeout_s is not None and (time.time() - start) > timeout_s:
+    Returns:
+        dict: JSON response from the Azure API.
+    """
+    own_session = session is None
+    session = session or _create_session(api_key)
+    try:
+        operation_location = _submit_pdf(session, pdf_path, endpoint, model_id=model_id, api_version=api_version,
+                                         chunk_size=upload_chunk_size, progress_callback=progress_callback)
+        print("Processing document with Azure Document Intelligence…")
+        return poll_operation(
+            session,
+            operation_location,
+            initial_delay_s=polling_interval_s,
+            max_delay_s=max_polling_interval_s,
+            timeout_s=timeout_s,
+        )
+    finally:
+        if own_session:
+            session.close()
+
+
+async def poll_operation_async(session: Any, operation_location: str, *,
+                               initial_delay_s: float = 1.0, max_delay_s: float = 30.0,
+                               timeout_s: Optional[float] = 120.0) -> dict:
+    """Async twin of poll_operation for an aiohttp.ClientSession (subscription key set on the session)."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    attempt = 0
+    while True:
+        async with session.get(operation_location) as response:
+            retry_after = _retry_after_seconds(response.headers)
+            if response.status in _RETRYABLE_STATUS:
+                result = None
+            elif response.status != 200:
+                raise Exception(f"Error: {response.status}, {await response.text()}")
+            else:
+                result = _check_poll_payload(await response.json())
+                if result is not None:
+                    return result
+
+        delay = _backoff_delay(attempt, initial_delay_s, max_delay_s, retry_after)
+        if timeout_s is not None and (loop.time() - start) + delay > timeout_s:
             raise TimeoutError("Timed out waiting for document analysis result.")
+        await asyncio.sleep(delay)
+        attempt += 1
 
-        time.sleep(polling_interval_s)
 
+async def analyze_pdfs_with_azure_async(pdf_paths: List[Path], endpoint: str, api_key: str, *, model_id: str,
+                                        api_version: str, max_concurrency: int = 8,
+                                        polling_interval_s: float = 1.0, max_polling_interval_s: float = 30.0,
+                                        timeout_s: Optional[float] = 600.0,
+                                        upload_chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+                                        progress_callback: Optional[Callable[[int, int], None]] = print_upload_progress
+                                        ) -> List[Any]:
+    """
+    Analyze many PDFs concurrently on a single event loop (requires `aiohttp`).
 
-def simplify_layout_result(result: Dict[str, Any]) -> Dict[str, Any]:
-    """Simplify Azure DI layout result to { pages: [{page_number, text}] }.
+    Each PDF is streamed in `upload_chunk_size` pieces read in a worker thread, so file
+    I/O never blocks the loop. `progress_callback(bytes_sent, total_bytes)` reports the
+    combined upload of all PDFs; None disables it.
 
-    Tries paragraphs by page, then lines by page, then falls back to global content.
+    Returns one entry per input path, in order: the analyze result dict, or the
+    exception raised for that document.
     """
-    pages_output: List[Dict[str, Any]] = []
+    try:
+        import aiohttp  # optional dependency, only needed for the async variant
+    except ImportError:
+        print("The async variant needs aiohttp: pip install aiohttp")
+        raise
+
+    endpoint = endpoint.rstrip("/")
+    analyze_url = f"{endpoint}/formrecognizer/documentModels/{model_id}:analyze?api-version={api_version}"
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+
+    # Combined upload progress; a missing file counts as 0 bytes and fails in its own task
+    total = sum(pdf_path.stat().st_size for pdf_path in pdf_paths if pdf_path.is_file())
+    progress = {"sent": 0, "total": total}
+
+    def on_chunk(size: int) -> None:
+        progress["sent"] += size
+        if progress_callback:
+            progress_callback(progress["sent"], progress["total"])
+
+    async with aiohttp.ClientSession(connector=connector,
+                                     headers={"Ocp-Apim-Subscription-Key": api_key}) as session:
+
+        async def _one(pdf_path: Path) -> dict:
+            async with semaphore:
+                pdf_file = await asyncio.to_thread(open, pdf_path, "rb")
+                try:
+                    body = _aiter_upload_chunks(pdf_file, upload_chunk_size, on_chunk)
+                    # Explicit Content-Length so aiohttp does not switch to a chunked body
+                    headers = {"Content-Type": "application/pdf",
+                               "Content-Length": str(os.fstat(pdf_file.fileno()).st_size)}
+                    async with session.post(analyze_url, data=body, headers=headers) as response:
+                        if response.status != 202:
+                            raise Exception(f"Error: {response.status}, {await response.text()}")
+                        operation_location = response.headers.get("Operation-Location")
+                        if not operation_location:
+                            raise Exception(f"Missing Operation-Location header in response: {await response.text()}")
+                finally:
+                    pdf_file.close()
+            # Polling only waits on the service, so it does not hold a concurrency slot
+            return await poll_operation_async(
+                session,
+                operation_location,
+                initial_delay_s=polling_interval_s,
+                max_delay_s=max_polling_interval_s,
+                timeout_s=timeout_s,
+            )
+
+        return await asyncio.gather(*(_one(p) for p in pdf_paths), return_exceptions=True)
+
+
+# Paragraph roles emitted by the layout model that mark headings, and their base level
+_HEADING_ROLES = {"title": 1, "sectionHeading": 2}
+_NUMBERED_HEADING = re.compile(r"^\s*(\d+(?:\.\d+)*)[.)]?\s")
+
+
+def _span_range(item: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Return (start, end) covering all spans of a DI element, or None if it has no spans."""
+    spans = item.get("spans") or []
+    if not spans:
+        return None
+    start = min(int(sp.get("offset", 0)) for sp in spans)
+    end = max(int(sp.get("offset", 0)) + int(sp.get("length", 0)) for sp in spans)
+    return start, end
+
+
+def _region_page(item: Dict[str, Any]) -> Optional[int]:
+    """First page number found in boundingRegions, or None."""
+    for br in item.get("boundingRegions", []) or []:
+        pn = br.get("pageNumber") or br.get("page_number")
+        if pn is not None:
+            return int(pn)
+    return None
+
+
+def _heading_level(role: Optional[str], content: str) -> Optional[int]:
+    """title -> 1, sectionHeading -> 2 (+1 per extra numbering component, e.g. '1.2 ...' -> 3)."""
+    base = _HEADING_ROLES.get(role or "")
+    if base is None:
+        return None
+    match = _NUMBERED_HEADING.match(content)
+    if role == "sectionHeading" and match:
+        return base + match.group(1).count(".")
+    return base
+
+
+def _simplify_from_spans(analyze_result: Dict[str, Any], content: str) -> Optional[Dict[str, Any]]:
+    """Single pass over pages/tables/paragraphs using span offsets into analyzeResult.content.
+
+    Pages carry only (offset, length) into the shared `content` string, so each page's
+    text is stored once; callers slice it (02_Embedding/di_pages.py), whole ranges of
+    pages at once instead of splitting and re-joining text.
+    Returns None when pages have no spans (older/partial payloads).
+    """
+    pages_in = analyze_result.get("pages") or []
+    page_ranges: List[Tuple[int, int, int]] = []  # (start, end, page_number)
+    for page in pages_in:
+        rng = _span_range(page)
+        if rng is None:
+            return None
+        pn = page.get("pageNumber") or page.get("page_number") or (len(page_ranges) + 1)
+        page_ranges.append((rng[0], rng[1], int(pn)))
+    if not page_ranges:
+        return None
+    page_ranges.sort()
+    page_starts = [r[0] for r in page_ranges]
+
+    def page_index_for(offset: int, hint: int) -> int:
+        # Elements come in reading order, so the current page is almost always the hint
+        # or the next one; fall back to binary search when order jumps backwards.
+        if page_starts[hint] <= offset and (hint + 1 == len(page_starts) or offset < page_starts[hint + 1]):
+            return hint
+        if hint + 1 < len(page_starts) and page_starts[hint + 1] <= offset and (
+                hint + 2 == len(page_starts) or offset < page_starts[hint + 2]):
+            return hint + 1
+        return max(0, bisect.bisect_right(page_starts, offset) - 1)
+
+    pages_out: List[Dict[str, Any]] = [
+        {
+            "page_number": pn,
+            "offset": start,
+            "length": end - start,
+            "paragraphs": [],
+        }
+        for start, end, pn in page_ranges
+    ]
+    index_by_number = {p["page_number"]: i for i, p in enumerate(pages_out)}
+
+    tables_out: List[Dict[str, Any]] = []
+    hint = 0
+    for t_idx, table in enumerate(analyze_result.get("tables") or []):
+        rng = _span_range(table)
+        if rng is None:
+            continue
+        hint = page_index_for(rng[0], hint)
+        tables_out.append({
+            "index": t_idx,
+            "page_number": pages_out[hint]["page_number"],
+            "offset": rng[0],
+            "length": rng[1] - rng[0],
+            "row_count": table.get("rowCount"),
+            "column_count": table.get("columnCount"),
+        })
+    table_ranges = sorted((t["offset"], t["offset"] + t["length"], t["index"]) for t in tables_out)
+
+    unassigned: List[Dict[str, Any]] = []
+    hint = 0
+    t_ptr = 0
+    for para in analyze_result.get("paragraphs") or []:
+        role = para.get("role")
+        text = para.get("content") or ""
+        rng = _span_range(para)
+        entry: Dict[str, Any] = {
+            "offset": rng[0] if rng else None,
+            "length": (rng[1] - rng[0]) if rng else len(text),
+            "role": role,
+            "heading_level": _heading_level(role, text),
+            "table": None,
+        }
+        if entry["heading_level"] is not None:
+            # Headings are short; keeping their text saves a lookup when matching titles
+            entry["text"] = text
+
+        if rng is None:
+            entry["text"] = text  # no offset into content, keep the text itself
+            pn = _region_page(para)
+            if pn is None or pn not in index_by_number:
+                unassigned.append(entry)
+            else:
+                pages_out[index_by_number[pn]]["paragraphs"].append(entry)
+            continue
+
+        start = rng[0]
+        hint = page_index_for(start, hint)
+        # Advance the table pointer monotonically; rewind only if paragraphs go backwards
+        if t_ptr and table_ranges[t_ptr - 1][1] > start:
+            t_ptr = 0
+        while t_ptr < len(table_ranges) and table_ranges[t_ptr][1] <= start:
+            t_ptr += 1
+        if t_ptr < len(table_ranges) and table_ranges[t_ptr][0] <= start < table_ranges[t_ptr][1]:
+            entry["table"] = table_ranges[t_ptr][2]
+        pages_out[hint]["paragraphs"].append(entry)
+
+    simplified: Dict[str, Any] = {"content": content, "pages": pages_out, "tables": tables_out}
+    if unassigned:
+        simplified["unassigned_paragraphs"] = unassigned
+    return simplified
+
 
+def simplify_layout_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Simplify Azure DI layout result to a page model.
+
+    With span information (normal prebuilt-layout output) it returns:
+        {
+          "content": <analyzeResult.content>,
+          "pages": [{page_number, offset, length, paragraphs: [{offset, length, role, heading_level, table}]}],
+          "tables": [{index, page_number, offset, length, row_count, column_count}],
+          "unassigned_paragraphs": [...]   # only if some paragraph has no page
+        }
+    `offset`/`length` index into `content` (page text is not repeated per page), so a page
+    or a run of consecutive pages is a single slice.
+
+    Without spans it falls back to paragraphs by page, then lines by page, then global
+    content, always as { pages: [{page_number, text}] }.
+    """
     analyze_result = result.get("analyzeResult") or result.get("analyze_result") or {}
+    content = analyze_result.get("content") or ""
 
-    # 1) Prefer paragraphs grouped by page
+    # 1) Spans into the global content: one pass, keeps roles/tables/offsets
+    if content:
+        simplified = _simplify_from_spans(analyze_result, content)
+        if simplified is not None:
+            return simplified
+
+    pages_output: List[Dict[str, Any]] = []
+
+    # 2) Paragraphs grouped by page (paragraphs without a page are not forced onto page 1)
     paragraphs = analyze_result.get("paragraphs") or []
     if paragraphs:
         by_page: Dict[int, List[str]] = {}
+        unassigned: List[str] = []
         for p in paragraphs:
-            content = p.get("content") or ""
-            # Determine page number from boundingRegions (if present)
-            page_num = None
-            for br in p.get("boundingRegions", []) or []:
-                pn = br.get("pageNumber") or br.get("page_number")
-                if pn is not None:
-                    page_num = pn
-                    break
-            # Fallback page number as 1 if unknown
-            page_num = int(page_num) if page_num is not None else 1
-            by_page.setdefault(page_num, []).append(content)
+            text = p.get("content") or ""
+            page_num = _region_page(p)
+            if page_num is None:
+                unassigned.append(text)
+            else:
+                by_page.setdefault(page_num, []).append(text)
 
         for pn in sorted(by_page.keys()):
             text = "\n".join([t for t in by_page[pn] if t])
             pages_output.append({"page_number": pn, "text": text})
-        return {"pages": pages_output}
+        simplified = {"pages": pages_output}
+        if unassigned:
+            simplified["unassigned_paragraphs"] = [{"text": t} for t in unassigned if t]
+        return simplified
 
-    # 2) Next, use lines per page
+    # 3) Next, use lines per page
     pages = analyze_result.get("pages") or []
     if pages:
-        for page in pages:
-            pn = page.get("pageNumber") or page.get("page_number") or 1
+        for idx, page in enumerate(pages, 1):
+            pn = page.get("pageNumber") or page.get("page_number") or idx
             lines = page.get("lines") or []
             text = "\n".join([ln.get("content") or "" for ln in lines if ln.get("content")])
             pages_output.append({"page_number": int(pn), "text": text})
         return {"pages": pages_output}
 
-    # 3) Fallback: full content
-    full_content = analyze_result.get("content") or result.get("content")
+    # 4) Fallback: full content
+    full_content = content or result.get("content")
     if full_content:
         pages_output.append({"page_number": 1, "text": str(full_content)})
         return {"pages": pages_output}
 
-    # 4) Last resort: return empty structure
+    # 5) Last resort: return empty structure
     return {"pages": []}
 
 if __name__ == "__main__":
@@ -153,8 +553,8 @@ if __name__ == "__main__":
     # Resolve paths
     pdf_path = _resolve_path(pdf_path_env, BASE_DIR)
     json_path = _resolve_path(json_path_env, BASE_DIR)
-    # Ensure we are not writing JSON to a .pdf by mistake
-    if json_path.suffix.lower() != ".json":
+    # Ensure we are not writing JSON to a .pdf by mistake (.json, .json.gz and .json.zst are accepted)
+    if not has_json_suffix(json_path):
         suggested = json_path.with_suffix(".json")
         print(f"Warning: JSON_OUTPUT_PATH does not end with .json. Using: {suggested}")
         json_path = suggested
@@ -176,18 +576,19 @@ if __name__ == "__main__":
             api_version=api_version,
         )
 
-        # Optionally write raw result
+        # Optionally write raw result as compressed compact JSON (it is much larger than the PDF)
         if raw_json_path_env:
             raw_path = _resolve_path(raw_json_path_env, BASE_DIR)
+            if raw_path.name.lower().endswith(".json"):
+                raw_path = raw_path.with_name(raw_path.name + ".gz")
+                print(f"Note: raw output is stored compressed. Using: {raw_path}")
             raw_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(raw_path, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            dump_json(result, raw_path, compact=True)
             print(f"Raw DI JSON written to: {raw_path}")
 
-        # Always write simplified text output
+        # Always write simplified text output (compact when compressed)
         simplified = simplify_layout_result(result)
-        with open(json_path, "w", encoding="utf-8") as json_file:
-            json.dump(simplified, json_file, ensure_ascii=False, indent=2)
+        dump_json(simplified, json_path, compact=json_path.suffix.lower() != ".json")
 
         print(f"Simplified text JSON written to: {json_path}")
     except Exception as e:
@@ -0,0 +1,33 @@
+# Texto de las páginas del JSON simplificado de Document Intelligence (output.json).
+#
+# pdf_to_json.py guarda el texto del documento una sola vez, en `content`, y cada página
+# solo lleva su rango (`offset`/`length`) dentro de él. Los JSON sin spans (o generados por
+# versiones anteriores) traen en cambio `text` en cada página. Estas funciones aceptan los
+# dos formatos; las usan los scripts de secciones (01, 02, 02b, 03).
+
+from typing import Any, Dict, List
+
+
+def page_text(page: Dict[str, Any], content: str = "") -> str:
+    """Texto de una página: su rango de `content` si lo tiene; si no, su campo `text`."""
+    if content and page.get("offset") is not None:
+        return content[page["offset"]:page["offset"] + page["length"]]
+    return page.get("text") or ""
+
+
+def pages_text(pages: List[Dict[str, Any]], start: int, end: int, content: str = "") -> str:
+    """Texto de las páginas [start, end). Con offsets se corta de una vez sobre `content`
+    en vez de unir el texto página a página.
+    """
+    if end <= start:
+        return ""
+    first, last = pages[start], pages[end - 1]
+    if content and first.get("offset") is not None and last.get("offset") is not None:
+        return content[first["offset"]:last["offset"] + last["length"]]
+    return "\n".join(page_text(pages[j], content) for j in range(start, end))
+
+
+def page_texts(data: Dict[str, Any]) -> List[str]:
+    """Texto de cada página del JSON simplificado, en orden."""
+    content = data.get("content") or ""
+    return [page_text(page, content) for page in data.get("pages") or []]
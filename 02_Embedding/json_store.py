@@ -0,0 +1,70 @@
+# Lectura/escritura de JSON con compresión transparente según la extensión del fichero.
+#
+# - "*.json"      -> texto plano
+# - "*.json.gz"   -> gzip (librería estándar)
+# - "*.json.zst"  -> zstandard (requiere `pip install zstandard`)
+#
+# Lo usan DocumentIntelligence/scripts/pdf_to_json.py para escribir y los scripts
+# de secciones (01, 02, 02b, 03) para leer, de modo que da igual qué formato elijas.
+
+import io
+import gzip
+import json
+from pathlib import Path
+from typing import Any, IO
+
+JSON_SUFFIXES = (".json", ".json.gz", ".json.zst")
+
+
+def _compression(path: Path) -> str:
+    name = path.name.lower()
+    if name.endswith(".gz"):
+        return "gzip"
+    if name.endswith(".zst"):
+        return "zstd"
+    return ""
+
+
+def _zstandard():
+    try:
+        import zstandard  # dependencia opcional, solo para .zst
+    except ImportError:
+        print("[ERROR] Para leer/escribir .zst instala zstandard (pip install zstandard) o usa .json.gz")
+        raise
+    return zstandard
+
+
+def has_json_suffix(path: Path) -> bool:
+    """True si la ruta termina en .json, .json.gz o .json.zst."""
+    return path.name.lower().endswith(JSON_SUFFIXES)
+
+
+def open_text(path: Path, mode: str = "r") -> IO[str]:
+    """Abre un fichero de texto UTF-8 ('r' o 'w'), descomprimiendo/comprimiendo según la extensión."""
+    path = Path(path)
+    kind = _compression(path)
+    if kind == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if kind == "zstd":
+        zstd = _zstandard()
+        if mode == "r":
+            stream = zstd.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            stream = zstd.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_json(path: Path) -> Any:
+    """Carga un JSON plano o comprimido (.gz/.zst)."""
+    with open_text(path, "r") as f:
+        return json.load(f)
+
+
+def dump_json(obj: Any, path: Path, *, compact: bool = False) -> None:
+    """Escribe obj como JSON. compact=True elimina indentación y espacios (recomendado si se comprime)."""
+    with open_text(path, "w") as f:
+        if compact:
+            json.dump(obj, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
@@ -1,10 +1,16 @@
 import os
 import re
+import sys
 import json
 from pathlib import Path
 from typing import List, Set
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from di_pages import page_texts
+from json_store import load_json
+
 DEFAULT_JSON = BASE_DIR / "DocumentIntelligence" / "data" / "output.json"
 
 SOURCE_JSON = Path(os.getenv("EMBEDDING_SOURCE_JSON", str(DEFAULT_JSON)))
@@ -56,12 +62,10 @@ def main() -> None:
         print("Asegúrate de ejecutar primero DocumentIntelligence para generar output.json.")
         return
 
-    data = json.loads(SOURCE_JSON.read_text(encoding="utf-8"))
-    pages = data.get("pages") or []
+    data = load_json(SOURCE_JSON)
 
     lines: List[str] = []
-    for p in pages:
-        txt = p.get("text") or ""
+    for txt in page_texts(data):
         lines.extend(txt.splitlines())
 
     candidates = collect_candidates(lines)
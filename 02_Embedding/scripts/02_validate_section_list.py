@@ -1,6 +1,5 @@
 import os
 import sys
-import json
 import difflib
 from pathlib import Path
 from typing import List
@@ -14,6 +13,9 @@ except Exception as e:
     print(f"No se pudo importar section_list desde config.py: {e}")
     sys.exit(1)
 
+from di_pages import page_texts
+from json_store import load_json
+
 SOURCE_JSON = Path(os.getenv("EMBEDDING_SOURCE_JSON", str(BASE_DIR / "DocumentIntelligence" / "data" / "output.json")))
 
 
@@ -23,11 +25,11 @@ def main() -> None:
         print("Asegúrate de ejecutar primero DocumentIntelligence para generar output.json.")
         sys.exit(1)
 
-    data = json.loads(SOURCE_JSON.read_text(encoding="utf-8"))
-    pages = data.get("pages") or []
+    data = load_json(SOURCE_JSON)
+    texts = page_texts(data)
 
     # Construye un 'haystack' con todo el texto
-    full_text = "\n".join([p.get("text") or "" for p in pages])
+    full_text = "\n".join(texts)
 
     if not section_list:
         print("section_list está vacío en config.py. Añade 3 títulos exactos de capítulo.")
@@ -36,8 +38,8 @@ def main() -> None:
     # Genera lista de líneas únicas para sugerencias
     unique_lines: List[str] = []
     seen = set()
-    for p in pages:
-        for ln in (p.get("text") or "").splitlines():
+    for text in texts:
+        for ln in text.splitlines():
             s = ln.strip()
             if s and s not in seen:
                 seen.add(s)
@@ -1,9 +1,14 @@
 import os
-import json
+import sys
 from pathlib import Path
-from config import section_list
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from config import section_list
+from di_pages import page_texts
+from json_store import load_json
+
 # Permite override por variable de entorno para mantener consistencia con el resto de scripts
 SOURCE_JSON = Path(os.getenv(
     "EMBEDDING_SOURCE_JSON",
@@ -17,15 +22,14 @@ def is_toc_page(text: str) -> bool:
 
 
 def run():
-    data = json.loads(SOURCE_JSON.read_text(encoding="utf-8"))
-    pages = data.get("pages") or []
+    data = load_json(SOURCE_JSON)
+    texts = page_texts(data)
 
     for title in section_list:
         t = title.strip()
         found_any = []
         print(f"\n== Title: {t}")
-        for idx, page in enumerate(pages):
-            text = page.get("text") or ""
+        for idx, text in enumerate(texts):
             for line in text.splitlines():
                 if line.strip() == t:
                     found_any.append((idx, is_toc_page(text), line))
@@ -34,7 +38,7 @@ def run():
             print("No matches found in any page.")
         else:
             for idx, is_toc, line in found_any:
-                preview = (pages[idx].get("text") or "").splitlines()[0:5]
+                preview = texts[idx].splitlines()[0:5]
                 print(f"- Page {idx+1} (toc={is_toc}) line='{line}' | first lines: {preview}")
 
 
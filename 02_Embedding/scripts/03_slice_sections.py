@@ -13,6 +13,9 @@ except Exception as e:
     print(f"No se pudo importar section_list desde config.py: {e}")
     sys.exit(1)
 
+from di_pages import page_text, pages_text
+from json_store import load_json
+
 SOURCE_JSON = Path(os.getenv("EMBEDDING_SOURCE_JSON", str(BASE_DIR / "DocumentIntelligence" / "data" / "output.json")))
 SECTIONS_JSONL = Path(os.getenv("SECTIONS_JSONL_PATH", str(BASE_DIR / "data" / "sections" / "sections.jsonl")))
 
@@ -29,14 +32,32 @@ def _is_toc_page(text: str) -> bool:
     return any(h in lowered for h in toc_hints)
 
 
-def _find_title_first_page(title: str, pages: List[dict]) -> int:
+def _find_heading_page(title: str, pages: List[dict], content: str = "") -> int:
+    """Busca el título entre los párrafos marcados como encabezado (title/sectionHeading)
+    por Document Intelligence. Devuelve el índice de página (0-based) o -1.
+    """
+    t = title.strip()
+    for idx, page in enumerate(pages):
+        for para in page.get("paragraphs") or []:
+            if para.get("heading_level") is not None and (para.get("text") or "").strip() == t:
+                if not _is_toc_page(page_text(page, content)):
+                    return idx
+    return -1
+
+
+def _find_title_first_page(title: str, pages: List[dict], content: str = "") -> int:
     """Devuelve el índice de página (0-based) donde aparece el título, o -1 si no aparece.
-    Se busca coincidencia exacta por línea (con strip()). Evita páginas de índice (ToC).
+    Primero usa los encabezados detectados por el modelo de layout (si el JSON los trae);
+    si no, busca coincidencia exacta por línea (con strip()). Evita páginas de índice (ToC).
     """
+    heading_idx = _find_heading_page(title, pages, content)
+    if heading_idx != -1:
+        return heading_idx
+
     t = title.strip()
     first_anywhere = -1
     for idx, page in enumerate(pages):
-        text = page.get("text") or ""
+        text = page_text(page, content)
         for line in text.splitlines():
             if line.strip() == t:
                 # Guarda la primera coincidencia global por si todas están en ToC
@@ -50,11 +71,11 @@ def _find_title_first_page(title: str, pages: List[dict]) -> int:
     return first_anywhere
 
 
-def _slice_by_titles(pages: List[dict], titles_in_order: List[str]) -> List[dict]:
+def _slice_by_titles(pages: List[dict], titles_in_order: List[str], content: str = "") -> List[dict]:
     # Encuentra página de inicio para cada título
     starts: List[int] = []
     for t in titles_in_order:
-        pidx = _find_title_first_page(t, pages)
+        pidx = _find_title_first_page(t, pages, content)
         starts.append(pidx)
 
     # Empaqueta secciones; si un título no aparece, crea sección vacía
@@ -72,7 +93,7 @@ def _slice_by_titles(pages: List[dict], titles_in_order: List[str]) -> List[dict
 
         if start == -1:
             # No encontrado
-            content = ""
+            section_text = ""
             start_page = None
             end_page = None
             warning = f"[WARN] Título no encontrado en el documento: {t}"
@@ -82,7 +103,7 @@ def _slice_by_titles(pages: List[dict], titles_in_order: List[str]) -> List[dict
             if end == -1:
                 end = last_page_idx
             # Concatena texto de páginas [start, end)
-            content = "\n".join((pages[j].get("text") or "") for j in range(start, max(start, end)))
+            section_text = pages_text(pages, start, max(start, end), content)
             start_page = start + 1  # 1-based para humanos
             end_page = max(start, end)  # exclusive index -> mostrar como índice 1-based del final real
 
@@ -90,7 +111,7 @@ def _slice_by_titles(pages: List[dict], titles_in_order: List[str]) -> List[dict
             "title": t,
             "start_page": start_page,
             "end_page": end_page,
-            "content": content,
+            "content": section_text,
         })
     return sections
 
@@ -105,10 +126,10 @@ def main() -> None:
         print("config.section_list debe contener exactamente 3 títulos (Paso 2).")
         sys.exit(1)
 
-    data = json.loads(SOURCE_JSON.read_text(encoding="utf-8"))
+    data = load_json(SOURCE_JSON)
     pages = data.get("pages") or []
 
-    sections = _slice_by_titles(pages, section_list)
+    sections = _slice_by_titles(pages, section_list, data.get("content") or "")
 
     SECTIONS_JSONL.parent.mkdir(parents=True, exist_ok=True)
     with SECTIONS_JSONL.open("w", encoding="utf-8") as f:
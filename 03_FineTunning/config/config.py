@@ -32,6 +32,14 @@ class Config:
     # Deployment del modelo fine-tuned
     FINE_TUNED_MODEL_DEPLOYMENT: str = os.getenv("FINE_TUNED_MODEL_DEPLOYMENT", "")
     
+    # Deployment de embeddings (cascada kNN del Paso 9)
+    EMBEDDING_DEPLOYMENT: str = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+    KNN_K: int = int(os.getenv("KNN_K", 5))
+    KNN_MARGIN_THRESHOLD: float = float(os.getenv("KNN_MARGIN_THRESHOLD", 0.5))
+
+    # Peticiones simultáneas al evaluar el modelo (Paso 7)
+    TEST_CONCURRENCY: int = int(os.getenv("TEST_CONCURRENCY", 8))
+    
     # Rutas de archivos (absolutas basadas en el directorio del proyecto)
     PROJECT_ROOT: Path = PROJECT_ROOT
     RAW_DATA_PATH: Path = PROJECT_ROOT / "data" / "raw"
@@ -40,13 +48,6 @@ class Config:
     VALIDATION_DATA_PATH: Path = PROJECT_ROOT / "data" / "validation"
     RESULTS_PATH: Path = PROJECT_ROOT / "results"
     LOGS_PATH: Path = PROJECT_ROOT / "logs"
-
-    # Asegurar que las carpetas existan
-    for p in [RAW_DATA_PATH, PROCESSED_DATA_PATH, TRAINING_DATA_PATH, VALIDATION_DATA_PATH, RESULTS_PATH, LOGS_PATH]:
-        try:
-            p.mkdir(parents=True, exist_ok=True)
-        except Exception:
-            pass
     
     # Parámetros de fine-tuning
     FINE_TUNING_PARAMS: Dict[str, Any] = {
@@ -56,6 +57,11 @@ class Config:
         "prompt_loss_weight": float(os.getenv("FINE_TUNING_PROMPT_LOSS_WEIGHT", 0.01))
     }
     
+    # Tokens máximos por ejemplo de entrenamiento (0 = el límite del modelo base, ver utils/tokens.py)
+    FINE_TUNING_MAX_TOKENS: int = int(os.getenv("FINE_TUNING_MAX_TOKENS", 0))
+    # Precio por millón de tokens de entrenamiento para estimar el coste (0 = no estimar)
+    FINE_TUNING_PRICE_PER_1M_TOKENS: float = float(os.getenv("FINE_TUNING_PRICE_PER_1M_TOKENS", 0))
+    
     # Intenciones de clasificación
     INTENT_CATEGORIES = [
         "comprar",
@@ -68,6 +74,20 @@ class Config:
     TRAIN_SPLIT: float = float(os.getenv("TRAIN_SPLIT", 0.8))
     VALIDATION_SPLIT: float = float(os.getenv("VALIDATION_SPLIT", 0.2))
 
+    @classmethod
+    def ensure_directories(cls) -> None:
+        """Crea las carpetas de datos, resultados y logs si no existen.
+
+        Se llama desde el main() de cada paso (no al importar la configuración), así que
+        importar Config para leer un parámetro no toca el sistema de ficheros.
+        """
+        for p in [cls.RAW_DATA_PATH, cls.PROCESSED_DATA_PATH, cls.TRAINING_DATA_PATH,
+                  cls.VALIDATION_DATA_PATH, cls.RESULTS_PATH, cls.LOGS_PATH]:
+            try:
+                p.mkdir(parents=True, exist_ok=True)
+            except Exception:
+                pass
+
     @classmethod
     def validate_config(cls) -> bool:
         """Valida que la configuración esté completa"""
@@ -96,6 +96,7 @@ def main():
     """Función principal para ejecutar el Paso 1"""
     
     print("=== PASO 1: Crear archivo JSON con ejemplos ===")
+    Config.ensure_directories()
     
     # Crear ejemplos
     examples = create_intent_examples()
@@ -13,21 +13,12 @@ project_root = os.path.dirname(script_dir)
 sys.path.insert(0, project_root)
 
 from config.config import Config
+from utils.prompts import SYSTEM_PROMPT
 
 def create_system_prompt() -> str:
-    """Crea el prompt del sistema para clasificación de intenciones"""
+    """Crea el prompt del sistema para clasificación de intenciones (el mismo que usa el Paso 7)"""
     
-    system_prompt = """Eres un asistente especializado en clasificar las intenciones de los clientes en una tienda de ropa.
-
-Tu tarea es clasificar cada mensaje del usuario en una de las siguientes categorías:
-- comprar: El usuario quiere adquirir un producto
-- devolver: El usuario quiere devolver o cambiar un producto
-- queja: El usuario tiene una queja o reclamación
-- consulta: El usuario hace preguntas informativas
-
-Responde únicamente con el nombre de la categoría (comprar, devolver, queja, consulta)."""
-
-    return system_prompt
+    return SYSTEM_PROMPT
 
 def create_training_prompts(examples: Dict[str, List[str]]) -> List[Dict]:
     """
@@ -107,6 +98,7 @@ def main():
     """Función principal para ejecutar el Paso 2"""
     
     print("=== PASO 2: Crear y verificar prompts ===")
+    Config.ensure_directories()
     
     # Cargar ejemplos del paso anterior
     examples_path = os.path.join(Config.RAW_DATA_PATH, "intent_examples.json")
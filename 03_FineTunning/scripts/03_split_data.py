@@ -123,6 +123,7 @@ def main():
     """Función principal para ejecutar el Paso 3"""
     
     print("=== PASO 3: Dividir los datos ===")
+    Config.ensure_directories()
     
     # Cargar prompts del paso anterior
     prompts_path = os.path.join(Config.PROCESSED_DATA_PATH, "training_prompts.jsonl")
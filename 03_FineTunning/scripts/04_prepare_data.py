@@ -2,10 +2,11 @@
 Paso 4: Preparar los datos para fine-tuning
 """
 
+import argparse
 import json
 import os
 import sys
-from typing import List, Dict
+from typing import Dict, Optional
 
 # Agregar el directorio padre al path para imports
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,82 +14,114 @@ project_root = os.path.dirname(script_dir)
 sys.path.insert(0, project_root)
 
 from config.config import Config
+from utils.jsonl_validation import ValidationReport, validate_jsonl_file
+from utils.tokens import TokenCounter, count_file_tokens, save_calibration, training_cost
 
-def validate_training_format(data: List[Dict]) -> bool:
+# Factor de calibración de la estimación de tokens (se actualiza al contar con tiktoken)
+CALIBRATION_PATH = Config.PROCESSED_DATA_PATH / "token_calibration.json"
+
+# Errores que se muestran por pantalla (todos se guardan en data/processed/<fichero>_errors.jsonl)
+MAX_PRINTED_ERRORS = 10
+
+def validate_file(path: str, reference: Optional[ValidationReport] = None,
+                  workers: Optional[int] = None, check_labels: bool = False) -> ValidationReport:
     """
-    Valida que los datos estén en el formato correcto para fine-tuning de OpenAI
+    Valida un JSONL de fine-tuning en una pasada y en paralelo: recoge todos los errores
+    (con su línea) en lugar de parar en el primero, y calcula las estadísticas del fichero.
+    Con `check_labels`, la respuesta del assistant debe ser una de Config.INTENT_CATEGORIES
     """
     
-    print("🔍 Validando formato de datos para fine-tuning...")
-    
-    for i, item in enumerate(data):
-        # Verificar estructura básica
-        if "messages" not in item:
-            print(f"❌ Item {i+1}: Falta campo 'messages'")
-            return False
-        
-        messages = item["messages"]
-        
-        # Verificar número de mensajes
-        if len(messages) < 2:
-            print(f"❌ Item {i+1}: Debe tener al menos 2 mensajes (user y assistant)")
-            return False
-        
-        # Verificar roles
-        valid_roles = {"system", "user", "assistant"}
-        for j, msg in enumerate(messages):
-            if "role" not in msg or msg["role"] not in valid_roles:
-                print(f"❌ Item {i+1}, Mensaje {j+1}: Rol inválido")
-                return False
-            
-            if "content" not in msg or not msg["content"].strip():
-                print(f"❌ Item {i+1}, Mensaje {j+1}: Contenido vacío")
-                return False
-        
-        # Verificar que termine con assistant
-        if messages[-1]["role"] != "assistant":
-            print(f"❌ Item {i+1}: Debe terminar con un mensaje del assistant")
-            return False
-    
-    print(f"✅ Formato válido para {len(data)} ejemplos")
-    return True
+    name = os.path.splitext(os.path.basename(path))[0]
+    errors_path = os.path.join(Config.PROCESSED_DATA_PATH, f"{name}_errors.jsonl")
+    if os.path.exists(errors_path):
+        os.remove(errors_path)
+    
+    labels = Config.INTENT_CATEGORIES if check_labels else None
+    return validate_jsonl_file(path, labels=labels, errors_path=errors_path,
+                               reference=reference, workers=workers)
 
-def calculate_tokens_estimate(data: List[Dict]) -> Dict[str, int]:
+def print_validation_report(report: ValidationReport) -> None:
+    """Imprime el resultado de la validación y las estadísticas del fichero"""
+    
+    if report.is_valid:
+        print(f"✅ Formato válido para {report.valid_examples} ejemplos")
+    else:
+        print(f"❌ {report.error_count} errores en {report.invalid_lines} líneas "
+              f"({report.valid_examples} de {report.examples} ejemplos válidos)")
+        for error in report.errors[:MAX_PRINTED_ERRORS]:
+            print(f"   ❌ Línea {error['line']}: {error['error']}")
+        if report.error_count > MAX_PRINTED_ERRORS:
+            print(f"   ... y {report.error_count - MAX_PRINTED_ERRORS} errores más")
+        print(f"   📄 Lista completa de errores: {report.errors_path}")
+    if report.blank_lines:
+        print(f"   - Líneas en blanco (ignoradas): {report.blank_lines}")
+    
+    stats = report.to_dict()
+    roles = ", ".join(f"{role}: {count}" for role, count in stats["role_distribution"].items())
+    print(f"   - Mensajes por rol: {roles}")
+    for role, lengths in stats["content_length"].items():
+        histogram = " | ".join(f"{bucket}: {count}" for bucket, count in lengths["histogram"].items() if count)
+        print(f"   - Longitud {role} (caracteres): media {lengths['mean']}, máx. {lengths['max']} [{histogram}]")
+    labels = ", ".join(f"{label}: {count}" for label, count in stats["label_distribution"].items())
+    print(f"   - Intenciones: {labels}")
+    duplicates = stats["duplicates"]
+    if duplicates["examples"] or duplicates["inputs"]:
+        print(f"   ⚠️ Duplicados: {duplicates['examples']} ejemplos idénticos, {duplicates['inputs']} textos "
+              f"repetidos ({duplicates['inputs_with_conflicting_labels']} con intenciones distintas)")
+    if duplicates["inputs_in_reference_set"]:
+        print(f"   ⚠️ {duplicates['inputs_in_reference_set']} textos también están en entrenamiento "
+              f"(la validación sobreestimará la accuracy)")
+
+def calculate_token_stats(path: str, counter: TokenCounter, workers: Optional[int] = None) -> Dict:
     """
-    Estima el número de tokens en los datos (aproximación simple)
+    Cuenta los tokens de cada ejemplo (formato chat) del JSONL, en paralelo por bloques
     """
     
-    total_chars = 0
-    total_examples = len(data)
-    
-    for item in data:
-        for message in item["messages"]:
-            total_chars += len(message["content"])
-    
-    # Aproximación: 1 token ≈ 4 caracteres en español
-    estimated_tokens = total_chars // 4
-    
-    return {
-        "total_examples": total_examples,
-        "total_characters": total_chars,
-        "estimated_tokens": estimated_tokens,
-        "tokens_per_example": estimated_tokens // total_examples if total_examples > 0 else 0
-    }
+    max_tokens = Config.FINE_TUNING_MAX_TOKENS or None
+    return count_file_tokens(path, counter, max_tokens=max_tokens, workers=workers)
 
-def create_training_summary(train_stats: Dict, val_stats: Dict) -> Dict:
+def create_training_summary(train_stats: Dict, val_stats: Dict, train_report: ValidationReport,
+                            val_report: ValidationReport) -> Dict:
     """Crea un resumen de los datos preparados"""
     
+    cost = training_cost(train_stats, Config.FINE_TUNING_PARAMS["n_epochs"],
+                         Config.FINE_TUNING_PRICE_PER_1M_TOKENS)
+    over_limit = train_stats["over_limit"] + val_stats["over_limit"]
+    
     summary = {
         "training_data": train_stats,
         "validation_data": val_stats,
         "total_examples": train_stats["total_examples"] + val_stats["total_examples"],
+        "total_tokens": train_stats["total_tokens"] + val_stats["total_tokens"],
         "total_estimated_tokens": train_stats["estimated_tokens"] + val_stats["estimated_tokens"],
+        "counting_method": train_stats["counting_method"],
+        "base_model": Config.BASE_MODEL,
+        "training_cost": cost,
+        "examples_over_limit": over_limit,
         "format_validation": "PASSED",
-        "ready_for_finetuning": True
+        "data_validation": {
+            "training": train_report.to_dict(),
+            "validation": val_report.to_dict()
+        },
+        "ready_for_finetuning": over_limit == 0
     }
     
     return summary
 
+def print_token_stats(title: str, stats: Dict) -> None:
+    """Imprime las estadísticas de tokens de un conjunto"""
+    
+    distribution = stats["tokens_distribution"]
+    print(f"\n📈 Estadísticas de {title}:")
+    print(f"   - Ejemplos: {stats['total_examples']}")
+    print(f"   - Tokens: {stats['total_tokens']:,}")
+    print(f"   - Tokens por ejemplo: {stats['tokens_per_example']} "
+          f"(mín. {distribution['min']}, p50 {distribution['p50']}, p95 {distribution['p95']}, máx. {distribution['max']})")
+    if stats["over_limit"]:
+        lines = ", ".join(str(example["line"]) for example in stats["over_limit_examples"])
+        print(f"   ⚠️ {stats['over_limit']} ejemplos superan el límite de {stats['max_tokens_per_example']:,} tokens "
+              f"y se truncarían (líneas {lines}{'...' if stats['over_limit'] > len(stats['over_limit_examples']) else ''})")
+
 def save_prepared_data_info(summary: Dict) -> None:
     """Guarda información sobre los datos preparados"""
     
@@ -102,7 +135,15 @@ def save_prepared_data_info(summary: Dict) -> None:
 def main():
     """Función principal para ejecutar el Paso 4"""
     
+    parser = argparse.ArgumentParser(description="Paso 4: preparar los datos para fine-tuning")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos para validar y contar tokens en ficheros grandes (por defecto, uno por CPU)")
+    parser.add_argument("--check-labels", action="store_true",
+                        help="Exigir que la respuesta del assistant sea una de Config.INTENT_CATEGORIES")
+    args = parser.parse_args()
+    
     print("=== PASO 4: Preparar los datos ===")
+    Config.ensure_directories()
     
     # Rutas de datos
     train_path = os.path.join(Config.TRAINING_DATA_PATH, "train_data.jsonl")
@@ -119,58 +160,58 @@ def main():
         print("   Ejecuta primero el Paso 3")
         return
     
-    # Cargar datos
-    print("📂 Cargando datos...")
-    
-    train_data = []
-    with open(train_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            train_data.append(json.loads(line.strip()))
-    
-    val_data = []
-    with open(val_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            val_data.append(json.loads(line.strip()))
+    # Validar formato (en streaming: los ficheros no se cargan en memoria)
+    print(f"\n🔍 Validando formato de entrenamiento...")
+    train_report = validate_file(train_path, workers=args.workers, check_labels=args.check_labels)
+    print_validation_report(train_report)
     
-    print(f"📊 Datos cargados:")
-    print(f"   - Entrenamiento: {len(train_data)} ejemplos")
-    print(f"   - Validación: {len(val_data)} ejemplos")
+    print(f"\n🔍 Validando formato de validación...")
+    val_report = validate_file(val_path, reference=train_report, workers=args.workers,
+                               check_labels=args.check_labels)
+    print_validation_report(val_report)
     
-    # Validar formato
-    print(f"\n🔍 Validando formato de entrenamiento...")
-    if not validate_training_format(train_data):
+    if not train_report.is_valid:
         print("❌ Error en formato de datos de entrenamiento")
         return
-    
-    print(f"\n🔍 Validando formato de validación...")
-    if not validate_training_format(val_data):
+    if not val_report.is_valid:
         print("❌ Error en formato de datos de validación")
         return
     
-    # Calcular estadísticas
+    # Calcular estadísticas (tokens exactos con tiktoken; si no, estimación calibrada)
     print(f"\n📊 Calculando estadísticas...")
-    train_stats = calculate_tokens_estimate(train_data)
-    val_stats = calculate_tokens_estimate(val_data)
+    counter = TokenCounter(Config.BASE_MODEL, calibration_path=str(CALIBRATION_PATH))
+    print(f"🧮 Recuento de tokens: {counter.method}")
+    train_stats = calculate_token_stats(train_path, counter, workers=args.workers)
+    val_stats = calculate_token_stats(val_path, counter, workers=args.workers)
     
-    print(f"\n📈 Estadísticas de entrenamiento:")
-    print(f"   - Ejemplos: {train_stats['total_examples']}")
-    print(f"   - Tokens estimados: {train_stats['estimated_tokens']:,}")
-    print(f"   - Tokens por ejemplo: {train_stats['tokens_per_example']}")
+    if counter.exact:
+        calibration = [train_stats["calibration"], val_stats["calibration"]]
+        save_calibration(str(CALIBRATION_PATH), counter.encoding_name,
+                         sum(c["exact"] for c in calibration), sum(c["estimated"] for c in calibration))
     
-    print(f"\n📈 Estadísticas de validación:")
-    print(f"   - Ejemplos: {val_stats['total_examples']}")
-    print(f"   - Tokens estimados: {val_stats['estimated_tokens']:,}")
-    print(f"   - Tokens por ejemplo: {val_stats['tokens_per_example']}")
+    print_token_stats("entrenamiento", train_stats)
+    print_token_stats("validación", val_stats)
     
     # Crear resumen
-    summary = create_training_summary(train_stats, val_stats)
+    summary = create_training_summary(train_stats, val_stats, train_report, val_report)
     save_prepared_data_info(summary)
     
+    cost = summary["training_cost"]
+    print(f"\n💰 Tokens facturados del entrenamiento: {cost['billed_training_tokens']:,} "
+          f"({train_stats['billed_tokens_per_epoch']:,} × {cost['n_epochs']} epochs)")
+    if cost["estimated_cost"] is not None:
+        print(f"   - Coste estimado: {cost['estimated_cost']:.2f} (a {cost['price_per_1m_tokens']} por millón de tokens)")
+    
+    if not summary["ready_for_finetuning"]:
+        print(f"\n⚠️ {summary['examples_over_limit']} ejemplos superan el límite de tokens del modelo: "
+              f"acórtalos o elimínalos antes del fine-tuning")
+        return
+    
     # Mostrar resumen final
     print(f"\n✅ Paso 4 completado exitosamente")
     print(f"🚀 Los datos están listos para fine-tuning:")
     print(f"   - Total de ejemplos: {summary['total_examples']}")
-    print(f"   - Total de tokens estimados: {summary['total_estimated_tokens']:,}")
+    print(f"   - Total de tokens: {summary['total_tokens']:,}")
     print(f"   - Validación de formato: {summary['format_validation']}")
     
     print(f"\n📁 Archivos preparados:")
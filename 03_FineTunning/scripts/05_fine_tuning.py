@@ -209,6 +209,7 @@ def main():
     """Función principal para ejecutar el Paso 5"""
     
     print("=== PASO 5: Realizar Fine-Tuning ===")
+    Config.ensure_directories()
     
     # Verificar configuración
     if not Config.validate_config():
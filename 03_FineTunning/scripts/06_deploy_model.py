@@ -195,6 +195,7 @@ def main():
     """Función principal para ejecutar el Paso 6"""
     
     print("=== PASO 6: Verificar estado del deployment ===")
+    Config.ensure_directories()
     
     try:
         # Crear deployment manager
@@ -2,11 +2,14 @@
 Paso 7: Probar el modelo fine-tuned
 """
 
+import argparse
+import asyncio
 import json
 import os
 import sys
-from typing import List, Dict, Tuple
-from openai import AzureOpenAI
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from openai import AsyncAzureOpenAI, AzureOpenAI
 
 # Agregar el directorio padre al path para imports
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,6 +17,43 @@ project_root = os.path.dirname(script_dir)
 sys.path.insert(0, project_root)
 
 from config.config import Config
+from utils.evaluation import RunningMetrics, StreamingResultsWriter, iter_eval_cases, stratified_sample
+from utils.prompts import SYSTEM_PROMPT, add_usage, build_messages, new_usage
+
+# Casos de prueba fijos (también los usa 09_knn_cascade.py para comparar)
+TEST_CASES = [
+    # Casos de compra
+    {"text": "Me interesa comprar esos zapatos negros", "expected": "comprar"},
+    {"text": "¿Cuánto cuesta esta chaqueta?", "expected": "comprar"},
+    {"text": "Quisiera llevarme este vestido", "expected": "comprar"},
+    
+    # Casos de devolución
+    {"text": "Esta camisa me queda grande, ¿puedo cambiarla?", "expected": "devolver"},
+    {"text": "Necesito devolver este pantalón", "expected": "devolver"},
+    {"text": "¿Cuál es su política de devoluciones?", "expected": "devolver"},
+    
+    # Casos de queja
+    {"text": "El vendedor fue muy grosero conmigo", "expected": "queja"},
+    {"text": "Tengo una queja sobre el servicio al cliente", "expected": "queja"},
+    {"text": "Esta tienda tiene un servicio pésimo", "expected": "queja"},
+    
+    # Casos de consulta
+    {"text": "¿A qué hora cierran hoy?", "expected": "consulta"},
+    {"text": "¿Tienen tallas grandes disponibles?", "expected": "consulta"},
+    {"text": "¿Dónde está el probador?", "expected": "consulta"},
+    
+    # Casos ambiguos para probar robustez
+    {"text": "No me gusta cómo me queda esta prenda", "expected": "devolver"},
+    {"text": "¿Tienen descuentos en esta época?", "expected": "consulta"},
+    {"text": "Me encanta esta tienda, quiero comprar todo", "expected": "comprar"}
+]
+
+# Con más casos que este límite se muestra una línea de progreso en lugar de cada caso
+VERBOSE_CASE_LIMIT = 50
+
+# Segundos entre líneas de progreso
+PROGRESS_INTERVAL_SECONDS = 5.0
+
 
 class ModelTester:
     """Gestiona las pruebas del modelo fine-tuned"""
@@ -31,20 +71,16 @@ class ModelTester:
         )
         
         self.fine_tuned_model = None
+        # Deployment que sirve realmente las pruebas (se resuelve una vez, ver resolve_deployment)
+        self.serving_model = None
         self.system_prompt = self._create_system_prompt()
+        # Tokens consumidos en la ejecución (incluidos los servidos desde la caché de prompts)
+        self.usage = new_usage()
     
     def _create_system_prompt(self) -> str:
-        """Crea el prompt del sistema para las pruebas"""
+        """Prompt del sistema para las pruebas (el mismo del entrenamiento, utils/prompts.py)"""
         
-        return """Eres un asistente especializado en clasificar las intenciones de los clientes en una tienda de ropa.
-
-Tu tarea es clasificar cada mensaje del usuario en una de las siguientes categorías:
-- comprar: El usuario quiere adquirir un producto
-- devolver: El usuario quiere devolver o cambiar un producto
-- queja: El usuario tiene una queja o reclamación
-- consulta: El usuario hace preguntas informativas
-
-Responde únicamente con el nombre de la categoría (comprar, devolver, queja, consulta)."""
+        return SYSTEM_PROMPT
     
     def load_model_info(self) -> bool:
         """Carga información del modelo desplegado"""
@@ -79,174 +115,203 @@ Responde únicamente con el nombre de la categoría (comprar, devolver, queja, c
     def create_test_cases(self) -> List[Dict[str, str]]:
         """Crea casos de prueba para evaluar el modelo"""
         
-        test_cases = [
-            # Casos de compra
-            {"text": "Me interesa comprar esos zapatos negros", "expected": "comprar"},
-            {"text": "¿Cuánto cuesta esta chaqueta?", "expected": "comprar"},
-            {"text": "Quisiera llevarme este vestido", "expected": "comprar"},
-            
-            # Casos de devolución
-            {"text": "Esta camisa me queda grande, ¿puedo cambiarla?", "expected": "devolver"},
-            {"text": "Necesito devolver este pantalón", "expected": "devolver"},
-            {"text": "¿Cuál es su política de devoluciones?", "expected": "devolver"},
-            
-            # Casos de queja
-            {"text": "El vendedor fue muy grosero conmigo", "expected": "queja"},
-            {"text": "Tengo una queja sobre el servicio al cliente", "expected": "queja"},
-            {"text": "Esta tienda tiene un servicio pésimo", "expected": "queja"},
-            
-            # Casos de consulta
-            {"text": "¿A qué hora cierran hoy?", "expected": "consulta"},
-            {"text": "¿Tienen tallas grandes disponibles?", "expected": "consulta"},
-            {"text": "¿Dónde está el probador?", "expected": "consulta"},
-            
-            # Casos ambiguos para probar robustez
-            {"text": "No me gusta cómo me queda esta prenda", "expected": "devolver"},
-            {"text": "¿Tienen descuentos en esta época?", "expected": "consulta"},
-            {"text": "Me encanta esta tienda, quiero comprar todo", "expected": "comprar"}
-        ]
+        return [dict(case) for case in TEST_CASES]
+    
+    def load_test_cases(self, eval_file: Optional[str] = None, sample: Optional[int] = None,
+                        seed: int = 42) -> Tuple[Iterable[Dict[str, str]], int]:
+        """Casos a evaluar y su número: los fijos o un JSONL etiquetado, opcionalmente muestreado
+        
+        Sin muestra, los casos del fichero se leen en streaming (nunca se cargan enteros).
+        """
+        
+        if not eval_file:
+            cases = self.create_test_cases()
+            if sample:
+                cases = stratified_sample(lambda: cases, sample, seed)
+            return cases, len(cases)
         
-        return test_cases
+        skipped: List[int] = []
+        total = sum(1 for _ in iter_eval_cases(eval_file, skipped))
+        if skipped:
+            preview = ", ".join(str(n) for n in skipped[:10])
+            print(f"⚠️ {len(skipped)} líneas sin texto/intención válidos se ignoran (líneas {preview}"
+                  f"{'...' if len(skipped) > 10 else ''})")
+        print(f"📂 Conjunto de evaluación: {eval_file} ({total:,} casos)")
+        
+        if sample and sample < total:
+            cases = stratified_sample(lambda: iter_eval_cases(eval_file), sample, seed)
+            print(f"🎲 Muestra estratificada de {len(cases):,} casos (seed={seed})")
+            return cases, len(cases)
+        return iter_eval_cases(eval_file), total
+    
+    def resolve_deployment(self) -> str:
+        """Decide una sola vez qué deployment sirve las pruebas: el fine-tuned o, si no existe, el base"""
+        
+        if self.serving_model:
+            return self.serving_model
+        
+        candidate = self.fine_tuned_model or Config.BASE_MODEL
+        if candidate != Config.BASE_MODEL:
+            # Petición mínima de comprobación en lugar de reintentar con el base en cada caso
+            try:
+                response = self.client.chat.completions.create(
+                    model=candidate,
+                    messages=build_messages("hola"),
+                    max_tokens=1,
+                    temperature=0
+                )
+                add_usage(self.usage, response)
+            except Exception as e:
+                if "DeploymentNotFound" in str(e):
+                    print(f"🔄 Deployment '{candidate}' no encontrado: usando modelo base {Config.BASE_MODEL}")
+                    candidate = Config.BASE_MODEL
+                else:
+                    print(f"⚠️ No se pudo comprobar el deployment ({str(e)}); se usará {candidate}")
+        
+        self.serving_model = candidate
+        print(f"🎯 Deployment de las pruebas: {self.serving_model}")
+        return self.serving_model
     
     def test_single_case(self, text: str) -> Tuple[str, bool]:
-        """Prueba un caso individual con fallback al modelo base"""
+        """Prueba un caso individual (síncrono) con el deployment resuelto"""
         
-        # Intentar primero con modelo fine-tuned
+        model = self.resolve_deployment()
         try:
             response = self.client.chat.completions.create(
-                model=self.fine_tuned_model,  # Usando el deployment del modelo fine-tuned
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": text}
-                ],
+                model=model,
+                messages=build_messages(text),
                 max_tokens=10,
                 temperature=0.1
             )
             
+            add_usage(self.usage, response)
             prediction = response.choices[0].message.content.strip().lower()
             return prediction, True
             
         except Exception as e:
-            error_msg = str(e)
-            
-            # Si es error de deployment, usar modelo base como fallback
-            if "DeploymentNotFound" in error_msg:
-                try:
-                    print(f"🔄 Usando modelo base como fallback...")
-                    response = self.client.chat.completions.create(
-                        model=Config.BASE_MODEL,
-                        messages=[
-                            {"role": "system", "content": self.system_prompt},
-                            {"role": "user", "content": text}
-                        ],
-                        max_tokens=10,
-                        temperature=0.1
-                    )
-                    
-                    prediction = response.choices[0].message.content.strip().lower()
-                    return prediction, True
-                    
-                except Exception as e2:
-                    print(f"❌ Error con modelo base: {str(e2)}")
-                    return "", False
-            else:
-                print(f"❌ Error en predicción: {error_msg}")
-                return "", False
+            print(f"❌ Error en predicción: {str(e)}")
+            return "", False
     
-    def run_tests(self) -> Dict:
-        """Ejecuta todas las pruebas y calcula métricas"""
+    def _create_async_client(self) -> AsyncAzureOpenAI:
+        """Cliente asíncrono de Azure OpenAI para la evaluación concurrente"""
         
-        if not self.fine_tuned_model:
-            print("❌ Error: Modelo no cargado")
-            return {}
+        return AsyncAzureOpenAI(
+            api_key=Config.AZURE_OPENAI_KEY,
+            api_version=Config.AZURE_OPENAI_VERSION,
+            azure_endpoint=Config.AZURE_OPENAI_ENDPOINT
+        )
+    
+    async def _evaluate_case(self, client: AsyncAzureOpenAI, case_number: int, case: Dict[str, str]) -> Dict:
+        """Clasifica un caso y devuelve su resultado con la latencia de la petición"""
         
-        test_cases = self.create_test_cases()
-        results = []
-        correct = 0
+        text = case["text"]
+        expected = case["expected"]
+        t0 = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(
+                model=self.serving_model,
+                messages=build_messages(text),
+                max_tokens=10,
+                temperature=0.1
+            )
+            add_usage(self.usage, response)
+            prediction = response.choices[0].message.content.strip().lower()
+        except Exception as e:
+            print(f"❌ Error en la predicción del caso {case_number}: {str(e)}")
+            return {
+                "case_number": case_number,
+                "text": text,
+                "expected": expected,
+                "predicted": "ERROR",
+                "correct": False,
+                "latency_ms": None
+            }
         
-        print(f"🧪 Ejecutando {len(test_cases)} casos de prueba...")
+        return {
+            "case_number": case_number,
+            "text": text,
+            "expected": expected,
+            "predicted": prediction,
+            "correct": prediction == expected,
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 1)
+        }
+    
+    async def _run_cases(self, cases: Iterable[Dict[str, str]], concurrency: int,
+                         on_result: Callable[[Dict], None]) -> None:
+        """Evalúa los casos con `concurrency` workers que comparten un único iterador.
         
-        for i, case in enumerate(test_cases, 1):
-            text = case["text"]
-            expected = case["expected"]
-            
-            print(f"\n📝 Caso {i}: {text}")
-            
-            prediction, success = self.test_single_case(text)
-            
-            if success:
-                is_correct = prediction == expected
-                if is_correct:
-                    correct += 1
-                    print(f"✅ Predicción: {prediction} (Esperado: {expected})")
-                else:
-                    print(f"❌ Predicción: {prediction} (Esperado: {expected})")
-                
-                results.append({
-                    "case_number": i,
-                    "text": text,
-                    "expected": expected,
-                    "predicted": prediction,
-                    "correct": is_correct
-                })
-            else:
-                print(f"❌ Error en la predicción")
-                results.append({
-                    "case_number": i,
-                    "text": text,
-                    "expected": expected,
-                    "predicted": "ERROR",
-                    "correct": False
-                })
+        Cada worker toma el siguiente caso al terminar el anterior, así que nunca hay más de
+        `concurrency` peticiones en vuelo ni casos pendientes en memoria.
+        """
         
-        # Calcular métricas
-        accuracy = correct / len(test_cases) if test_cases else 0
+        numbered = enumerate(cases, 1)
+        client = self._create_async_client()
         
-        summary = {
-            "model_id": self.fine_tuned_model,
-            "total_cases": len(test_cases),
-            "correct_predictions": correct,
-            "accuracy": accuracy,
-            "test_results": results,
-            "performance_by_intent": self._calculate_intent_metrics(results)
-        }
+        async def worker():
+            for case_number, case in numbered:
+                on_result(await self._evaluate_case(client, case_number, case))
         
-        return summary
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        finally:
+            await client.close()
     
-    def _calculate_intent_metrics(self, results: List[Dict]) -> Dict:
-        """Calcula métricas por intención"""
-        
-        intent_stats = {}
-        
-        for result in results:
-            if result["predicted"] == "ERROR":
-                continue
-                
-            expected = result["expected"]
-            if expected not in intent_stats:
-                intent_stats[expected] = {"total": 0, "correct": 0}
-            
-            intent_stats[expected]["total"] += 1
-            if result["correct"]:
-                intent_stats[expected]["correct"] += 1
+    def run_tests(self, concurrency: int = Config.TEST_CONCURRENCY, eval_file: Optional[str] = None,
+                  sample: Optional[int] = None, seed: int = 42) -> Dict:
+        """Ejecuta todas las pruebas en paralelo, guarda los resultados según llegan y calcula métricas
         
-        # Calcular accuracy por intención
-        for intent in intent_stats:
-            total = intent_stats[intent]["total"]
-            correct = intent_stats[intent]["correct"]
-            intent_stats[intent]["accuracy"] = correct / total if total > 0 else 0
+        Las métricas se acumulan caso a caso (RunningMetrics), así que la memoria no crece con
+        el tamaño del conjunto de evaluación.
+        """
         
-        return intent_stats
-    
-    def save_test_results(self, summary: Dict) -> None:
-        """Guarda los resultados de las pruebas"""
+        if not self.fine_tuned_model:
+            print("❌ Error: Modelo no cargado")
+            return {}
+        
+        test_cases, total = self.load_test_cases(eval_file, sample, seed)
+        if not total:
+            print("❌ Error: No hay casos de prueba")
+            return {}
+        self.resolve_deployment()
         
         results_path = os.path.join(Config.RESULTS_PATH, "test_results.json")
+        writer = StreamingResultsWriter(results_path, {
+            "model_id": self.fine_tuned_model,
+            "serving_model": self.serving_model,
+            "eval_source": eval_file or "TEST_CASES",
+            "sample_size": sample,
+            "seed": seed if sample else None
+        })
+        metrics = RunningMetrics(total)
+        verbose = total <= VERBOSE_CASE_LIMIT
+        last_progress = time.perf_counter()
+        
+        def on_result(result: Dict) -> None:
+            nonlocal last_progress
+            writer.write(result)
+            metrics.add(result)
+            if verbose:
+                mark = "✅" if result["correct"] else "❌"
+                print(f"{mark} Caso {result['case_number']}: {result['predicted']} "
+                      f"(Esperado: {result['expected']}) | {result['text']}")
+            elif time.perf_counter() - last_progress >= PROGRESS_INTERVAL_SECONDS or metrics.done == total:
+                last_progress = time.perf_counter()
+                print(metrics.progress_line())
         
-        with open(results_path, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"🧪 Ejecutando {total:,} casos de prueba ({concurrency} en paralelo)...")
+        
+        try:
+            asyncio.run(self._run_cases(test_cases, concurrency, on_result))
+        except BaseException:
+            writer.abort()
+            raise
         
+        # Calcular métricas
+        metrics_summary = {**metrics.summary(), "usage": dict(self.usage)}
+        writer.close(metrics_summary)
         print(f"💾 Resultados guardados en: {results_path}")
+        
+        return {"model_id": self.fine_tuned_model, "serving_model": self.serving_model, **metrics_summary}
     
     def print_summary(self, summary: Dict) -> None:
         """Imprime resumen de resultados"""
@@ -254,9 +319,22 @@ Responde únicamente con el nombre de la categoría (comprar, devolver, queja, c
         print(f"\n📊 RESUMEN DE PRUEBAS")
         print(f"{'='*50}")
         print(f"🤖 Modelo: {summary['model_id']}")
+        if summary.get("serving_model") and summary["serving_model"] != summary["model_id"]:
+            print(f"🔄 Servido por: {summary['serving_model']} (fallback)")
         print(f"📝 Casos totales: {summary['total_cases']}")
         print(f"✅ Predicciones correctas: {summary['correct_predictions']}")
+        if summary.get("errors"):
+            print(f"⚠️ Errores de petición: {summary['errors']}")
         print(f"🎯 Accuracy general: {summary['accuracy']:.2%}")
+        usage = summary.get("usage") or {}
+        latency = summary.get("latency_ms") or {}
+        if latency.get("p50") is not None:
+            print(f"⏱️ Latencia (ms): p50={latency['p50']} p90={latency['p90']} "
+                  f"p95={latency['p95']} p99={latency['p99']} (máx. {latency['max']})")
+            print(f"🚀 Rendimiento: {summary['throughput_per_second']} casos/s en {summary['elapsed_seconds']}s")
+        if usage.get("prompt_tokens"):
+            print(f"🧮 Tokens de prompt: {usage['prompt_tokens']} "
+                  f"({usage['cached_tokens']} en caché, {usage['cached_tokens'] / usage['prompt_tokens']:.0%})")
         
         print(f"\n📈 RENDIMIENTO POR INTENCIÓN:")
         for intent, stats in summary['performance_by_intent'].items():
@@ -265,7 +343,20 @@ Responde únicamente con el nombre de la categoría (comprar, devolver, queja, c
 def main():
     """Función principal para ejecutar el Paso 7"""
     
+    parser = argparse.ArgumentParser(description="Paso 7: probar el modelo fine-tuned")
+    parser.add_argument("--concurrency", type=int, default=Config.TEST_CONCURRENCY,
+                        help="Peticiones simultáneas al modelo")
+    parser.add_argument("--eval-file", default=None,
+                        help="JSONL etiquetado a evaluar (formato chat del Paso 3 o {\"text\", \"expected\"})")
+    parser.add_argument("--validation", action="store_true",
+                        help="Evaluar con data/validation/validation_data.jsonl (Paso 3)")
+    parser.add_argument("--sample", type=int, default=None,
+                        help="Evaluar una muestra estratificada por intención de este tamaño")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla de la muestra")
+    args = parser.parse_args()
+    
     print("=== PASO 7: Probar el modelo ===")
+    Config.ensure_directories()
     
     try:
         # Crear tester
@@ -275,13 +366,14 @@ def main():
         if not tester.load_model_info():
             return
         
-        # Ejecutar pruebas
-        summary = tester.run_tests()
+        # Ejecutar pruebas (los resultados se guardan a medida que llegan)
+        eval_file = args.eval_file
+        if args.validation:
+            eval_file = str(Config.VALIDATION_DATA_PATH / "validation_data.jsonl")
+        summary = tester.run_tests(concurrency=args.concurrency, eval_file=eval_file,
+                                   sample=args.sample, seed=args.seed)
         
         if summary:
-            # Guardar resultados
-            tester.save_test_results(summary)
-            
             # Mostrar resumen
             tester.print_summary(summary)
             
@@ -2,24 +2,43 @@
 Paso 8: Analizar resultados y sugerir mejoras
 """
 
+import argparse
 import json
 import os
 import sys
 from typing import Dict, List
 
+import numpy as np
+
 # Agregar el directorio padre al path para imports
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 sys.path.insert(0, project_root)
 
 from config.config import Config
+from utils.evaluation import read_test_results
+from utils.metrics import (OTHER_LABEL, bootstrap_ci, classification_report, confusion_matrix,
+                           encode_labels, top_confusions)
+
+# Casos fallidos que se guardan como ejemplo en el reporte (el total se cuenta siempre)
+MAX_FAILED_CASES = 100
 
 class ResultsAnalyzer:
     """Analiza los resultados del fine-tuning y sugiere mejoras"""
     
-    def __init__(self):
+    def __init__(self, n_bootstrap: int = 1000, seed: int = 42):
         self.test_results = None
         self.fine_tuning_info = None
+        self.n_bootstrap = n_bootstrap
+        self.seed = seed
+        self.labels = list(Config.INTENT_CATEGORIES)
+        # Etiquetas codificadas (índices en labels + otro) de los casos sin error de petición
+        self.y_true = np.empty(0, dtype=np.int32)
+        self.y_pred = np.empty(0, dtype=np.int32)
+        self.request_errors = 0
+        self.correct_total = 0
+        self.failed_total = 0
+        self.failed_cases: List[Dict] = []
     
     def load_results(self) -> bool:
         """Carga los resultados de las pruebas y fine-tuning"""
@@ -30,8 +49,30 @@ class ResultsAnalyzer:
             print(f"❌ Error: No se encontraron resultados de pruebas en {test_path}")
             return False
         
-        with open(test_path, 'r', encoding='utf-8') as f:
-            self.test_results = json.load(f)
+        # Se leen resultado a resultado: solo se guardan las etiquetas y unos pocos fallos de ejemplo
+        expected, predicted = [], []
+        
+        def on_result(result: Dict) -> None:
+            if result["predicted"] == "ERROR":
+                self.request_errors += 1
+                return
+            expected.append(result["expected"])
+            predicted.append(result["predicted"])
+            if result["correct"]:
+                self.correct_total += 1
+                return
+            self.failed_total += 1
+            if len(self.failed_cases) < MAX_FAILED_CASES:
+                self.failed_cases.append({
+                    "text": result["text"],
+                    "expected": result["expected"],
+                    "predicted": result["predicted"],
+                    "case_number": result["case_number"]
+                })
+        
+        self.test_results = read_test_results(test_path, on_result)
+        self.y_true = encode_labels(expected, self.labels)
+        self.y_pred = encode_labels(predicted, self.labels)
         
         # Cargar información de fine-tuning
         ft_path = os.path.join(Config.RESULTS_PATH, "fine_tuning_info.json")
@@ -39,24 +80,47 @@ class ResultsAnalyzer:
             with open(ft_path, 'r', encoding='utf-8') as f:
                 self.fine_tuning_info = json.load(f)
         
-        print("📂 Resultados cargados exitosamente")
+        print(f"📂 Resultados cargados exitosamente ({len(self.y_true):,} casos evaluados)")
         return True
     
     def analyze_accuracy_patterns(self) -> Dict:
-        """Analiza patrones en la accuracy"""
+        """Analiza patrones en la accuracy a partir de la matriz de confusión"""
+        
+        cm = confusion_matrix(self.y_true, self.y_pred, len(self.labels) + 1)
+        report = classification_report(cm, self.labels)
+        intervals = bootstrap_ci(self.y_true, self.y_pred, self.labels, n_boot=self.n_bootstrap, seed=self.seed)
         
-        results = self.test_results["test_results"]
-        intent_performance = self.test_results["performance_by_intent"]
+        # Rendimiento por intención (accuracy = recall), solo las intenciones con casos
+        intent_performance = {
+            intent: {"total": stats["support"], "correct": stats["correct"], "accuracy": stats["recall"]}
+            for intent, stats in report["per_class"].items() if stats["support"]
+        }
         
+        # Como en el paso 7, los errores de petición cuentan como fallos en la accuracy general;
+        # las métricas de clasificación (y sus intervalos) son solo de los casos sin error
+        total = len(self.y_true) + self.request_errors
         analysis = {
-            "overall_accuracy": self.test_results["accuracy"],
+            "overall_accuracy": self.correct_total / total if total else 0.0,
+            "accuracy_without_request_errors": report["accuracy"],
             "best_performing_intent": None,
             "worst_performing_intent": None,
             "accuracy_distribution": intent_performance,
-            "failed_cases": [],
+            "classification_report": report,
+            "confusion_matrix": {
+                "labels": self.labels + [OTHER_LABEL],
+                "matrix": cm.tolist()
+            },
+            "confidence_intervals": intervals,
+            "request_errors": self.request_errors,
+            "failed_cases_total": self.failed_total,
+            "failed_cases": self.failed_cases,
             "patterns": []
         }
         
+        if not intent_performance:
+            analysis["patterns"].append("No hay casos evaluados sin error")
+            return analysis
+        
         # Encontrar mejor y peor intención
         best_intent = max(intent_performance.items(), key=lambda x: x[1]["accuracy"])
         worst_intent = min(intent_performance.items(), key=lambda x: x[1]["accuracy"])
@@ -70,34 +134,27 @@ class ResultsAnalyzer:
             "accuracy": worst_intent[1]["accuracy"]
         }
         
-        # Analizar casos fallidos
-        for result in results:
-            if not result["correct"] and result["predicted"] != "ERROR":
-                analysis["failed_cases"].append({
-                    "text": result["text"],
-                    "expected": result["expected"],
-                    "predicted": result["predicted"],
-                    "case_number": result["case_number"]
-                })
-        
         # Identificar patrones
         if analysis["overall_accuracy"] < 0.8:
             analysis["patterns"].append("Accuracy general baja - necesita más datos de entrenamiento")
         
-        accuracy_variance = max(intent_performance.values(), key=lambda x: x["accuracy"])["accuracy"] - \
-                          min(intent_performance.values(), key=lambda x: x["accuracy"])["accuracy"]
+        accuracy_variance = best_intent[1]["accuracy"] - worst_intent[1]["accuracy"]
         
         if accuracy_variance > 0.3:
             analysis["patterns"].append("Gran varianza entre intenciones - datos desbalanceados")
         
-        if len(analysis["failed_cases"]) > 0:
-            confusion_pairs = {}
-            for case in analysis["failed_cases"]:
-                pair = f"{case['expected']} -> {case['predicted']}"
-                confusion_pairs[pair] = confusion_pairs.get(pair, 0) + 1
-            
-            most_common_confusion = max(confusion_pairs.items(), key=lambda x: x[1])
-            analysis["patterns"].append(f"Confusión más común: {most_common_confusion[0]} ({most_common_confusion[1]} casos)")
+        confusions = top_confusions(cm, self.labels)
+        analysis["top_confusions"] = confusions
+        if confusions:
+            most_common = confusions[0]
+            analysis["patterns"].append(
+                f"Confusión más común: {most_common['expected']} -> {most_common['predicted']} ({most_common['count']} casos)"
+            )
+        
+        if report["out_of_catalog_predictions"]:
+            analysis["patterns"].append(
+                f"{report['out_of_catalog_predictions']} respuestas fuera de las intenciones definidas"
+            )
         
         return analysis
     
@@ -124,21 +181,22 @@ class ResultsAnalyzer:
         worst_intent = analysis["worst_performing_intent"]
         best_intent = analysis["best_performing_intent"]
         
-        if best_intent["accuracy"] - worst_intent["accuracy"] > 0.3:
+        if best_intent and worst_intent and best_intent["accuracy"] - worst_intent["accuracy"] > 0.3:
             suggestions.append(f"⚖️ DESBALANCE: '{worst_intent['intent']}' tiene accuracy muy baja ({worst_intent['accuracy']:.1%})")
             suggestions.append(f"   • Agregar más ejemplos diversos para '{worst_intent['intent']}'")
             suggestions.append(f"   • Revisar si las definiciones de '{worst_intent['intent']}' son claras")
         
         # Sugerencias basadas en casos fallidos
         if analysis["failed_cases"]:
-            suggestions.append(f"🔍 CASOS FALLIDOS: {len(analysis['failed_cases'])} casos necesitan atención:")
+            failed_total = analysis["failed_cases_total"]
+            suggestions.append(f"🔍 CASOS FALLIDOS: {failed_total} casos necesitan atención:")
             
             # Mostrar algunos ejemplos problemáticos
             for i, case in enumerate(analysis["failed_cases"][:3]):
                 suggestions.append(f"   • '{case['text']}' → predijo '{case['predicted']}' (esperado '{case['expected']}')")
             
-            if len(analysis["failed_cases"]) > 3:
-                suggestions.append(f"   • ... y {len(analysis['failed_cases']) - 3} casos más")
+            if failed_total > 3:
+                suggestions.append(f"   • ... y {failed_total - 3} casos más")
         
         # Sugerencias de hiperparámetros
         if self.fine_tuning_info:
@@ -230,7 +288,7 @@ class ResultsAnalyzer:
         
         # Recomendaciones de balance
         worst_intent = analysis["worst_performing_intent"]
-        if worst_intent["accuracy"] < 0.8:
+        if worst_intent and worst_intent["accuracy"] < 0.8:
             recommendations["balance"].append(f"Priorizar ejemplos adicionales para '{worst_intent['intent']}'")
         
         return recommendations
@@ -252,12 +310,37 @@ class ResultsAnalyzer:
         
         print(f"\n📋 ANÁLISIS DE RESULTADOS")
         print(f"{'='*60}")
-        print(f"🎯 Accuracy general: {performance['overall_accuracy']:.2%}")
+        analysis = report["analysis"]
+        metrics = analysis["classification_report"]
+        intervals = analysis["confidence_intervals"]
+        
+        def ci(key: str) -> str:
+            if key not in intervals:
+                return ""
+            low, high = intervals[key]
+            return f" (IC {intervals['confidence']:.0%}: {low:.2%} – {high:.2%})"
+        
+        if analysis["request_errors"]:
+            print(f"🎯 Accuracy general: {performance['overall_accuracy']:.2%} (errores de petición como fallos)")
+            print(f"🎯 Accuracy sin errores de petición: {analysis['accuracy_without_request_errors']:.2%}{ci('accuracy')}")
+        else:
+            print(f"🎯 Accuracy general: {performance['overall_accuracy']:.2%}{ci('accuracy')}")
+        print(f"📐 F1 macro: {metrics['macro_f1']:.2%}{ci('macro_f1')} | F1 micro: {metrics['micro_f1']:.2%}{ci('micro_f1')}")
         print(f"📊 Calificación: {performance['performance_grade']}")
+        if analysis["request_errors"]:
+            print(f"⚠️ Casos con error de petición (excluidos de F1, matriz e intervalos): {analysis['request_errors']}")
         
         print(f"\n📈 RENDIMIENTO POR INTENCIÓN:")
-        for intent, stats in performance["intent_performance"].items():
-            print(f"   {intent.capitalize()}: {stats['accuracy']:.2%} ({stats['correct']}/{stats['total']})")
+        print(f"   {'Intención':<12}{'Precisión':>10}{'Recall':>10}{'F1':>10}{'Casos':>8}")
+        for intent, stats in metrics["per_class"].items():
+            print(f"   {intent.capitalize():<12}{stats['precision']:>10.2%}{stats['recall']:>10.2%}"
+                  f"{stats['f1']:>10.2%}{stats['support']:>8}")
+        
+        print(f"\n🔀 MATRIZ DE CONFUSIÓN (filas: esperada, columnas: predicha):")
+        labels = analysis["confusion_matrix"]["labels"]
+        print(f"   {'':<12}" + "".join(f"{label[:9]:>10}" for label in labels))
+        for label, row in zip(labels, analysis["confusion_matrix"]["matrix"]):
+            print(f"   {label:<12}" + "".join(f"{count:>10}" for count in row))
         
         print(f"\n💡 SUGERENCIAS DE MEJORA:")
         for suggestion in report["improvement_suggestions"]:
@@ -270,11 +353,18 @@ class ResultsAnalyzer:
 def main():
     """Función principal para ejecutar el Paso 8"""
     
+    parser = argparse.ArgumentParser(description="Paso 8: analizar resultados y sugerir mejoras")
+    parser.add_argument("--bootstrap", type=int, default=1000,
+                        help="Remuestras para los intervalos de confianza (0 para no calcularlos)")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del bootstrap")
+    args = parser.parse_args()
+    
     print("=== PASO 8: Analizar resultados y mejorar ===")
+    Config.ensure_directories()
     
     try:
         # Crear analizador
-        analyzer = ResultsAnalyzer()
+        analyzer = ResultsAnalyzer(n_bootstrap=args.bootstrap, seed=args.seed)
         
         # Cargar resultados
         if not analyzer.load_results():
@@ -0,0 +1,145 @@
+"""
+Paso 9: Cascada kNN (embeddings) + LLM para clasificar intenciones
+
+Clasifica los casos de prueba del Paso 7 con un kNN sobre embeddings de los ejemplos
+etiquetados del Paso 1 y solo escala al modelo (fine-tuned o base) los casos con margen
+bajo. Informa de accuracy y tasa de escalado, y de cómo varían con el umbral.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+from openai import AzureOpenAI
+
+# Agregar el directorio padre al path para imports
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.insert(0, project_root)
+
+from config.config import Config
+from utils.knn_cascade import KnnIntentClassifier, classify_cascade, make_azure_embed_fn, sweep_thresholds
+
+
+def load_step(filename: str):
+    """Importa un script de paso (nombre con número, no importable con `import`)."""
+    spec = importlib.util.spec_from_file_location(filename[:-3], os.path.join(script_dir, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_examples() -> Dict[str, List[str]]:
+    """Ejemplos etiquetados del Paso 1 (o los genera en memoria si aún no existe el JSON)."""
+    examples_path = os.path.join(Config.RAW_DATA_PATH, "intent_examples.json")
+    if os.path.exists(examples_path):
+        with open(examples_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    print(f"⚠️ No existe {examples_path}; usando los ejemplos del Paso 1 en memoria")
+    return load_step("01_create_examples.py").create_intent_examples()
+
+
+def main():
+    """Función principal para ejecutar el Paso 9"""
+
+    Config.ensure_directories()
+
+    parser = argparse.ArgumentParser(description="Cascada kNN + LLM sobre los casos de prueba del Paso 7")
+    parser.add_argument("--k", type=int, default=Config.KNN_K, help="Vecinos del kNN")
+    parser.add_argument("--margin", type=float, default=Config.KNN_MARGIN_THRESHOLD,
+                        help="Margen mínimo para no escalar al LLM (0..1)")
+    parser.add_argument("--no-llm", action="store_true", help="No llamar al LLM: solo medir kNN y tasa de escalado")
+    args = parser.parse_args()
+
+    print("=== PASO 9: Cascada kNN + LLM ===")
+
+    if not Config.validate_config():
+        print("❌ Configuración de Azure OpenAI incompleta (hace falta para los embeddings)")
+        return
+
+    client = AzureOpenAI(
+        api_key=Config.AZURE_OPENAI_KEY,
+        api_version=Config.AZURE_OPENAI_VERSION,
+        azure_endpoint=Config.AZURE_OPENAI_ENDPOINT
+    )
+    embed_fn = make_azure_embed_fn(client, Config.EMBEDDING_DEPLOYMENT)
+
+    # Embeddings de los ejemplos: se calculan una vez y se reutilizan desde data/processed
+    examples = load_examples()
+    cache_path = Config.PROCESSED_DATA_PATH / "intent_embeddings.npz"
+    classifier = KnnIntentClassifier.from_examples(
+        examples, embed_fn, cache_path=cache_path, cache_tag=Config.EMBEDDING_DEPLOYMENT, k=args.k
+    )
+    print(f"🧮 kNN con {len(classifier.texts)} ejemplos, k={classifier.k} (embeddings: {cache_path})")
+
+    # Casos de prueba del Paso 7 y, para escalar, su ModelTester (mismo prompt y fallback)
+    step7 = load_step("07_test_model.py")
+    test_cases = step7.TEST_CASES
+    llm_fn = None
+    model_id = None
+    if not args.no_llm:
+        tester = step7.ModelTester()
+        tester.load_model_info()
+        model_id = tester.fine_tuned_model
+        llm_fn = lambda text: tester.test_single_case(text)[0]
+
+    texts = [case["text"] for case in test_cases]
+    expected = [case["expected"] for case in test_cases]
+    results = classify_cascade(texts, classifier, embed_fn, llm_fn=llm_fn, margin_threshold=args.margin)
+
+    training_texts = set(classifier.texts)
+    for i, (result, gold) in enumerate(zip(results, expected), 1):
+        result.update(case_number=i, expected=gold, correct=result["predicted"] == gold,
+                      in_training_set=result["text"] in training_texts)
+        mark = "✅" if result["correct"] else "❌"
+        route = "🔼 LLM" if result["escalated"] else "⚡ kNN"
+        print(f"{mark} {route} margen={result['margin']:.2f} -> {result['predicted']} "
+              f"(esperado: {gold}) | {result['text']}")
+
+    # Métricas
+    margins = np.array([r["margin"] for r in results])
+    knn_correct = np.array([r["knn_predicted"] == r["expected"] for r in results])
+    escalated = np.array([r["escalated"] for r in results])
+    summary = {
+        "model_id": model_id,
+        "embedding_deployment": Config.EMBEDDING_DEPLOYMENT,
+        "k": classifier.k,
+        "margin_threshold": args.margin,
+        "total_cases": len(results),
+        "escalation_rate": float(escalated.mean()),
+        "knn_accuracy_all": float(knn_correct.mean()),
+        "knn_accuracy_not_escalated": float(knn_correct[~escalated].mean()) if (~escalated).any() else None,
+        "cascade_accuracy": float(np.mean([r["correct"] for r in results])) if llm_fn else None,
+        "cases_in_training_set": int(sum(r["in_training_set"] for r in results)),
+        "threshold_sweep": sweep_thresholds(margins, knn_correct),
+        "test_results": results,
+    }
+
+    print(f"\n📊 RESUMEN DE LA CASCADA")
+    print(f"{'='*50}")
+    print(f"🔼 Escalados al LLM: {escalated.sum()}/{len(results)} ({summary['escalation_rate']:.0%})")
+    print(f"⚡ Accuracy kNN (todos): {summary['knn_accuracy_all']:.2%}")
+    if summary["knn_accuracy_not_escalated"] is not None:
+        print(f"⚡ Accuracy kNN (no escalados): {summary['knn_accuracy_not_escalated']:.2%}")
+    if summary["cascade_accuracy"] is not None:
+        print(f"🎯 Accuracy de la cascada: {summary['cascade_accuracy']:.2%}")
+    if summary["cases_in_training_set"]:
+        print(f"⚠️ {summary['cases_in_training_set']} casos de prueba aparecen literalmente en los ejemplos de entrenamiento")
+    print(f"\n📈 Umbral vs escalado:")
+    for row in summary["threshold_sweep"]:
+        print(f"   margen≥{row['threshold']:.1f}: escalado {row['escalation_rate']:.0%}, "
+              f"accuracy kNN en no escalados {row['knn_accuracy_on_kept']:.2%}")
+
+    results_path = os.path.join(Config.RESULTS_PATH, "knn_cascade_results.json")
+    with open(results_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en: {results_path}")
+    print(f"\n✅ Paso 9 completado exitosamente")
+
+
+if __name__ == "__main__":
+    main()
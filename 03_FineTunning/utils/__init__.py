@@ -0,0 +1 @@
+# Utilidades compartidas por los scripts del ejercicio de Fine-Tuning.
@@ -0,0 +1,308 @@
+"""
+Utilidades de evaluación del Paso 7 (probar el modelo).
+
+- `StreamingResultsWriter` escribe `test_results.json` a medida que llegan los resultados,
+  sin acumularlos en memoria; el fichero final tiene el mismo formato de siempre (un objeto
+  con `test_results` y las métricas) y aparece de forma atómica al cerrar.
+  `read_test_results` lo vuelve a leer resultado a resultado (Paso 8).
+- `iter_eval_cases` lee conjuntos de evaluación etiquetados en JSONL de cualquier tamaño
+  (formato chat del Paso 3, como `validation_data.jsonl`, o `{"text", "expected"}`) línea a
+  línea, y `stratified_sample` saca de ellos un subconjunto estratificado por intención.
+- `RunningMetrics` acumula accuracy, métricas por intención y latencias (histograma) en
+  memoria constante, e informa del progreso y del tiempo restante.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+# Campos aceptados para la etiqueta en el formato simple
+LABEL_FIELDS = ("expected", "intent", "label")
+
+# Anchura relativa de los cubos del histograma de latencias (percentiles con error < 1%)
+_LATENCY_BUCKET_BASE = 1.02
+
+
+# Línea con la que StreamingResultsWriter abre la lista de resultados
+_RESULTS_OPENING = '  "test_results": ['
+
+
+def read_test_results(path: str, on_result: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """Lee `test_results.json` pasando cada resultado a `on_result`; devuelve el resto del objeto.
+
+    Con el formato de StreamingResultsWriter (un resultado por línea) no carga la lista en
+    memoria; cualquier otro JSON válido (p. ej. el de versiones anteriores) se lee entero.
+    """
+    outside: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            outside.append(line)
+            if line.rstrip("\n") == _RESULTS_OPENING:
+                break
+        else:
+            data = json.loads("".join(outside))
+            for result in data.pop("test_results", []):
+                on_result(result)
+            return data
+
+        first = True
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("]"):
+                outside.append(line)
+                break
+            try:
+                result = json.loads(stripped.rstrip(","))
+            except ValueError:
+                if not first:
+                    raise
+                # Lista indentada de varias líneas: no es el formato en streaming
+                f.seek(0)
+                data = json.load(f)
+                for result in data.pop("test_results", []):
+                    on_result(result)
+                return data
+            first = False
+            on_result(result)
+        outside.extend(f)
+    data = json.loads("".join(outside))
+    data.pop("test_results", None)
+    return data
+
+
+def case_from_record(record: Any) -> Optional[Dict[str, str]]:
+    """Convierte una línea del conjunto de evaluación en `{"text", "expected"}` (o None si no sirve).
+
+    Admite el formato chat de entrenamiento (último mensaje `user` = texto, último
+    `assistant` = intención) y el formato simple `{"text", "expected"|"intent"|"label"}`.
+    """
+    if not isinstance(record, dict):
+        return None
+    if isinstance(record.get("messages"), list):
+        text = expected = None
+        for message in record["messages"]:
+            if not isinstance(message, dict):
+                return None
+            if message.get("role") == "user":
+                text = message.get("content")
+            elif message.get("role") == "assistant":
+                expected = message.get("content")
+    else:
+        text = record.get("text")
+        expected = next((record[f] for f in LABEL_FIELDS if f in record), None)
+    if not isinstance(text, str) or not isinstance(expected, str) or not text.strip() or not expected.strip():
+        return None
+    return {"text": text, "expected": expected.strip().lower()}
+
+
+def iter_eval_cases(path: str, skipped: Optional[List[int]] = None) -> Iterator[Dict[str, str]]:
+    """Casos del JSONL en orden, sin cargar el fichero; los números de línea inválidos van a `skipped`."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                case = case_from_record(json.loads(line))
+            except ValueError:
+                case = None
+            if case is None:
+                if skipped is not None:
+                    skipped.append(line_number)
+                continue
+            yield case
+
+
+def _allocate(counts: Dict[str, int], n: int) -> Dict[str, int]:
+    """Reparte n entre las clases en proporción a su tamaño (restos mayores) y al menos 1 por clase."""
+    total = sum(counts.values())
+    if n >= total:
+        return dict(counts)
+    exact = {label: n * count / total for label, count in counts.items()}
+    quotas = {label: min(counts[label], max(1, int(value))) for label, value in exact.items()}
+    by_remainder = sorted(counts, key=lambda label: exact[label] - int(exact[label]), reverse=True)
+    i = 0
+    while sum(quotas.values()) < n and i < 10 * len(by_remainder):
+        label = by_remainder[i % len(by_remainder)]
+        if quotas[label] < counts[label]:
+            quotas[label] += 1
+        i += 1
+    return quotas
+
+
+def stratified_sample(make_cases: Callable[[], Iterable[Dict[str, str]]], n: int,
+                      seed: int = 42) -> List[Dict[str, str]]:
+    """Muestra estratificada por intención de tamaño n (proporcional a cada clase).
+
+    Hace dos pasadas sobre `make_cases()` (contar y muestrear con un reservorio por clase),
+    así que la memoria depende de n y no del tamaño del conjunto. Devuelve los casos en el
+    orden en que aparecen en el origen.
+    """
+    counts = Counter(case["expected"] for case in make_cases())
+    quotas = _allocate(counts, n)
+    rng = random.Random(seed)
+    reservoirs: Dict[str, List] = {label: [] for label in quotas}
+    seen: Counter = Counter()
+    for position, case in enumerate(make_cases()):
+        label = case["expected"]
+        quota = quotas.get(label, 0)
+        seen[label] += 1
+        if len(reservoirs[label]) < quota:
+            reservoirs[label].append((position, case))
+        elif quota:
+            j = rng.randrange(seen[label])
+            if j < quota:
+                reservoirs[label][j] = (position, case)
+    return [case for _, case in sorted(item for items in reservoirs.values() for item in items)]
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class RunningMetrics:
+    """Métricas de la evaluación acumuladas resultado a resultado, en memoria constante.
+
+    Las latencias se guardan en un histograma de cubos logarítmicos, así que los
+    percentiles son aproximados (error relativo < 1%) pero no crecen con el número de casos.
+    """
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.correct = 0
+        self.by_intent: Dict[str, Dict[str, int]] = {}
+        self._latency_buckets: Counter = Counter()
+        self._latency_count = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Suma un resultado (`expected`, `predicted`, `correct`, `latency_ms`)."""
+        self.done += 1
+        if result["predicted"] == "ERROR":
+            self.errors += 1
+            return
+        self.correct += bool(result["correct"])
+        stats = self.by_intent.setdefault(result["expected"], {"total": 0, "correct": 0})
+        stats["total"] += 1
+        stats["correct"] += bool(result["correct"])
+        latency = result.get("latency_ms")
+        if latency is not None:
+            self._latency_buckets[math.floor(math.log(max(latency, 0.01), _LATENCY_BUCKET_BASE))] += 1
+            self._latency_count += 1
+            self._latency_sum += latency
+            self._latency_max = max(self._latency_max, latency)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def latency_summary(self) -> Dict[str, Optional[float]]:
+        """Percentiles (p50/p90/p95/p99), media y máximo de las latencias en ms."""
+        if not self._latency_count:
+            return {**{f"p{p}": None for p in LATENCY_PERCENTILES}, "mean": None, "max": None}
+        summary = {}
+        targets = [(p, math.ceil(p / 100 * self._latency_count)) for p in LATENCY_PERCENTILES]
+        cumulative = 0
+        for bucket in sorted(self._latency_buckets):
+            cumulative += self._latency_buckets[bucket]
+            while targets and cumulative >= targets[0][1]:
+                # Punto medio geométrico del cubo, sin pasar del máximo observado
+                value = min(_LATENCY_BUCKET_BASE ** (bucket + 0.5), self._latency_max)
+                summary[f"p{targets.pop(0)[0]}"] = round(value, 1)
+        summary["mean"] = round(self._latency_sum / self._latency_count, 1)
+        summary["max"] = round(self._latency_max, 1)
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        """Métricas finales con el mismo formato de `test_results.json`."""
+        evaluated = self.done
+        performance = {
+            intent: {**stats, "accuracy": stats["correct"] / stats["total"] if stats["total"] else 0}
+            for intent, stats in self.by_intent.items()
+        }
+        elapsed = self.elapsed
+        return {
+            "total_cases": evaluated,
+            "correct_predictions": self.correct,
+            "errors": self.errors,
+            "accuracy": self.correct / evaluated if evaluated else 0,
+            "performance_by_intent": performance,
+            "latency_ms": self.latency_summary(),
+            "elapsed_seconds": round(elapsed, 2),
+            "throughput_per_second": round(evaluated / elapsed, 2) if elapsed > 0 else None,
+        }
+
+    def progress_line(self) -> str:
+        """Una línea de progreso: casos hechos, ritmo, accuracy hasta ahora y tiempo restante."""
+        elapsed = self.elapsed
+        rate = self.done / elapsed if elapsed > 0 else 0
+        accuracy = self.correct / self.done if self.done else 0
+        if self.total:
+            eta = _format_duration((self.total - self.done) / rate) if rate else "?"
+            head = f"{self.done:,}/{self.total:,} ({self.done / self.total:.1%})"
+            tail = f" · ETA {eta}"
+        else:
+            head, tail = f"{self.done:,}", ""
+        return f"⏳ {head} · {rate:.1f} casos/s · accuracy {accuracy:.1%} · errores {self.errors}{tail}"
+
+
+class StreamingResultsWriter:
+    """Escribe un JSON `{cabecera..., "test_results": [...], métricas...}` resultado a resultado.
+
+    Los resultados se vuelcan a `<ruta>.partial` según llegan; `close(métricas)` cierra la
+    lista, añade las métricas y renombra al nombre final, así que un proceso interrumpido
+    nunca deja un `test_results.json` a medias.
+    """
+
+    def __init__(self, path: str, header: Dict[str, Any], flush_every: int = 100):
+        self.path = str(path)
+        self.partial_path = self.path + ".partial"
+        self.count = 0
+        self._flush_every = max(1, flush_every)
+        self._f = open(self.partial_path, "w", encoding="utf-8")
+        self._f.write("{")
+        for key, value in header.items():
+            self._write_field(key, value)
+            self._f.write(",")
+        self._f.write('\n  "test_results": [')
+
+    def _write_field(self, key: str, value: Any) -> None:
+        body = json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        self._f.write(f"\n  {json.dumps(key)}: {body}")
+
+    def write(self, result: Dict[str, Any]) -> None:
+        """Añade un resultado a la lista (una línea por resultado)."""
+        self._f.write(("," if self.count else "") + "\n    " + json.dumps(result, ensure_ascii=False))
+        self.count += 1
+        if self.count % self._flush_every == 0:
+            self._f.flush()
+
+    def close(self, metrics: Dict[str, Any]) -> str:
+        """Cierra la lista, escribe las métricas y deja el fichero en su ruta final."""
+        self._f.write("\n  ]" if self.count else "]")
+        for key, value in metrics.items():
+            self._f.write(",")
+            self._write_field(key, value)
+        self._f.write("\n}\n")
+        self._f.close()
+        os.replace(self.partial_path, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        """Cierra sin publicar (el `.partial` queda para inspección)."""
+        if not self._f.closed:
+            self._f.close()
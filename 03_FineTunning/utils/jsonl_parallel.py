@@ -0,0 +1,110 @@
+"""
+Procesamiento de ficheros JSONL grandes por bloques de líneas en un pool de procesos.
+
+Cada bloque se procesa con una función de nivel de módulo (tiene que poder serializarse con
+pickle) y los resultados vuelven en el orden del fichero. Solo hay unos pocos bloques en
+vuelo a la vez (`2 × workers`), así que la memoria no depende del tamaño del fichero.
+
+Con el pool, el proceso principal no envía las líneas: recorre el fichero en binario para
+partirlo en rangos de bytes de unos `chunk_bytes` (cortados en un salto de línea, con el
+número de su primera línea) y cada proceso lee y decodifica su propio rango. Serializar
+las líneas para enviarlas costaba más que validarlas.
+
+Con ficheros pequeños (menos de `min_parallel_bytes`) o `workers=1` todo se hace en el
+proceso actual, leyendo en streaming bloques de `chunk_lines` líneas: arrancar el pool y
+devolver los resultados de cada bloque cuesta más de lo que se gana.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+DEFAULT_CHUNK_LINES = 5000
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+# Tamaño mínimo del fichero para usar el pool (JSONL_MIN_PARALLEL_MB para cambiarlo)
+MIN_PARALLEL_BYTES = int(float(os.getenv("JSONL_MIN_PARALLEL_MB", 32)) * 1024 * 1024)
+
+# Bloque: (número de la primera línea, empezando en 1; líneas del bloque)
+Chunk = Tuple[int, List[str]]
+# Rango: (número de la primera línea, posición en bytes, longitud en bytes)
+ByteRange = Tuple[int, int, int]
+
+
+def default_workers() -> int:
+    """Procesos por defecto: JSONL_WORKERS o el número de CPUs."""
+    return max(1, int(os.getenv("JSONL_WORKERS", 0)) or os.cpu_count() or 1)
+
+
+def iter_line_chunks(path: str, chunk_lines: int = DEFAULT_CHUNK_LINES) -> Iterator[Chunk]:
+    """Bloques de líneas del fichero (con su salto de línea), sin leerlo entero."""
+    with open(path, "r", encoding="utf-8") as f:
+        start, lines = 1, []
+        for line in f:
+            lines.append(line)
+            if len(lines) >= chunk_lines:
+                yield start, lines
+                start, lines = start + len(lines), []
+        if lines:
+            yield start, lines
+
+
+def iter_byte_ranges(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[ByteRange]:
+    """Rangos de unos `chunk_bytes` que terminan en un salto de línea, con su primera línea."""
+    with open(path, "rb") as f:
+        line, offset = 1, 0
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                return
+            if not block.endswith(b"\n"):
+                block += f.readline()
+            yield line, offset, len(block)
+            line += block.count(b"\n")
+            offset += len(block)
+
+
+def _read_range(path: str, offset: int, length: int) -> List[str]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        text = f.read(length).decode("utf-8")
+    # Solo "\n" separa líneas, como al iterar el fichero (str.splitlines también corta en U+2028)
+    lines = [line + "\n" for line in text.split("\n")]
+    if text.endswith("\n"):
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
+
+
+def _run_range(fn: Callable[..., Any], path: str, byte_range: ByteRange, args: tuple) -> Any:
+    """Se ejecuta en un proceso del pool: lee su rango del fichero y llama a `fn`."""
+    first_line, offset, length = byte_range
+    return fn(first_line, _read_range(path, offset, length), *args)
+
+
+def map_chunks(
+    fn: Callable[..., Any],
+    path: str,
+    *args: Any,
+    workers: Optional[int] = None,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    min_parallel_bytes: int = MIN_PARALLEL_BYTES,
+) -> Iterator[Any]:
+    """`fn(first_line, lines, *args)` para cada bloque del fichero, en orden."""
+    workers = default_workers() if workers is None else max(1, workers)
+    size = os.path.getsize(path)
+    if workers == 1 or size < max(min_parallel_bytes, 2 * chunk_bytes):
+        for chunk in iter_line_chunks(path, chunk_lines):
+            yield fn(*chunk, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for byte_range in iter_byte_ranges(path, chunk_bytes):
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_run_range, fn, path, byte_range, args))
+        while pending:
+            yield pending.popleft().result()
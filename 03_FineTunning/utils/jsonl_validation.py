@@ -0,0 +1,295 @@
+"""
+Validación en streaming y en paralelo de ficheros JSONL de fine-tuning (formato chat).
+
+El fichero se recorre una sola vez por bloques en un pool de procesos (utils/jsonl_parallel.py):
+cada bloque se valida entero (no se para en el primer error) y devuelve sus errores con el
+número de línea, sus estadísticas y unos hashes de 8 bytes por ejemplo. El proceso principal
+une los bloques en orden, escribe todos los errores en un JSONL y cuenta los duplicados con
+los hashes, así que la memoria no depende del tamaño del fichero (salvo los hashes).
+
+Las líneas en blanco no son errores: se saltan y se cuentan aparte. La intención de la
+respuesta del assistant solo se comprueba contra un catálogo si se pasa `labels`.
+
+Estadísticas: mensajes por rol, mensajes por ejemplo, histograma de longitudes (caracteres)
+por rol, distribución de intenciones (respuesta del assistant), ejemplos duplicados, textos
+de usuario repetidos, repetidos con intenciones distintas y, si se pasa el conjunto de
+entrenamiento, textos de validación que también están en entrenamiento.
+"""
+
+import bisect
+import hashlib
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.jsonl_parallel import DEFAULT_CHUNK_LINES, map_chunks
+
+VALID_ROLES = ("system", "user", "assistant")
+VALID_MESSAGE_KEYS = {"role", "content", "name", "weight"}
+
+# Límites superiores (exclusivos) de los cubos del histograma de longitudes, en caracteres
+LENGTH_BUCKETS = (20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Errores que se guardan en memoria para mostrar (todos van al fichero de errores)
+MAX_REPORTED_ERRORS = 50
+
+# Intenciones distintas que se listan en la distribución (el resto se agrupa)
+MAX_LISTED_LABELS = 50
+
+
+def _bucket_names() -> List[str]:
+    edges = (0,) + LENGTH_BUCKETS
+    names = [f"{low}-{high - 1}" for low, high in zip(edges, edges[1:])]
+    return names + [f"≥{LENGTH_BUCKETS[-1]}"]
+
+
+LENGTH_BUCKET_NAMES = _bucket_names()
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def validate_example(item: Any, labels: Optional[Sequence[str]] = None) -> List[str]:
+    """Todos los errores de formato de un ejemplo (lista vacía si es válido)."""
+    if not isinstance(item, dict):
+        return ["La línea no es un objeto JSON"]
+    if "messages" not in item:
+        return ["Falta campo 'messages'"]
+    messages = item["messages"]
+    if not isinstance(messages, list):
+        return ["'messages' no es una lista"]
+    if len(messages) < 2:
+        return ["Debe tener al menos 2 mensajes (user y assistant)"]
+
+    errors = []
+    for j, msg in enumerate(messages, 1):
+        if not isinstance(msg, dict):
+            errors.append(f"Mensaje {j}: no es un objeto")
+            continue
+        if msg.get("role") not in VALID_ROLES:
+            errors.append(f"Mensaje {j}: Rol inválido ({msg.get('role')!r})")
+        content = msg.get("content")
+        if not isinstance(content, str) or not content.strip():
+            errors.append(f"Mensaje {j}: Contenido vacío")
+        unknown = set(msg) - VALID_MESSAGE_KEYS
+        if unknown:
+            errors.append(f"Mensaje {j}: Claves no reconocidas ({', '.join(sorted(unknown))})")
+        if "weight" in msg and (msg.get("role") != "assistant" or msg["weight"] not in (0, 1)):
+            errors.append(f"Mensaje {j}: 'weight' solo admite 0 o 1 en mensajes del assistant")
+
+    roles = [msg.get("role") for msg in messages if isinstance(msg, dict)]
+    if "user" not in roles:
+        errors.append("Falta un mensaje del user")
+    if not roles or roles[-1] != "assistant":
+        errors.append("Debe terminar con un mensaje del assistant")
+    elif labels is not None and isinstance(messages[-1].get("content"), str):
+        label = messages[-1]["content"].strip()
+        if label and label not in labels:
+            errors.append(f"Intención desconocida en la respuesta del assistant ({label!r})")
+    return errors
+
+
+def _validate_chunk(first_line: int, lines: List[str], labels: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """Valida un bloque de líneas; se ejecuta en un proceso del pool."""
+    errors: List[Tuple[int, str]] = []
+    roles: Counter = Counter()
+    lengths: Dict[str, List[int]] = {role: [0] * len(LENGTH_BUCKET_NAMES) for role in VALID_ROLES}
+    length_totals: Counter = Counter()
+    length_max: Counter = Counter()
+    messages_per_example: Counter = Counter()
+    label_counts: Counter = Counter()
+    digests: List[Tuple[int, int, Optional[int], Optional[str]]] = []
+    examples = blank_lines = 0
+
+    for offset, line in enumerate(lines):
+        line_number = first_line + offset
+        if not line.strip():
+            blank_lines += 1
+            continue
+        examples += 1
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            errors.append((line_number, f"JSON inválido ({e.msg}, columna {e.colno})"))
+            continue
+        problems = validate_example(item, labels)
+        if problems:
+            errors.extend((line_number, problem) for problem in problems)
+            continue
+
+        messages = item["messages"]
+        messages_per_example[len(messages)] += 1
+        user_text = None
+        for msg in messages:
+            role, content = msg["role"], msg["content"]
+            roles[role] += 1
+            lengths[role][bisect.bisect_right(LENGTH_BUCKETS, len(content))] += 1
+            length_totals[role] += len(content)
+            length_max[role] = max(length_max[role], len(content))
+            if role == "user":
+                user_text = content
+        label = messages[-1]["content"].strip()
+        label_counts[label] += 1
+        # Ejemplo idéntico = misma línea (los JSONL se generan siempre con el mismo formato);
+        # las copias con otro formato se detectan igualmente como texto de usuario repetido
+        example_digest = _digest(line.strip())
+        input_digest = _digest(_normalize(user_text)) if user_text is not None else None
+        digests.append((line_number, example_digest, input_digest, label))
+
+    return {
+        "examples": examples,
+        "blank_lines": blank_lines,
+        "errors": errors,
+        "roles": roles,
+        "lengths": lengths,
+        "length_totals": length_totals,
+        "length_max": length_max,
+        "messages_per_example": messages_per_example,
+        "labels": label_counts,
+        "digests": digests,
+    }
+
+
+class ValidationReport:
+    """Resultado de validar un fichero: errores, estadísticas y duplicados."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.examples = 0
+        self.blank_lines = 0
+        self.valid_examples = 0
+        self.error_count = 0
+        self.invalid_lines = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.errors_path: Optional[str] = None
+        self.roles: Counter = Counter()
+        self.lengths: Dict[str, List[int]] = {role: [0] * len(LENGTH_BUCKET_NAMES) for role in VALID_ROLES}
+        self.length_totals: Counter = Counter()
+        self.length_max: Counter = Counter()
+        self.messages_per_example: Counter = Counter()
+        self.labels: Counter = Counter()
+        self.duplicate_examples = 0
+        self.duplicate_inputs = 0
+        self.conflicting_inputs = 0
+        self.inputs_in_reference = 0
+        self.duplicate_lines: List[Tuple[int, int]] = []
+        # Hash del texto de usuario -> intención (para duplicados y para comparar con otro fichero)
+        self.input_labels: Dict[int, str] = {}
+
+    @property
+    def is_valid(self) -> bool:
+        return self.error_count == 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Resumen serializable (para data_preparation_summary.json)."""
+        length_stats = {
+            role: {
+                "histogram": dict(zip(LENGTH_BUCKET_NAMES, self.lengths[role])),
+                "mean": round(self.length_totals[role] / self.roles[role], 1) if self.roles[role] else 0,
+                "max": self.length_max[role],
+            }
+            for role in VALID_ROLES if self.roles[role]
+        }
+        top_labels = self.labels.most_common(MAX_LISTED_LABELS)
+        others = sum(self.labels.values()) - sum(count for _, count in top_labels)
+        label_distribution = dict(top_labels)
+        if others:
+            label_distribution["(otras)"] = others
+        return {
+            "path": self.path,
+            "examples": self.examples,
+            "valid_examples": self.valid_examples,
+            "blank_lines": self.blank_lines,
+            "invalid_lines": self.invalid_lines,
+            "error_count": self.error_count,
+            "errors_path": self.errors_path,
+            "first_errors": self.errors,
+            "role_distribution": dict(self.roles),
+            "messages_per_example": {str(k): v for k, v in sorted(self.messages_per_example.items())},
+            "content_length": length_stats,
+            "label_distribution": label_distribution,
+            "duplicates": {
+                "examples": self.duplicate_examples,
+                "inputs": self.duplicate_inputs,
+                "inputs_with_conflicting_labels": self.conflicting_inputs,
+                "inputs_in_reference_set": self.inputs_in_reference,
+                "first_duplicate_lines": [
+                    {"line": line, "first_seen": first} for line, first in self.duplicate_lines
+                ],
+            },
+        }
+
+
+def validate_jsonl_file(
+    path: str,
+    labels: Optional[Iterable[str]] = None,
+    errors_path: Optional[str] = None,
+    reference: Optional[ValidationReport] = None,
+    workers: Optional[int] = None,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+) -> ValidationReport:
+    """Valida un JSONL de fine-tuning en una pasada, en paralelo por bloques.
+
+    Args:
+        labels: Intenciones admitidas en la respuesta del assistant (None = no se comprueba).
+        errors_path: JSONL donde se escriben todos los errores `{"line", "error"}`; solo se
+            crea si hay errores.
+        reference: Informe de otro fichero (p. ej. entrenamiento) para contar los textos de
+            usuario que aparecen en ambos.
+    """
+    report = ValidationReport(path)
+    labels = tuple(labels) if labels is not None else None
+    seen_examples: Dict[int, int] = {}
+    errors_file = None
+    try:
+        for part in map_chunks(_validate_chunk, path, labels, workers=workers, chunk_lines=chunk_lines):
+            report.examples += part["examples"]
+            report.blank_lines += part["blank_lines"]
+            for line_number, message in part["errors"]:
+                report.error_count += 1
+                if len(report.errors) < MAX_REPORTED_ERRORS:
+                    report.errors.append({"line": line_number, "error": message})
+                if errors_path:
+                    if errors_file is None:
+                        errors_file = open(errors_path, "w", encoding="utf-8")
+                    errors_file.write(json.dumps({"line": line_number, "error": message}, ensure_ascii=False) + "\n")
+            # Los errores de una línea vienen siempre del mismo bloque
+            report.invalid_lines += len({line_number for line_number, _ in part["errors"]})
+            report.roles.update(part["roles"])
+            for role, counts in part["lengths"].items():
+                report.lengths[role] = [a + b for a, b in zip(report.lengths[role], counts)]
+            report.length_totals.update(part["length_totals"])
+            for role, longest in part["length_max"].items():
+                report.length_max[role] = max(report.length_max[role], longest)
+            report.messages_per_example.update(part["messages_per_example"])
+            report.labels.update(part["labels"])
+
+            for line_number, example_digest, input_digest, label in part["digests"]:
+                report.valid_examples += 1
+                first = seen_examples.setdefault(example_digest, line_number)
+                if first != line_number:
+                    report.duplicate_examples += 1
+                    if len(report.duplicate_lines) < MAX_REPORTED_ERRORS:
+                        report.duplicate_lines.append((line_number, first))
+                if input_digest is None:
+                    continue
+                previous = report.input_labels.get(input_digest)
+                if previous is None:
+                    report.input_labels[input_digest] = label
+                else:
+                    report.duplicate_inputs += 1
+                    if previous != label:
+                        report.conflicting_inputs += 1
+                if reference is not None and input_digest in reference.input_labels:
+                    report.inputs_in_reference += 1
+    finally:
+        if errors_file is not None:
+            errors_file.close()
+    if errors_file is not None:
+        report.errors_path = errors_path
+    return report
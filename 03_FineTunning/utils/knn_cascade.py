@@ -0,0 +1,175 @@
+"""
+Clasificador kNN sobre embeddings como primera etapa (cascada) delante del LLM.
+
+- Los ejemplos etiquetados (data/raw/intent_examples.json, Paso 1) se convierten en
+  embeddings una sola vez y se guardan en data/processed/ (se reutilizan mientras no
+  cambien los ejemplos ni el deployment de embeddings).
+- Cada texto nuevo se clasifica por votación ponderada (similitud coseno) de sus k
+  vecinos más cercanos, con operaciones vectorizadas de NumPy para todo el lote.
+- Solo los casos con margen bajo entre la primera y la segunda intención se escalan
+  al modelo (fine-tuned o base).
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Función que convierte una lista de textos en una matriz (n, d) de embeddings
+EmbedFn = Callable[[Sequence[str]], np.ndarray]
+
+# Tamaño de lote para la API de embeddings (Azure admite hasta 2048 entradas por petición)
+EMBEDDING_BATCH_SIZE = 256
+
+
+def make_azure_embed_fn(client, deployment: str, batch_size: int = EMBEDDING_BATCH_SIZE) -> EmbedFn:
+    """Crea una EmbedFn que llama al deployment de embeddings de Azure OpenAI por lotes."""
+
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), batch_size):
+            response = client.embeddings.create(model=deployment, input=list(texts[start:start + batch_size]))
+            # La API devuelve los datos con su índice; se ordenan por si acaso
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return np.asarray(vectors, dtype=np.float32)
+
+    return embed
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def flatten_examples(examples: Dict[str, List[str]]) -> Tuple[List[str], List[str]]:
+    """{intención: [frases]} -> (textos, etiquetas) en orden estable."""
+    texts, labels = [], []
+    for intent, phrases in examples.items():
+        for phrase in phrases:
+            texts.append(phrase)
+            labels.append(intent)
+    return texts, labels
+
+
+class KnnIntentClassifier:
+    """kNN ponderado por similitud coseno sobre embeddings normalizados."""
+
+    def __init__(self, k: int = 5):
+        self.k = k
+        self.labels: List[str] = []
+        self.texts: List[str] = []
+        self.classes: List[str] = []
+        self._matrix: Optional[np.ndarray] = None  # (n, d) normalizada
+        self._label_ids: Optional[np.ndarray] = None  # (n,)
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], embeddings: np.ndarray) -> "KnnIntentClassifier":
+        self.texts = list(texts)
+        self.labels = list(labels)
+        self.classes = sorted(set(labels))
+        class_index = {c: i for i, c in enumerate(self.classes)}
+        self._label_ids = np.array([class_index[label] for label in labels])
+        self._matrix = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        return self
+
+    @classmethod
+    def from_examples(
+        cls,
+        examples: Dict[str, List[str]],
+        embed_fn: EmbedFn,
+        cache_path: Optional[Path] = None,
+        cache_tag: str = "",
+        k: int = 5,
+    ) -> "KnnIntentClassifier":
+        """Construye el clasificador; los embeddings se cachean en `cache_path` (.npz)."""
+        texts, labels = flatten_examples(examples)
+        digest = hashlib.sha256(json.dumps([cache_tag, texts, labels], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+        embeddings = None
+        if cache_path and Path(cache_path).exists():
+            cached = np.load(cache_path, allow_pickle=False)
+            if str(cached["digest"]) == digest:
+                embeddings = cached["embeddings"]
+        if embeddings is None:
+            embeddings = embed_fn(texts)
+            if cache_path:
+                Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+                np.savez_compressed(cache_path, embeddings=embeddings, digest=np.array(digest))
+        return cls(k=k).fit(texts, labels, embeddings)
+
+    def predict(self, query_embeddings: np.ndarray) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Clasifica un lote de embeddings.
+
+        Returns:
+            (etiquetas, margen, similitud máxima). El margen es la diferencia entre el voto
+            de la primera y la segunda intención, dividida por el voto total (0..1).
+        """
+        if self._matrix is None:
+            raise ValueError("El clasificador no está entrenado (llama a fit o from_examples)")
+        queries = _normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        sims = queries @ self._matrix.T  # (q, n)
+        k = min(self.k, sims.shape[1])
+
+        # Top-k sin ordenar todo: argpartition es O(n) por fila
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        weights = np.clip(top_sims, 0.0, None)
+
+        votes = np.zeros((sims.shape[0], len(self.classes)), dtype=np.float32)
+        np.add.at(votes, (np.arange(sims.shape[0])[:, None], self._label_ids[top]), weights)
+
+        ordered = np.sort(votes, axis=1)
+        first = ordered[:, -1]
+        second = ordered[:, -2] if votes.shape[1] > 1 else np.zeros_like(first)
+        margin = (first - second) / np.maximum(votes.sum(axis=1), 1e-12)
+        labels = [self.classes[i] for i in votes.argmax(axis=1)]
+        return labels, margin, sims.max(axis=1)
+
+
+def classify_cascade(
+    texts: Sequence[str],
+    classifier: KnnIntentClassifier,
+    embed_fn: EmbedFn,
+    llm_fn: Optional[Callable[[str], str]] = None,
+    margin_threshold: float = 0.5,
+) -> List[Dict]:
+    """Clasifica con kNN y escala al LLM los casos con margen < margin_threshold.
+
+    Si `llm_fn` es None, los casos que se escalarían se marcan con escalated=True y se
+    devuelve la predicción kNN (útil para medir la tasa de escalado sin llamar al modelo).
+    """
+    labels, margins, max_sims = classifier.predict(embed_fn(list(texts)))
+    results = []
+    for text, knn_label, margin, max_sim in zip(texts, labels, margins, max_sims):
+        escalated = bool(margin < margin_threshold)
+        prediction, source = knn_label, "knn"
+        if escalated and llm_fn is not None:
+            prediction, source = llm_fn(text), "llm"
+        results.append({
+            "text": text,
+            "predicted": prediction,
+            "knn_predicted": knn_label,
+            "margin": round(float(margin), 4),
+            "max_similarity": round(float(max_sim), 4),
+            "escalated": escalated,
+            "source": source,
+        })
+    return results
+
+
+def sweep_thresholds(
+    margins: np.ndarray,
+    knn_correct: np.ndarray,
+    thresholds: Sequence[float] = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8),
+) -> List[Dict[str, float]]:
+    """Para cada umbral: tasa de escalado y accuracy del kNN en los casos que NO se escalan."""
+    rows = []
+    for t in thresholds:
+        kept = margins >= t
+        rows.append({
+            "threshold": t,
+            "escalation_rate": float(1 - kept.mean()) if len(kept) else 0.0,
+            "knn_accuracy_on_kept": float(knn_correct[kept].mean()) if kept.any() else 0.0,
+        })
+    return rows
@@ -0,0 +1,163 @@
+"""
+Métricas de clasificación de intenciones con NumPy (Paso 8).
+
+- La matriz de confusión se construye con un único `np.bincount` sobre las etiquetas
+  codificadas como enteros; filas = intención esperada, columnas = predicha. Se añade una
+  clase extra (`OTHER_LABEL`) para las respuestas fuera de `Config.INTENT_CATEGORIES`.
+- Precisión, recall y F1 por clase, medias macro (sobre las intenciones) y micro (la
+  precisión micro solo cuenta predicciones dentro de las intenciones, así que penaliza
+  distinto las respuestas fuera de catálogo que el recall micro).
+- Intervalos de confianza por bootstrap (percentiles): todas las remuestras de un bloque
+  se resuelven con un solo `bincount`, sin bucles de Python por caso.
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Clase para predicciones (o etiquetas) que no son ninguna de las intenciones
+OTHER_LABEL = "otro"
+
+# Máximo de celdas (remuestras x casos) por bloque del bootstrap, para acotar la memoria
+_BOOTSTRAP_BLOCK_CELLS = 4_000_000
+
+
+def encode_labels(values: Iterable[str], labels: Sequence[str]) -> np.ndarray:
+    """Índice de cada valor en `labels`; lo que no está se codifica como la última clase (otro)."""
+    index = {label: i for i, label in enumerate(labels)}
+    other = len(labels)
+    return np.fromiter((index.get(v, other) for v in values), dtype=np.int32)
+
+
+def confusion_matrix(y_true: np.ndarray, y_pred: np.ndarray, n_classes: int) -> np.ndarray:
+    """Matriz (n_classes, n_classes) de recuentos: [esperada, predicha]."""
+    codes = np.asarray(y_true, dtype=np.int64) * n_classes + np.asarray(y_pred, dtype=np.int64)
+    return np.bincount(codes, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """num / den con 0 donde den es 0 (clase sin predicciones o sin casos)."""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros(np.broadcast(num, den).shape), where=den > 0)
+
+
+def _scores(cm: np.ndarray, n_labels: int) -> Dict[str, np.ndarray]:
+    """Métricas de una o varias matrices (..., K, K); las `n_labels` primeras clases son intenciones.
+
+    Funciona igual con una matriz que con una pila de matrices del bootstrap.
+    """
+    tp = np.diagonal(cm, axis1=-2, axis2=-1)[..., :n_labels]
+    predicted = cm.sum(axis=-2)[..., :n_labels]
+    support = cm.sum(axis=-1)[..., :n_labels]
+    total = cm.sum(axis=(-2, -1))
+
+    precision = _safe_div(tp, predicted)
+    recall = _safe_div(tp, support)
+    f1 = _safe_div(2 * precision * recall, precision + recall)
+
+    tp_sum = tp.sum(axis=-1)
+    micro_precision = _safe_div(tp_sum, predicted.sum(axis=-1))
+    micro_recall = _safe_div(tp_sum, support.sum(axis=-1))
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "support": support,
+        "accuracy": _safe_div(np.diagonal(cm, axis1=-2, axis2=-1).sum(axis=-1), total),
+        "macro_precision": precision.mean(axis=-1),
+        "macro_recall": recall.mean(axis=-1),
+        "macro_f1": f1.mean(axis=-1),
+        "micro_precision": micro_precision,
+        "micro_recall": micro_recall,
+        "micro_f1": _safe_div(2 * micro_precision * micro_recall, micro_precision + micro_recall),
+    }
+
+
+def classification_report(cm: np.ndarray, labels: Sequence[str]) -> Dict:
+    """Métricas por intención y medias macro/micro a partir de la matriz de confusión.
+
+    `cm` tiene len(labels) + 1 filas/columnas (la última es OTHER_LABEL).
+    """
+    scores = _scores(cm, len(labels))
+    per_class = {
+        label: {
+            "precision": float(scores["precision"][i]),
+            "recall": float(scores["recall"][i]),
+            "f1": float(scores["f1"][i]),
+            "support": int(scores["support"][i]),
+            "correct": int(cm[i, i]),
+        }
+        for i, label in enumerate(labels)
+    }
+    averages = {key: float(scores[key]) for key in scores if key.startswith(("macro_", "micro_"))}
+    return {
+        "per_class": per_class,
+        "accuracy": float(scores["accuracy"]),
+        "total": int(cm.sum()),
+        "out_of_catalog_predictions": int(cm[:, len(labels)].sum()),
+        **averages,
+    }
+
+
+def bootstrap_ci(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    labels: Sequence[str],
+    n_boot: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = 42,
+) -> Dict:
+    """Intervalos de confianza por bootstrap (percentiles) de accuracy, medias y F1 por clase.
+
+    Cada remuestra es una matriz de confusión: se remuestrean los índices de los casos por
+    bloques y se cuentan todas las remuestras del bloque con un solo `bincount`.
+    """
+    n = len(y_true)
+    n_classes = len(labels) + 1
+    if n == 0 or n_boot <= 0:
+        return {}
+    rng = np.random.default_rng(seed)
+    codes = np.asarray(y_true, dtype=np.int64) * n_classes + np.asarray(y_pred, dtype=np.int64)
+    cells = n_classes * n_classes
+    block = max(1, min(n_boot, _BOOTSTRAP_BLOCK_CELLS // n))
+
+    matrices = np.empty((n_boot, n_classes, n_classes), dtype=np.int64)
+    for start in range(0, n_boot, block):
+        size = min(block, n_boot - start)
+        sampled = codes[rng.integers(0, n, size=(size, n))]
+        sampled += (np.arange(size, dtype=np.int64) * cells)[:, None]
+        matrices[start:start + size] = np.bincount(sampled.ravel(), minlength=size * cells).reshape(
+            size, n_classes, n_classes
+        )
+
+    scores = _scores(matrices, len(labels))
+    tail = (1 - confidence) / 2 * 100
+
+    def interval(values: np.ndarray) -> List[float]:
+        low, high = np.percentile(values, [tail, 100 - tail], axis=0)
+        return [float(low), float(high)]
+
+    result = {
+        key: interval(scores[key])
+        for key in ("accuracy", "macro_precision", "macro_recall", "macro_f1", "micro_f1")
+    }
+    result["per_class_f1"] = {label: interval(scores["f1"][:, i]) for i, label in enumerate(labels)}
+    result["n_boot"] = n_boot
+    result["confidence"] = confidence
+    return result
+
+
+def top_confusions(cm: np.ndarray, labels: Sequence[str], k: int = 5) -> List[Dict]:
+    """Los k pares (esperada -> predicha) distintos más frecuentes, de mayor a menor."""
+    names = list(labels) + [OTHER_LABEL]
+    off_diagonal = cm.copy()
+    np.fill_diagonal(off_diagonal, 0)
+    order = np.argsort(off_diagonal, axis=None)[::-1][:k]
+    pairs = []
+    for flat in order:
+        i, j = divmod(int(flat), cm.shape[1])
+        if off_diagonal[i, j] == 0:
+            break
+        pairs.append({"expected": names[i], "predicted": names[j], "count": int(off_diagonal[i, j])})
+    return pairs
@@ -0,0 +1,47 @@
+"""
+Prompt del sistema compartido por el entrenamiento (Paso 2) y las pruebas (Paso 7).
+
+Los mensajes se construyen siempre con la parte fija delante (system + few-shot, si los
+hay) y el texto del usuario al final. Así el prefijo es idéntico byte a byte en todas las
+peticiones y Azure OpenAI puede servirlo desde su caché de prompts; los tokens servidos
+desde ella se leen de `usage.prompt_tokens_details.cached_tokens`.
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+SYSTEM_PROMPT = """Eres un asistente especializado en clasificar las intenciones de los clientes en una tienda de ropa.
+
+Tu tarea es clasificar cada mensaje del usuario en una de las siguientes categorías:
+- comprar: El usuario quiere adquirir un producto
+- devolver: El usuario quiere devolver o cambiar un producto
+- queja: El usuario tiene una queja o reclamación
+- consulta: El usuario hace preguntas informativas
+
+Responde únicamente con el nombre de la categoría (comprar, devolver, queja, consulta)."""
+
+
+def build_messages(text: str, examples: Sequence[Tuple[str, str]] = ()) -> List[Dict[str, str]]:
+    """Mensajes de chat: system + ejemplos (texto, intención) fijos y, al final, el texto a clasificar."""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    for example_text, intent in examples:
+        messages.append({"role": "user", "content": example_text})
+        messages.append({"role": "assistant", "content": intent})
+    messages.append({"role": "user", "content": text})
+    return messages
+
+
+def new_usage() -> Dict[str, int]:
+    """Contadores de tokens de una ejecución (ver `add_usage`)."""
+    return {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+
+def add_usage(totals: Dict[str, int], response: Any) -> None:
+    """Suma el `usage` de una respuesta de chat a los contadores (incluidos los tokens en caché)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    totals["requests"] += 1
+    totals["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+    totals["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+    totals["cached_tokens"] += getattr(details, "cached_tokens", 0) or 0
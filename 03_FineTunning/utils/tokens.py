@@ -0,0 +1,275 @@
+"""
+Recuento de tokens de los ejemplos de fine-tuning (formato chat) y proyección del coste.
+
+- Con tiktoken (y la codificación del modelo disponible) el recuento es exacto: cada valor
+  de cada mensaje se codifica con la codificación del modelo base (`o200k_base` para la
+  familia gpt-4o/gpt-4.1, `cl100k_base` para gpt-35-turbo/gpt-4) y se suma el formato de
+  chat: 3 tokens por mensaje, 1 por `name` y 3 de cierre.
+- Sin tiktoken se estima por palabras (las tildes y la ñ cuentan más que `chars // 4`) y se
+  multiplica por un factor de calibración: la última vez que se contó con tiktoken se
+  compararon ambos recuentos sobre los propios datos y se guardó el factor en
+  `data/processed/token_calibration.json`.
+- `count_file_tokens` recorre un JSONL grande en paralelo (utils/jsonl_parallel.py) y
+  devuelve totales, distribución por ejemplo y los ejemplos que superan el límite del modelo.
+"""
+
+import json
+import math
+import os
+import re
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.jsonl_parallel import DEFAULT_CHUNK_LINES, map_chunks
+
+# Formato de chat (mismo cálculo que el cookbook de OpenAI para modelos de chat)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3
+
+# Tokens máximos por ejemplo de entrenamiento según el modelo base (el primer prefijo que coincide)
+TRAINING_CONTEXT_LIMITS: Sequence[Tuple[str, int]] = (
+    ("gpt-4o-mini", 65536),
+    ("gpt-4o", 65536),
+    ("gpt-4.1", 65536),
+    ("gpt-35-turbo", 16385),
+    ("gpt-3.5-turbo", 16385),
+)
+DEFAULT_CONTEXT_LIMIT = 16385
+
+# Ejemplos por bloque que se cuentan también con la estimación para calibrarla
+CALIBRATION_SAMPLE_PER_CHUNK = 200
+
+# Ejemplos por encima del límite que se listan en el resumen (se cuentan todos)
+MAX_LISTED_OVER_LIMIT = 20
+
+_PIECES = re.compile(r" ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+")
+
+# Familias con o200k_base, al inicio del nombre del modelo o tras el prefijo de un modelo
+# fine-tuned (`ft:gpt-4o-mini-2024-07-18:...`, `gpt-4o-mini-2024-07-18.ft-...`)
+_O200K_MODELS = re.compile(r"^(?:ft:)?(?:gpt-4o|gpt-4\.1|o1|o3|o4-mini)(?:[-.:_]|$)")
+
+
+def encoding_name_for_model(model: str) -> str:
+    """Codificación de tiktoken del modelo base (también vale el nombre de un deployment fine-tuned)."""
+    return "o200k_base" if _O200K_MODELS.match(model.strip().lower()) else "cl100k_base"
+
+
+def max_tokens_for_model(model: str) -> int:
+    """Límite de tokens por ejemplo de entrenamiento del modelo base."""
+    name = model.strip().lower()
+    name = name[3:] if name.startswith("ft:") else name
+    return next((limit for family, limit in TRAINING_CONTEXT_LIMITS if name.startswith(family)), DEFAULT_CONTEXT_LIMIT)
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    """Codificación de tiktoken, o None si no está instalado o no se puede descargar la codificación."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def heuristic_tokens(text: str) -> float:
+    """Estimación sin tiktoken: por palabra, número (grupos de 3 cifras) y signos de puntuación.
+
+    Una palabra corta es un token y las largas se parten cada ~6 letras; cada carácter no
+    ASCII (tildes, ñ, ¿, ¡) suma medio token porque suele quedar en un token aparte.
+    """
+    total = 0.0
+    for piece in _PIECES.findall(text):
+        word = piece.strip()
+        if not word:
+            total += 1
+            continue
+        total += 1 + (len(word) - 1) // 6 if word.isalpha() else 1
+        total += 0.5 * sum(1 for char in word if ord(char) > 127)
+    return total
+
+
+def load_calibration(path: str, encoding_name: str) -> Optional[float]:
+    """Factor exacto/estimado guardado para esta codificación (None si no hay)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return float(json.load(f)[encoding_name]["factor"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_calibration(path: str, encoding_name: str, exact: int, estimated: float) -> Optional[float]:
+    """Guarda el factor exacto/estimado medido sobre los datos y lo devuelve."""
+    if estimated <= 0:
+        return None
+    factor = exact / estimated
+    data = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+    data[encoding_name] = {"factor": round(factor, 4), "exact_tokens": exact, "estimated_tokens": round(estimated)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return factor
+
+
+class TokenCounter:
+    """Cuenta tokens de textos y de ejemplos en formato chat para un modelo."""
+
+    def __init__(self, model: str, calibration_path: Optional[str] = None, factor: Optional[float] = None):
+        self.model = model
+        self.encoding_name = encoding_name_for_model(model)
+        self.encoding = _load_encoding(self.encoding_name)
+        if factor is None and self.encoding is None and calibration_path:
+            factor = load_calibration(calibration_path, self.encoding_name)
+        self.calibrated = factor is not None
+        self.factor = factor if factor is not None else 1.0
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    @property
+    def method(self) -> str:
+        if self.exact:
+            return f"tiktoken ({self.encoding_name})"
+        if self.calibrated:
+            return f"estimación calibrada (x{self.factor:.3f}, {self.encoding_name})"
+        return "estimación sin calibrar (instala tiktoken para un recuento exacto)"
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return max(1, round(heuristic_tokens(text) * self.factor))
+
+    def count_messages(self, messages: Sequence[Dict[str, Any]]) -> int:
+        """Tokens de una conversación tal como la factura el fine-tuning."""
+        total = REPLY_PRIMING_TOKENS
+        for message in messages:
+            total += TOKENS_PER_MESSAGE
+            for key, value in message.items():
+                if isinstance(value, str):
+                    total += self.count_text(value)
+                if key == "name":
+                    total += TOKENS_PER_NAME
+        return total
+
+
+@lru_cache(maxsize=4)
+def _worker_counter(model: str, factor: Optional[float]) -> TokenCounter:
+    """Un TokenCounter por proceso del pool (la codificación no se serializa)."""
+    return TokenCounter(model, factor=factor)
+
+
+def _count_chunk(first_line: int, lines: List[str], model: str, factor: Optional[float],
+                 limit: int) -> Dict[str, Any]:
+    """Cuenta un bloque de líneas; se ejecuta en un proceso del pool."""
+    counter = _worker_counter(model, factor)
+    counts = array("I")
+    characters = 0
+    invalid = 0
+    over_limit: List[Tuple[int, int]] = []
+    calibration_exact, calibration_estimated = 0, 0.0
+    for offset, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            messages = json.loads(line)["messages"]
+            tokens = counter.count_messages(messages)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            invalid += 1
+            continue
+        counts.append(tokens)
+        characters += sum(len(m.get("content") or "") for m in messages if isinstance(m.get("content"), str))
+        if tokens > limit:
+            over_limit.append((first_line + offset, tokens))
+        if counter.exact and len(counts) <= CALIBRATION_SAMPLE_PER_CHUNK:
+            for message in messages:
+                content = message.get("content")
+                if isinstance(content, str) and content:
+                    calibration_exact += counter.count_text(content)
+                    calibration_estimated += heuristic_tokens(content)
+    return {
+        "counts": counts,
+        "characters": characters,
+        "invalid": invalid,
+        "over_limit": over_limit,
+        "calibration": (calibration_exact, calibration_estimated),
+    }
+
+
+def _percentile(ordered: Sequence[int], p: float) -> int:
+    if not ordered:
+        return 0
+    return int(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)])
+
+
+def count_file_tokens(
+    path: str,
+    counter: TokenCounter,
+    max_tokens: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+) -> Dict[str, Any]:
+    """Tokens de todos los ejemplos de un JSONL de entrenamiento, contados en paralelo por bloques.
+
+    Los ejemplos por encima de `max_tokens` se marcan (se truncarían al entrenar) y solo se
+    facturan hasta el límite. `calibration` lleva los recuentos exacto/estimado de una
+    muestra para `save_calibration` (solo con recuento exacto).
+    """
+    limit = max_tokens or max_tokens_for_model(counter.model)
+    factor = counter.factor if not counter.exact else None
+    counts = array("I")
+    characters = invalid = 0
+    over_limit: List[Tuple[int, int]] = []
+    calibration_exact, calibration_estimated = 0, 0.0
+    for part in map_chunks(_count_chunk, path, counter.model, factor, limit,
+                           workers=workers, chunk_lines=chunk_lines):
+        counts.extend(part["counts"])
+        characters += part["characters"]
+        invalid += part["invalid"]
+        over_limit.extend(part["over_limit"])
+        calibration_exact += part["calibration"][0]
+        calibration_estimated += part["calibration"][1]
+
+    total_examples = len(counts)
+    total_tokens = sum(counts)
+    billed_per_epoch = total_tokens - sum(tokens - limit for _, tokens in over_limit)
+    ordered = sorted(counts)
+    return {
+        "total_examples": total_examples,
+        "invalid_lines": invalid,
+        "total_characters": characters,
+        "total_tokens": total_tokens,
+        "estimated_tokens": total_tokens,
+        "tokens_per_example": total_tokens // total_examples if total_examples > 0 else 0,
+        "tokens_distribution": {
+            "min": int(ordered[0]) if ordered else 0,
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "max": int(ordered[-1]) if ordered else 0,
+        },
+        "max_tokens_per_example": limit,
+        "over_limit": len(over_limit),
+        "over_limit_examples": [{"line": line, "tokens": tokens} for line, tokens in over_limit[:MAX_LISTED_OVER_LIMIT]],
+        "billed_tokens_per_epoch": billed_per_epoch,
+        "counting_method": counter.method,
+        "calibration": {"exact": calibration_exact, "estimated": round(calibration_estimated, 1)},
+    }
+
+
+def training_cost(train_stats: Dict[str, Any], n_epochs: int, price_per_1m: float = 0.0) -> Dict[str, Any]:
+    """Tokens facturados del entrenamiento (entrenamiento × epochs) y coste si se conoce el precio."""
+    billed = train_stats["billed_tokens_per_epoch"] * n_epochs
+    return {
+        "n_epochs": n_epochs,
+        "billed_training_tokens": billed,
+        "price_per_1m_tokens": price_per_1m or None,
+        "estimated_cost": round(billed / 1_000_000 * price_per_1m, 4) if price_per_1m else None,
+    }